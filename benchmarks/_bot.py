@@ -0,0 +1,68 @@
+"""Import xhsfwbot, or xhsfwbot.py from an older git revision, for benchmarks.
+
+Importing the bot creates log/ and data/ in the working directory, reads
+redtoemoji.json from it and opens the SQLite database next to db.py, so every
+benchmark runs from a scratch directory with a database of its own.  Older
+revisions are imported alongside the current one under another module name
+and share the current db and i18n modules.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from types import ModuleType
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_scratch = ''
+
+
+def _enter_scratch() -> str:
+    global _scratch
+    if not _scratch:
+        _scratch = tempfile.mkdtemp(prefix='xhsfwbot-bench-')
+        shutil.copy(os.path.join(ROOT, 'redtoemoji.json'), _scratch)
+        os.chdir(_scratch)
+        sys.path.insert(0, ROOT)
+        sys.path.insert(0, _scratch)
+        import db
+        db.DB_PATH = os.path.join(_scratch, 'xhsfwbot.db')
+    return _scratch
+
+
+def load(rev: str | None = None) -> ModuleType:
+    """The bot module of the working tree, or of git revision *rev*."""
+    scratch = _enter_scratch()
+    if rev is None:
+        name = 'xhsfwbot'
+    else:
+        name = 'xhsfwbot_' + re.sub(r'\W', '_', rev)
+        source = subprocess.run(
+            ['git', 'show', f'{rev}:xhsfwbot.py'], cwd=ROOT, check=True, capture_output=True,
+        ).stdout
+        with open(os.path.join(scratch, f'{name}.py'), 'wb') as f:
+            f.write(source)
+    module = importlib.import_module(name)
+    logging.disable(logging.CRITICAL)
+    return module
+
+
+def parse_args(description: str) -> argparse.Namespace:
+    """Command line shared by the benchmarks: an optional revision to compare against."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--against', metavar='REV', help='also run the benchmark on xhsfwbot.py at this git revision')
+    return parser.parse_args()
+
+
+def modules(args: argparse.Namespace) -> list[tuple[str, ModuleType]]:
+    """(label, module) pairs to benchmark: the reference revision first, if any."""
+    pairs = [('working tree', load())]
+    if args.against:
+        pairs.insert(0, (args.against, load(args.against)))
+    return pairs
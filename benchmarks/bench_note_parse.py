@@ -0,0 +1,58 @@
+"""Time and measure building a Note from a large comment payload.
+
+    python benchmarks/bench_note_parse.py [--against REV]
+
+The payload has 400 comments with up to 25 replies each, and the note is
+opened through an anchorCommentId link.  "construct" only builds the Note, as
+the inline path does; "construct + render" also reads the comments and anchor
+context and renders the page and text twice, as a full job does.  Times are
+the best of three runs; peak is the largest traced allocation of one more run.
+"""
+
+import random
+import time
+import tracemalloc
+
+import _bot
+from payloads import comment_list, note_data
+
+
+def _construct(module, payload):
+    return module.Note(note_data(), comment_list_data=payload, live=True, anchorCommentId='c0', xsec_token='tok')
+
+
+def _construct_and_render(module, payload):
+    note = _construct(module, payload)
+    note.comments
+    note.comments_with_context
+    for _ in range(2):
+        note.to_nodes() if hasattr(note, 'to_nodes') else note.to_html()
+        str(note)
+    return note
+
+
+def _measure(fn, *args) -> tuple[float, float]:
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best * 1000, peak / 1e6
+
+
+def main() -> None:
+    args = _bot.parse_args(__doc__.splitlines()[0])
+    mods = _bot.modules(args)
+    payload = comment_list(random.Random(45), 400, 25, anchor=True)
+    for label, fn in (('construct', _construct), ('construct + render', _construct_and_render)):
+        for rev, module in mods:
+            ms, mb = _measure(fn, module, payload)
+            print(f'{label:20s} {rev:16s} {ms:9.1f} ms  peak {mb:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Time Note's renderings on a note with a large comment section.
+
+    python benchmarks/bench_note_render.py [--against REV]
+
+The payload has 400 comments with up to 50 replies each.  Each rendering is
+timed on a fresh Note whose comments were already parsed; the best of three
+runs is reported.  Revisions with to_nodes() upload its Node JSON and only keep
+to_html() for debugging, as nodes_to_html() of the nodes; to_nodes() is timed
+where it exists.  A second round stubs out replace_redemoji_with_emoji(), which
+older revisions call while rendering, to show what is left of the renderer
+itself; newer ones translate emoji once, while parsing comments.
+"""
+
+import random
+import time
+
+import _bot
+from payloads import comment_list, note_data
+
+
+def _render_ms(module, payload, what: str) -> float:
+    best = float('inf')
+    for _ in range(3):
+        note = module.Note(note_data(), comment_list_data=payload, live=True, xsec_token='tok')
+        note.comments
+        started = time.perf_counter()
+        if what == 'to_nodes':
+            note.to_nodes()
+        elif what == 'to_html':
+            note.to_html()
+        else:
+            str(note)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    args = _bot.parse_args(__doc__.splitlines()[0])
+    mods = _bot.modules(args)
+    payload = comment_list(random.Random(46), 400, 50)
+    replies = sum(len(c['sub_comments']) for c in payload['data']['comments'])
+    print(f"{len(payload['data']['comments'])} comments, {replies} replies")
+    for stubbed in (False, True):
+        if stubbed:
+            print('-- emoji replacement stubbed out --')
+            for _, module in mods:
+                module.replace_redemoji_with_emoji = lambda text: text
+        for what in ('to_html', '__str__', 'to_nodes'):
+            for label, module in mods:
+                if not hasattr(module.Note, what):
+                    continue
+                print(f'{what:8s} {label:16s} {_render_ms(module, payload, what):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
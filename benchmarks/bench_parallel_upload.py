@@ -0,0 +1,150 @@
+"""Time ParallelUploader against sequential part uploads over a fake network.
+
+    python benchmarks/bench_parallel_upload.py [--mb 100] [--rtt-ms 60]
+
+A local TCP server stands in for Telegram: it acknowledges every request
+--rtt-ms after receiving it, and handles requests on one connection
+concurrently, as the real DCs do.  MTProtoSender is replaced by a plain
+connection to that server, so the numbers show how many part round trips are
+in flight, not real MTProto throughput.  The sequential row sends one part at
+a time, as TelegramClient.upload_file does.
+"""
+
+import argparse
+import asyncio
+import struct
+import time
+import types
+
+import _bot
+
+
+class _Connection:
+    """Length-prefixed requests to the stand-in server; replies arrive in order."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self._waiters: list[asyncio.Future[bool]] = []
+
+    async def open(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection('127.0.0.1', self.port)
+        self._rx = asyncio.create_task(self._receive())
+
+    async def _receive(self) -> None:
+        while True:
+            await self._reader.readexactly(1)
+            self._waiters.pop(0).set_result(True)
+
+    def send(self, request) -> asyncio.Future[bool]:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        data = bytes(request)
+        self._writer.write(struct.pack('>I', len(data)) + data)
+        return future
+
+    async def close(self) -> None:
+        self._rx.cancel()
+        self._writer.close()
+
+
+class _Sender(_Connection):
+    """Stands in for MTProtoSender."""
+
+    def __init__(self, auth_key, loggers) -> None:
+        super().__init__(0)
+
+    async def connect(self, port: int) -> None:
+        self.port = port
+        await self.open()
+
+    async def disconnect(self) -> None:
+        await self.close()
+
+
+class _Client:
+    """The parts of TelegramClient that ParallelUploader uses."""
+
+    def __init__(self, bot, port: int, extra_connections: bool = True) -> None:
+        self.port = port
+        self.extra_connections = extra_connections
+        self.part_size = bot.UPLOAD_PART_SIZE
+        self.session = types.SimpleNamespace(dc_id=2, auth_key=b'')
+        self._log = None
+        self._proxy = None
+        self._init_request = bot.functions.InitConnectionRequest(
+            1, 'bench', '1', '1', 'en', '', 'en', query=None)
+        self.main = _Connection(port)
+
+    async def _get_dc(self, dc_id: int):
+        if not self.extra_connections:
+            raise ConnectionError('extra connections disabled')
+        return types.SimpleNamespace(ip_address='127.0.0.1', port=self.port, id=dc_id)
+
+    def _connection(self, ip, port, dc_id, **kwargs) -> int:
+        return port
+
+    async def __call__(self, request):
+        return await self.main.send(request)
+
+    async def upload_file(self, bio, file_name=None, progress_callback=None):
+        data = bio.getvalue()
+        for offset in range(0, len(data), self.part_size):
+            await self.main.send(data[offset:offset + self.part_size])
+            if progress_callback:
+                await progress_callback(min(offset + self.part_size, len(data)), len(data))
+
+
+async def _serve(rtt: float) -> tuple[asyncio.Server, int]:
+    async def handle(reader, writer) -> None:
+        lock = asyncio.Lock()
+
+        async def reply() -> None:
+            await asyncio.sleep(rtt)
+            async with lock:
+                writer.write(b'\x01')
+                await writer.drain()
+        try:
+            while True:
+                size, = struct.unpack('>I', await reader.readexactly(4))
+                await reader.readexactly(size)
+                asyncio.create_task(reply())
+        except asyncio.IncompleteReadError:
+            pass
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def _run(bot, size: int, rtt: float) -> None:
+    server, port = await _serve(rtt)
+    data = bytes(size)
+    runs = [
+        ('sequential (upload_file)', 1, True),
+        ('4 senders', 4, True),
+        ('8 senders', 8, True),
+        ('4 workers, main conn only', 4, False),
+    ]
+    for label, workers, extra in runs:
+        client = _Client(bot, port, extra)
+        await client.main.open()
+        uploader = bot.ParallelUploader(workers=workers, min_bytes=1)
+        started = time.monotonic()
+        await uploader.upload(client, data, 'bench.mp4')
+        elapsed = time.monotonic() - started
+        await client.main.close()
+        print(f'{label:28s} {elapsed:6.2f} s  {size / elapsed / 1048576:7.1f} MB/s')
+    server.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=int, default=100, help='file size in MB')
+    parser.add_argument('--rtt-ms', type=float, default=60, help='round trip per request')
+    args = parser.parse_args()
+    bot = _bot.load()
+    bot.MTProtoSender = _Sender
+    asyncio.run(_run(bot, args.mb * 1024 * 1024, args.rtt_ms / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Time XHS link extraction and get_url_info() per message.
+
+    python benchmarks/bench_xhs_links.py [--against REV]
+
+Revisions without extract_xhs_links() are timed on the URL_REGEX path they
+used instead.  Short links are not resolved: get_redirected_url() is stubbed
+out in every module, so get_url_info() times only the parsing.
+"""
+
+import random
+import re
+import timeit
+
+import _bot
+
+MESSAGES = {
+    'chat, no XHS link': '今天天气不错，我们晚上去吃火锅吧？ https://example.com/menu ' * 3,
+    'share text': '82 【看看这篇笔记】 😆 abc😆 http://xhslink.com/a/AbC12，复制本条信息，打开【小红书】App查看精彩内容！',
+    'full URL': 'https://www.xiaohongshu.com/explore/0123456789abcdef01234567?xsec_token=ABcd=&xsec_source=pc_share',
+}
+
+
+def _extractor(module):
+    if hasattr(module, 'extract_xhs_links'):
+        return module.extract_xhs_links
+    url_regex = module.URL_REGEX
+    return lambda text: [u for u in re.findall(url_regex, text) if 'xhslink.com' in u or 'xiaohongshu.com' in u]
+
+
+def _mixed_messages(count: int) -> list[str]:
+    rng = random.Random(50)
+    messages = []
+    for i in range(count):
+        note_id = ''.join(rng.choice('0123456789abcdef') for _ in range(24))
+        messages.append(rng.choice([
+            f'看看这篇笔记 https://www.xiaohongshu.com/discovery/item/{note_id}?xsec_token=AB{i}=',
+            f'【标题】http://xhslink.com/a/AbC{i}，复制后打开',
+            '没有链接的普通消息 ' * 20,
+            f'https://example.com/{i} and google.com',
+        ]))
+    return messages
+
+
+def main() -> None:
+    args = _bot.parse_args(__doc__.splitlines()[0])
+    mods = _bot.modules(args)
+    for _, module in mods:
+        module.get_redirected_url = lambda url: 'https://www.xiaohongshu.com/discovery/item/' + 'f' * 24
+    mixed = _mixed_messages(6000)
+    for label, module in mods:
+        extract = _extractor(module)
+        seconds = timeit.timeit(lambda: [extract(m) for m in mixed], number=1)
+        print(f'{"mixed messages":18s} {label:16s} extract {1e6 * seconds / len(mixed):7.2f} us/msg')
+    for name, text in MESSAGES.items():
+        for label, module in mods:
+            extract = _extractor(module)
+            extract_us = timeit.timeit(lambda: extract(text), number=20000) / 20000 * 1e6
+            info_us = timeit.timeit(lambda: module.get_url_info(text), number=5000) / 5000 * 1e6
+            print(f'{name:18s} {label:16s} extract {extract_us:7.2f} us  get_url_info {info_us:7.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Synthetic note and comment payloads shaped like the device API's."""
+
+import json
+import random
+from typing import Any
+
+NOTE_ID = '0123456789abcdef01234567'
+
+
+def note_data(title: str = 'Benchmark') -> dict[str, Any]:
+    """Note data for a one-image note."""
+    return {'data': [{
+        'user': {'id': 'u1', 'name': 'Bob', 'red_id': '123', 'image': 'https://x/y.jpg'},
+        'note_list': [{
+            'model_type': 'note', 'title': title, 'type': 'normal', 'desc': 'd\nline [笑哭R]',
+            'time': 1700000000, 'collected_count': 1, 'comments_count': 0, 'shared_count': 0,
+            'liked_count': 0, 'hash_tag': [{'name': 'a'}], 'ip_location': '北京',
+            'images_list': [{
+                'original': 'https://sns-na-i6.xhscdn.com/i1?imageView2/2',
+                'url': 'https://a/b?x', 'url_multi_level': {'low': 'https://a/l?x'},
+            }],
+            'share_info': {'image': '', 'link': f'https://www.xiaohongshu.com/discovery/item/{NOTE_ID}'},
+        }],
+    }]}
+
+
+def _comment(rng: random.Random, cid: str, reply: bool) -> dict[str, Any]:
+    comment: dict[str, Any] = {
+        'id': cid,
+        'content': rng.choice(['', f'hi [笑哭R] #tag[话题]# {cid} <b>&', 'x\ny']),
+        'time': 1700000000 + rng.randrange(10**7),
+        'like_count': rng.randrange(100), 'sub_comment_count': 3,
+        'ip_location': rng.choice(['', '上海', None]),
+        'user': {'userid': 'u' + cid, 'nickname': 'n&' + cid, 'red_id': 'r'},
+        'pictures': [],
+    }
+    if rng.random() < .3:
+        comment['pictures'].append({'origin_url': f'https://sns-note-i6.xhscdn.com/p{cid}?imageView2/2'})
+    if rng.random() < .2:
+        comment['pictures'].append({
+            'origin_url': 'https://sns-note-i6.xhscdn.com/v?imageView2/2',
+            'video_info': json.dumps({'stream': {'h264': [{
+                'master_url': f'https://v/{cid}.mp4', 'backup_urls': [f'https://v/{cid}-bak.mp4'],
+                'width': 1, 'height': 1, 'avg_bitrate': 1,
+            }]}}),
+        })
+    if rng.random() < .2:
+        comment['audio_info'] = {'play_info': {'url': f'https://a/{cid}.m4a'}}
+    if reply and rng.random() < .6:
+        comment['target_comment'] = {'user': {'userid': 't', 'nickname': 'tn'}}
+    return comment
+
+
+def comment_list(rng: random.Random, comments: int, max_replies: int, anchor: bool = False) -> dict[str, Any]:
+    """Comment list data with *comments* comments of up to *max_replies* replies.
+
+    With *anchor*, the first comment gets exactly *max_replies* replies and
+    page_context points at every other one, as for an anchorCommentId link.
+    """
+    data: dict[str, Any] = {'comments': []}
+    for i in range(comments):
+        count = max_replies if anchor and i == 0 else rng.randrange(max_replies + 1)
+        comment = _comment(rng, f'c{i}', False)
+        comment['sub_comments'] = [_comment(rng, f'c{i}s{j}', True) for j in range(count)]
+        data['comments'].append(comment)
+    if anchor:
+        data['page_context'] = json.dumps({'top': [f'c0s{j}' for j in range(0, max_replies, 2)]})
+    return {'data': data}
@@ -56,6 +56,7 @@ CREATE TABLE IF NOT EXISTS users (
     pref_include_live       INTEGER DEFAULT 0,
     pref_use_xsec           INTEGER DEFAULT 0,
     pref_keep_original      INTEGER DEFAULT 0,
+    pref_quality            TEXT    DEFAULT 'balanced',
     created_at     TEXT    NOT NULL,
     updated_at     TEXT    NOT NULL
 );
@@ -67,6 +68,7 @@ CREATE TABLE IF NOT EXISTS groups (
     pref_include_live       INTEGER DEFAULT 0,
     pref_use_xsec           INTEGER DEFAULT 0,
     pref_keep_original      INTEGER DEFAULT 0,
+    pref_quality            TEXT    DEFAULT 'balanced',
     created_at     TEXT    NOT NULL,
     updated_at     TEXT    NOT NULL
 );
@@ -128,6 +130,8 @@ def init_db() -> None:
     for sql in [
         "ALTER TABLE telegraph_logs ADD COLUMN tg_last_name TEXT DEFAULT ''",
         "ALTER TABLE users ADD COLUMN pref_keep_original INTEGER DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN pref_quality TEXT DEFAULT 'balanced'",
+        "ALTER TABLE groups ADD COLUMN pref_quality TEXT DEFAULT 'balanced'",
     ]:
         try:
             conn.execute(sql)
@@ -182,7 +186,7 @@ def upsert_user(
 
 def set_user_pref(tg_user_id: int, key: str, value: Any) -> bool:
     """Set a single preference. Returns True on success."""
-    allowed = {'language', 'pref_send_as_file', 'pref_include_live', 'pref_use_xsec', 'pref_keep_original'}
+    allowed = {'language', 'pref_send_as_file', 'pref_include_live', 'pref_use_xsec', 'pref_keep_original', 'pref_quality'}
     if key not in allowed:
         return False
     now = _now_str()
@@ -208,6 +212,7 @@ def get_user_prefs(tg_user_id: int) -> dict[str, Any]:
             'include_live': bool(user['pref_include_live']),
             'use_xsec': bool(user['pref_use_xsec']),
             'keep_original': bool(user.get('pref_keep_original', 0)),
+            'quality': user.get('pref_quality') or 'balanced',
         }
     return {
         'language': 'en',
@@ -215,6 +220,7 @@ def get_user_prefs(tg_user_id: int) -> dict[str, Any]:
         'include_live': False,
         'use_xsec': False,
         'keep_original': False,
+        'quality': 'balanced',
     }
 
 
@@ -241,7 +247,7 @@ def get_group_config(group_id: int) -> dict[str, Any] | None:
 
 def set_group_pref(group_id: int, key: str, value: Any) -> bool:
     """Set a group preference, creating the row if needed. Returns True on success."""
-    allowed = {'language', 'pref_send_as_file', 'pref_include_live', 'pref_use_xsec', 'pref_keep_original'}
+    allowed = {'language', 'pref_send_as_file', 'pref_include_live', 'pref_use_xsec', 'pref_keep_original', 'pref_quality'}
     if key not in allowed:
         return False
     now = _now_str()
@@ -271,6 +277,7 @@ def get_group_prefs(group_id: int) -> dict[str, Any]:
             'include_live': bool(cfg['pref_include_live']),
             'use_xsec': bool(cfg['pref_use_xsec']),
             'keep_original': bool(cfg['pref_keep_original']),
+            'quality': cfg.get('pref_quality') or 'balanced',
         }
     return {
         'language': 'en',
@@ -278,6 +285,7 @@ def get_group_prefs(group_id: int) -> dict[str, Any]:
         'include_live': False,
         'use_xsec': False,
         'keep_original': False,
+        'quality': 'balanced',
     }
 
 
@@ -315,6 +323,15 @@ def log_telegraph(
     return cur.lastrowid  # type: ignore[return-value]
 
 
+def get_latest_telegraph(note_id: str) -> dict[str, Any] | None:
+    """Return the most recent telegraph log with a page URL for a note."""
+    row = _get_conn().execute(
+        "SELECT * FROM telegraph_logs WHERE note_id = ? AND telegraph_url != '' ORDER BY id DESC LIMIT 1",
+        (note_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
 def get_telegraphs_for_date(date_str: str) -> list[dict[str, Any]]:
     """Return all telegraph logs for a given date (YYYY-MM-DD)."""
     rows = _get_conn().execute(
@@ -85,8 +85,16 @@ _STRINGS['zh_cn'] = {
     'summary_upload_time': '📤 上传：{elapsed}s',
     'summary_size': '📦 大小：{size_mb} MB',
     'summary_duration': '⏱ 时长：{duration}',
+    'video_too_large_skipped': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），已跳过',
+    'video_too_large_no_duration': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），时长未知，已跳过',
+    'video_split_failed': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），无法分割，已跳过',
+    'video_downscale_failed': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），无法压缩，已跳过',
+    'video_remuxed': '⚡ 已重新封装以便边下边播（faststart）',
+    'video_split': '✂️ 已分割为 {count} 段（超过 {limit_mb} MB）',
+    'video_downscaled': '📉 已压缩 {size_mb} MB → {new_mb} MB（超过 {limit_mb} MB）',
     'summary_n_files_sent': '✅ 已发送 {count} 个文件',
     'summary_total_size': '📦 总大小：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count} 个文件发送失败',
     'footer_ai_summary': '✨ AI 摘要',
     'footer_flags': '🏷 标志',
     'footer_actions': '⚡ 操作',
@@ -100,6 +108,10 @@ _STRINGS['zh_cn'] = {
     'action_ai_summary': 'AI 摘要',
     'action_anchor_comment': '锚评论',
     'settings_delete_original': '🗑 删除原始消息',
+    'settings_quality': '🎚 媒体画质',
+    'quality_saver': '省流',
+    'quality_balanced': '均衡',
+    'quality_original': '最佳',
     'settings_group_title': '⚙️ <b>群组设置</b>\n',
     'settings_group_admin_only': '⚠️ 仅群组管理员可修改群组设置。',
 }
@@ -165,8 +177,16 @@ _STRINGS['en'] = {
     'summary_upload_time': '📤 Upload: {elapsed}s',
     'summary_size': '📦 Size: {size_mb} MB',
     'summary_duration': '⏱ Duration: {duration}',
+    'video_too_large_skipped': '⛔ Too large ({size_mb} MB > {limit_mb} MB), skipped',
+    'video_too_large_no_duration': '⛔ Too large ({size_mb} MB > {limit_mb} MB), duration unknown, skipped',
+    'video_split_failed': '⛔ Too large ({size_mb} MB > {limit_mb} MB), could not split, skipped',
+    'video_downscale_failed': '⛔ Too large ({size_mb} MB > {limit_mb} MB), could not downscale, skipped',
+    'video_remuxed': '⚡ Remuxed for streaming (faststart)',
+    'video_split': '✂️ Split into {count} parts (over {limit_mb} MB)',
+    'video_downscaled': '📉 Downscaled {size_mb} MB → {new_mb} MB (over {limit_mb} MB)',
     'summary_n_files_sent': '✅ {count} file(s) sent',
     'summary_total_size': '📦 Total size: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count} file(s) could not be sent',
     'footer_ai_summary': '✨ AI Summary',
     'footer_flags': '🏷 Flags',
     'footer_actions': '⚡ Actions',
@@ -180,6 +200,10 @@ _STRINGS['en'] = {
     'action_ai_summary': 'AI Summary',
     'action_anchor_comment': 'Anchor comment',
     'settings_delete_original': '🗑 Delete original message',
+    'settings_quality': '🎚 Media quality',
+    'quality_saver': 'data saver',
+    'quality_balanced': 'balanced',
+    'quality_original': 'best',
     'settings_group_title': '⚙️ <b>Group Settings</b>\n',
     'settings_group_admin_only': '⚠️ Only group admins can change group settings.',
 }
@@ -245,8 +269,16 @@ _STRINGS['de'] = {
     'summary_upload_time': '📤 Upload: {elapsed}s',
     'summary_size': '📦 Größe: {size_mb} MB',
     'summary_duration': '⏱ Dauer: {duration}',
+    'video_too_large_skipped': '⛔ Zu groß ({size_mb} MB > {limit_mb} MB), übersprungen',
+    'video_too_large_no_duration': '⛔ Zu groß ({size_mb} MB > {limit_mb} MB), Dauer unbekannt, übersprungen',
+    'video_split_failed': '⛔ Zu groß ({size_mb} MB > {limit_mb} MB), Teilen fehlgeschlagen, übersprungen',
+    'video_downscale_failed': '⛔ Zu groß ({size_mb} MB > {limit_mb} MB), Verkleinern fehlgeschlagen, übersprungen',
+    'video_remuxed': '⚡ Für Streaming umgepackt (faststart)',
+    'video_split': '✂️ In {count} Teile geteilt (über {limit_mb} MB)',
+    'video_downscaled': '📉 Verkleinert {size_mb} MB → {new_mb} MB (über {limit_mb} MB)',
     'summary_n_files_sent': '✅ {count} Datei(en) gesendet',
     'summary_total_size': '📦 Gesamtgröße: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count} Datei(en) konnten nicht gesendet werden',
     'footer_ai_summary': '✨ KI-Zusammenfassung',
     'footer_flags': '🏷 Flags',
     'footer_actions': '⚡ Aktionen',
@@ -260,6 +292,10 @@ _STRINGS['de'] = {
     'action_ai_summary': 'KI-Zusammenfassung',
     'action_anchor_comment': 'Anker-Kommentar',
     'settings_delete_original': '🗑 Ursprüngliche Nachricht löschen',
+    'settings_quality': '🎚 Medienqualität',
+    'quality_saver': 'Datensparmodus',
+    'quality_balanced': 'ausgewogen',
+    'quality_original': 'beste',
     'settings_group_title': '⚙️ <b>Gruppeneinstellungen</b>\n',
     'settings_group_admin_only': '⚠️ Nur Gruppenadmins können Gruppeneinstellungen ändern.',
 }
@@ -325,8 +361,16 @@ _STRINGS['he'] = {
     'summary_upload_time': '📤 העלאה: {elapsed}s',
     'summary_size': '📦 גודל: {size_mb} MB',
     'summary_duration': '⏱ משך: {duration}',
+    'video_too_large_skipped': '⛔ גדול מדי ({size_mb} MB > {limit_mb} MB), דולג',
+    'video_too_large_no_duration': '⛔ גדול מדי ({size_mb} MB > {limit_mb} MB), אורך לא ידוע, דולג',
+    'video_split_failed': '⛔ גדול מדי ({size_mb} MB > {limit_mb} MB), הפיצול נכשל, דולג',
+    'video_downscale_failed': '⛔ גדול מדי ({size_mb} MB > {limit_mb} MB), ההקטנה נכשלה, דולג',
+    'video_remuxed': '⚡ נארז מחדש להזרמה (faststart)',
+    'video_split': '✂️ פוצל ל-{count} חלקים (מעל {limit_mb} MB)',
+    'video_downscaled': '📉 הוקטן {size_mb} MB → {new_mb} MB (מעל {limit_mb} MB)',
     'summary_n_files_sent': '✅ {count} קבצים נשלחו',
     'summary_total_size': '📦 גודל כולל: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count} קבצים לא נשלחו',
     'footer_ai_summary': '✨ סיכום AI',
     'footer_flags': '🏷 דגלים',
     'footer_actions': '⚡ פעולות',
@@ -340,6 +384,10 @@ _STRINGS['he'] = {
     'action_ai_summary': 'סיכום AI',
     'action_anchor_comment': 'תגובת עוגן',
     'settings_delete_original': '🗑 מחק הודעה מקורית',
+    'settings_quality': '🎚 איכות מדיה',
+    'quality_saver': 'חיסכון בנתונים',
+    'quality_balanced': 'מאוזן',
+    'quality_original': 'הטובה ביותר',
     'settings_group_title': '⚙️ <b>הגדרות קבוצה</b>\n',
     'settings_group_admin_only': '⚠️ רק מנהלי קבוצה יכולים לשנות הגדרות קבוצה.',
 }
@@ -405,8 +453,16 @@ _STRINGS['eo'] = {
     'summary_upload_time': '📤 Alŝuto: {elapsed}s',
     'summary_size': '📦 Grandeco: {size_mb} MB',
     'summary_duration': '⏱ Daŭro: {duration}',
+    'video_too_large_skipped': '⛔ Tro granda ({size_mb} MB > {limit_mb} MB), preterlasita',
+    'video_too_large_no_duration': '⛔ Tro granda ({size_mb} MB > {limit_mb} MB), daŭro nekonata, preterlasita',
+    'video_split_failed': '⛔ Tro granda ({size_mb} MB > {limit_mb} MB), ne eblis dividi, preterlasita',
+    'video_downscale_failed': '⛔ Tro granda ({size_mb} MB > {limit_mb} MB), ne eblis malgrandigi, preterlasita',
+    'video_remuxed': '⚡ Repakita por fluigo (faststart)',
+    'video_split': '✂️ Dividita en {count} partojn (super {limit_mb} MB)',
+    'video_downscaled': '📉 Malgrandigita {size_mb} MB → {new_mb} MB (super {limit_mb} MB)',
     'summary_n_files_sent': '✅ {count} dosiero(j) sendita(j)',
     'summary_total_size': '📦 Tuta grandeco: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count} dosiero(j) ne sendiĝis',
     'footer_ai_summary': '✨ AI-Resumo',
     'footer_flags': '🏷 Flagoj',
     'footer_actions': '⚡ Agoj',
@@ -420,6 +476,10 @@ _STRINGS['eo'] = {
     'action_ai_summary': 'AI-Resumo',
     'action_anchor_comment': 'Ankra komento',
     'settings_delete_original': '🗑 Forigi originalan mesaĝon',
+    'settings_quality': '🎚 Kvalito de aŭdvidaĵoj',
+    'quality_saver': 'datumŝpara',
+    'quality_balanced': 'ekvilibra',
+    'quality_original': 'plej bona',
     'settings_group_title': '⚙️ <b>Grupaj agordoj</b>\n',
     'settings_group_admin_only': '⚠️ Nur grupaj administrantoj povas ŝanĝi grupajn agordojn.',
 }
@@ -485,8 +545,16 @@ _STRINGS['zh_hk'] = {
     'summary_upload_time': '📤 上傳：{elapsed}s',
     'summary_size': '📦 大小：{size_mb} MB',
     'summary_duration': '⏱ 時長：{duration}',
+    'video_too_large_skipped': '⛔ 影片過大（{size_mb} MB > {limit_mb} MB），已略過',
+    'video_too_large_no_duration': '⛔ 影片過大（{size_mb} MB > {limit_mb} MB），時長不明，已略過',
+    'video_split_failed': '⛔ 影片過大（{size_mb} MB > {limit_mb} MB），無法分割，已略過',
+    'video_downscale_failed': '⛔ 影片過大（{size_mb} MB > {limit_mb} MB），無法壓縮，已略過',
+    'video_remuxed': '⚡ 已重新封裝以便串流播放（faststart）',
+    'video_split': '✂️ 已分割為 {count} 段（超過 {limit_mb} MB）',
+    'video_downscaled': '📉 已壓縮 {size_mb} MB → {new_mb} MB（超過 {limit_mb} MB）',
     'summary_n_files_sent': '✅ 已傳送 {count} 個文件',
     'summary_total_size': '📦 總大小：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count} 個文件傳送失敗',
     'footer_ai_summary': '✨ AI 摘要',
     'footer_flags': '🏷 標誌',
     'footer_actions': '⚡ 操作',
@@ -500,6 +568,10 @@ _STRINGS['zh_hk'] = {
     'action_ai_summary': 'AI 摘要',
     'action_anchor_comment': '錨評論',
     'settings_delete_original': '🗑 刪除原始訊息',
+    'settings_quality': '🎚 媒體畫質',
+    'quality_saver': '慳數據',
+    'quality_balanced': '均衡',
+    'quality_original': '最佳',
     'settings_group_title': '⚙️ <b>群組設定</b>\n',
     'settings_group_admin_only': '⚠️ 只有群組管理員才可修改群組設定。',
 }
@@ -565,8 +637,16 @@ _STRINGS['zh_sg'] = {
     'summary_upload_time': '📤 上传：{elapsed}s',
     'summary_size': '📦 大小：{size_mb} MB',
     'summary_duration': '⏱ 时长：{duration}',
+    'video_too_large_skipped': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），已跳过',
+    'video_too_large_no_duration': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），时长未知，已跳过',
+    'video_split_failed': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），无法分割，已跳过',
+    'video_downscale_failed': '⛔ 视频过大（{size_mb} MB > {limit_mb} MB），无法压缩，已跳过',
+    'video_remuxed': '⚡ 已重新封装以便边下边播（faststart）',
+    'video_split': '✂️ 已分割为 {count} 段（超过 {limit_mb} MB）',
+    'video_downscaled': '📉 已压缩 {size_mb} MB → {new_mb} MB（超过 {limit_mb} MB）',
     'summary_n_files_sent': '✅ 已发送 {count} 个文件',
     'summary_total_size': '📦 总大小：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count} 个文件发送失败',
     'footer_ai_summary': '✨ AI 摘要',
     'footer_flags': '🏷 标志',
     'footer_actions': '⚡ 操作',
@@ -580,6 +660,10 @@ _STRINGS['zh_sg'] = {
     'action_ai_summary': 'AI 摘要',
     'action_anchor_comment': '锚评论',
     'settings_delete_original': '🗑 删除原始消息',
+    'settings_quality': '🎚 媒体画质',
+    'quality_saver': '省流',
+    'quality_balanced': '均衡',
+    'quality_original': '最佳',
     'settings_group_title': '⚙️ <b>群组设置</b>\n',
     'settings_group_admin_only': '⚠️ 仅群组管理员可修改群组设置。',
 }
@@ -645,8 +729,16 @@ _STRINGS['wuu'] = {
     'summary_upload_time': '📤 上传：{elapsed}s',
     'summary_size': '📦 大小：{size_mb} MB',
     'summary_duration': '⏱ 时长：{duration}',
+    'video_too_large_skipped': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），跳过了',
+    'video_too_large_no_duration': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），时长勿晓得，跳过了',
+    'video_split_failed': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），切勿开，跳过了',
+    'video_downscale_failed': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），压勿小，跳过了',
+    'video_remuxed': '⚡ 重新封装好了，好边下边放（faststart）',
+    'video_split': '✂️ 切成 {count} 段了（超过 {limit_mb} MB）',
+    'video_downscaled': '📉 压小了 {size_mb} MB → {new_mb} MB（超过 {limit_mb} MB）',
     'summary_n_files_sent': '✅ 已发送 {count} 个文件',
     'summary_total_size': '📦 总大小：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count} 个文件发勿出去',
     'footer_ai_summary': '✨ AI 摘要',
     'footer_flags': '🏷 标志',
     'footer_actions': '⚡ 操作',
@@ -660,6 +752,10 @@ _STRINGS['wuu'] = {
     'action_ai_summary': 'AI 摘要',
     'action_anchor_comment': '锚评论',
     'settings_delete_original': '🗑 删除原始消息',
+    'settings_quality': '🎚 媒体画质',
+    'quality_saver': '省流量',
+    'quality_balanced': '均衡',
+    'quality_original': '最好',
     'settings_group_title': '⚙️ <b>群组设置</b>\n',
     'settings_group_admin_only': '⚠️ 仅管理员可以修改群组设置。',
 }
@@ -725,8 +821,16 @@ _STRINGS['nan'] = {
     'summary_upload_time': '📤 上传：{elapsed}s',
     'summary_size': '📦 大小：{size_mb} MB',
     'summary_duration': '⏱ 时长：{duration}',
+    'video_too_large_skipped': '⛔ 视频傷大（{size_mb} MB > {limit_mb} MB），跳过矣',
+    'video_too_large_no_duration': '⛔ 视频傷大（{size_mb} MB > {limit_mb} MB），时长毋知，跳过矣',
+    'video_split_failed': '⛔ 视频傷大（{size_mb} MB > {limit_mb} MB），切袂开，跳过矣',
+    'video_downscale_failed': '⛔ 视频傷大（{size_mb} MB > {limit_mb} MB），压袂细，跳过矣',
+    'video_remuxed': '⚡ 重新封装好矣，会当边下边放（faststart）',
+    'video_split': '✂️ 切做 {count} 段矣（超过 {limit_mb} MB）',
+    'video_downscaled': '📉 压细矣 {size_mb} MB → {new_mb} MB（超过 {limit_mb} MB）',
     'summary_n_files_sent': '✅ 已传送 {count} 个档案',
     'summary_total_size': '📦 总大小：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count} 个档案传送失败',
     'footer_ai_summary': '✨ AI 摘要',
     'footer_flags': '🏷 标志',
     'footer_actions': '⚡ 操作',
@@ -740,6 +844,10 @@ _STRINGS['nan'] = {
     'action_ai_summary': 'AI 摘要',
     'action_anchor_comment': '锚评论',
     'settings_delete_original': '🗑 删除原始消息',
+    'settings_quality': '🎚 媒体画质',
+    'quality_saver': '省流量',
+    'quality_balanced': '均衡',
+    'quality_original': '上好',
     'settings_group_title': '⚙️ <b>群组设定</b>\n',
     'settings_group_admin_only': '⚠️ 仅管理员可修改群组设定。',
 }
@@ -805,8 +913,16 @@ _STRINGS['hak'] = {
     'summary_upload_time': '📤 上传：{elapsed}s',
     'summary_size': '📦 大小：{size_mb} MB',
     'summary_duration': '⏱ 时长：{duration}',
+    'video_too_large_skipped': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），跳过了',
+    'video_too_large_no_duration': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），时长毋知，跳过了',
+    'video_split_failed': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），切毋开，跳过了',
+    'video_downscale_failed': '⛔ 视频忒大（{size_mb} MB > {limit_mb} MB），压毋细，跳过了',
+    'video_remuxed': '⚡ 重新封装好了，做得边下边放（faststart）',
+    'video_split': '✂️ 切做 {count} 段了（超过 {limit_mb} MB）',
+    'video_downscaled': '📉 压细了 {size_mb} MB → {new_mb} MB（超过 {limit_mb} MB）',
     'summary_n_files_sent': '✅ 已传送 {count} 个档案',
     'summary_total_size': '📦 总大小：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count} 个档案传送失败',
     'footer_ai_summary': '✨ AI 摘要',
     'footer_flags': '🏷 标志',
     'footer_actions': '⚡ 操作',
@@ -820,6 +936,10 @@ _STRINGS['hak'] = {
     'action_ai_summary': 'AI 摘要',
     'action_anchor_comment': '锚评论',
     'settings_delete_original': '🗑 删除原始消息',
+    'settings_quality': '🎚 媒体画质',
+    'quality_saver': '省流量',
+    'quality_balanced': '均衡',
+    'quality_original': '最好',
     'settings_group_title': '⚙️ <b>群组设定</b>\n',
     'settings_group_admin_only': '⚠️ 仅管理员可修改群组设定。',
 }
@@ -885,8 +1005,16 @@ _STRINGS['lzh'] = {
     'summary_upload_time': '📤 傳：{elapsed}s',
     'summary_size': '📦 大小：{size_mb} MB',
     'summary_duration': '⏱ 時長：{duration}',
+    'video_too_large_skipped': '⛔ 視頻過巨（{size_mb} MB > {limit_mb} MB），略之',
+    'video_too_large_no_duration': '⛔ 視頻過巨（{size_mb} MB > {limit_mb} MB），時長不詳，略之',
+    'video_split_failed': '⛔ 視頻過巨（{size_mb} MB > {limit_mb} MB），不能分，略之',
+    'video_downscale_failed': '⛔ 視頻過巨（{size_mb} MB > {limit_mb} MB），不能縮，略之',
+    'video_remuxed': '⚡ 已重封，可隨載隨播（faststart）',
+    'video_split': '✂️ 分為 {count} 段（逾 {limit_mb} MB）',
+    'video_downscaled': '📉 已縮 {size_mb} MB → {new_mb} MB（逾 {limit_mb} MB）',
     'summary_n_files_sent': '✅ 已發 {count} 文牘',
     'summary_total_size': '📦 合計：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count} 文牘未能發',
     'footer_ai_summary': '✨ AI 撮要',
     'footer_flags': '🏷 旗',
     'footer_actions': '⚡ 操',
@@ -900,6 +1028,10 @@ _STRINGS['lzh'] = {
     'action_ai_summary': 'AI 撮要',
     'action_anchor_comment': '錨評',
     'settings_delete_original': '🗑 刪原消息',
+    'settings_quality': '🎚 媒之質',
+    'quality_saver': '節流',
+    'quality_balanced': '中和',
+    'quality_original': '至精',
     'settings_group_title': '⚙️ <b>群之設</b>\n',
     'settings_group_admin_only': '⚠️ 惟群之管理者可改群之設。',
 }
@@ -965,8 +1097,16 @@ _STRINGS['fr'] = {
     'summary_upload_time': '📤 Envoi : {elapsed}s',
     'summary_size': '📦 Taille : {size_mb} Mo',
     'summary_duration': '⏱ Durée : {duration}',
+    'video_too_large_skipped': '⛔ Trop volumineuse ({size_mb} Mo > {limit_mb} Mo), ignorée',
+    'video_too_large_no_duration': '⛔ Trop volumineuse ({size_mb} Mo > {limit_mb} Mo), durée inconnue, ignorée',
+    'video_split_failed': '⛔ Trop volumineuse ({size_mb} Mo > {limit_mb} Mo), découpage impossible, ignorée',
+    'video_downscale_failed': '⛔ Trop volumineuse ({size_mb} Mo > {limit_mb} Mo), réduction impossible, ignorée',
+    'video_remuxed': '⚡ Remultiplexée pour la lecture en continu (faststart)',
+    'video_split': '✂️ Découpée en {count} parties (plus de {limit_mb} Mo)',
+    'video_downscaled': '📉 Réduite {size_mb} Mo → {new_mb} Mo (plus de {limit_mb} Mo)',
     'summary_n_files_sent': '✅ {count} fichier(s) envoyé(s)',
     'summary_total_size': '📦 Taille totale : {size_mb} Mo',
+    'summary_files_failed': "⚠️ {count} fichier(s) n'ont pas pu être envoyé(s)",
     'footer_ai_summary': '✨ Résumé IA',
     'footer_flags': '🏷 Options',
     'footer_actions': '⚡ Actions',
@@ -980,6 +1120,10 @@ _STRINGS['fr'] = {
     'action_ai_summary': 'Résumé IA',
     'action_anchor_comment': 'Commentaire ancre',
     'settings_delete_original': '🗑 Supprimer le message original',
+    'settings_quality': '🎚 Qualité des médias',
+    'quality_saver': 'économie de données',
+    'quality_balanced': 'équilibrée',
+    'quality_original': 'maximale',
     'settings_group_title': '⚙️ <b>Paramètres du groupe</b>\n',
     'settings_group_admin_only': "⚠️ Seuls les admins du groupe peuvent modifier les paramètres du groupe.",
 }
@@ -1045,8 +1189,16 @@ _STRINGS['es'] = {
     'summary_upload_time': '📤 Subida: {elapsed}s',
     'summary_size': '📦 Tamaño: {size_mb} MB',
     'summary_duration': '⏱ Duración: {duration}',
+    'video_too_large_skipped': '⛔ Demasiado grande ({size_mb} MB > {limit_mb} MB), omitido',
+    'video_too_large_no_duration': '⛔ Demasiado grande ({size_mb} MB > {limit_mb} MB), duración desconocida, omitido',
+    'video_split_failed': '⛔ Demasiado grande ({size_mb} MB > {limit_mb} MB), no se pudo dividir, omitido',
+    'video_downscale_failed': '⛔ Demasiado grande ({size_mb} MB > {limit_mb} MB), no se pudo reducir, omitido',
+    'video_remuxed': '⚡ Reempaquetado para streaming (faststart)',
+    'video_split': '✂️ Dividido en {count} partes (más de {limit_mb} MB)',
+    'video_downscaled': '📉 Reducido {size_mb} MB → {new_mb} MB (más de {limit_mb} MB)',
     'summary_n_files_sent': '✅ {count} archivo(s) enviado(s)',
     'summary_total_size': '📦 Tamaño total: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count} archivo(s) no se pudieron enviar',
     'footer_ai_summary': '✨ Resumen IA',
     'footer_flags': '🏷 Opciones',
     'footer_actions': '⚡ Acciones',
@@ -1060,6 +1212,10 @@ _STRINGS['es'] = {
     'action_ai_summary': 'Resumen IA',
     'action_anchor_comment': 'Comentario ancla',
     'settings_delete_original': '🗑 Borrar el mensaje original',
+    'settings_quality': '🎚 Calidad de los medios',
+    'quality_saver': 'ahorro de datos',
+    'quality_balanced': 'equilibrada',
+    'quality_original': 'máxima',
     'settings_group_title': '⚙️ <b>Configuración del grupo</b>\n',
     'settings_group_admin_only': '⚠️ Solo los admins del grupo pueden cambiar la configuración del grupo.',
 }
@@ -1125,8 +1281,16 @@ _STRINGS['ru'] = {
     'summary_upload_time': '📤 Отправка: {elapsed}с',
     'summary_size': '📦 Размер: {size_mb} МБ',
     'summary_duration': '⏱ Длительность: {duration}',
+    'video_too_large_skipped': '⛔ Слишком большое ({size_mb} МБ > {limit_mb} МБ), пропущено',
+    'video_too_large_no_duration': '⛔ Слишком большое ({size_mb} МБ > {limit_mb} МБ), длительность неизвестна, пропущено',
+    'video_split_failed': '⛔ Слишком большое ({size_mb} МБ > {limit_mb} МБ), не удалось разделить, пропущено',
+    'video_downscale_failed': '⛔ Слишком большое ({size_mb} МБ > {limit_mb} МБ), не удалось сжать, пропущено',
+    'video_remuxed': '⚡ Перепаковано для потокового воспроизведения (faststart)',
+    'video_split': '✂️ Разделено на {count} частей (больше {limit_mb} МБ)',
+    'video_downscaled': '📉 Сжато {size_mb} МБ → {new_mb} МБ (больше {limit_mb} МБ)',
     'summary_n_files_sent': '✅ {count} файл(ов) отправлено',
     'summary_total_size': '📦 Общий размер: {size_mb} МБ',
+    'summary_files_failed': '⚠️ Не удалось отправить файлов: {count}',
     'footer_ai_summary': '✨ ИИ-резюме',
     'footer_flags': '🏷 Флаги',
     'footer_actions': '⚡ Действия',
@@ -1140,6 +1304,10 @@ _STRINGS['ru'] = {
     'action_ai_summary': 'ИИ-резюме',
     'action_anchor_comment': 'Комментарий-якорь',
     'settings_delete_original': '🗑 Удалить исходное сообщение',
+    'settings_quality': '🎚 Качество медиа',
+    'quality_saver': 'экономия трафика',
+    'quality_balanced': 'сбалансированное',
+    'quality_original': 'наилучшее',
     'settings_group_title': '⚙️ <b>Настройки группы</b>\n',
     'settings_group_admin_only': '⚠️ Только администраторы группы могут изменять настройки группы.',
 }
@@ -1205,8 +1373,16 @@ _STRINGS['ja'] = {
     'summary_upload_time': '📤 アップロード：{elapsed}秒',
     'summary_size': '📦 サイズ：{size_mb} MB',
     'summary_duration': '⏱ 再生時間：{duration}',
+    'video_too_large_skipped': '⛔ サイズ超過（{size_mb} MB > {limit_mb} MB）のためスキップ',
+    'video_too_large_no_duration': '⛔ サイズ超過（{size_mb} MB > {limit_mb} MB）、長さ不明のためスキップ',
+    'video_split_failed': '⛔ サイズ超過（{size_mb} MB > {limit_mb} MB）、分割できずスキップ',
+    'video_downscale_failed': '⛔ サイズ超過（{size_mb} MB > {limit_mb} MB）、縮小できずスキップ',
+    'video_remuxed': '⚡ ストリーミング用に再多重化（faststart）',
+    'video_split': '✂️ {count}個に分割（{limit_mb} MB超過）',
+    'video_downscaled': '📉 縮小 {size_mb} MB → {new_mb} MB（{limit_mb} MB超過）',
     'summary_n_files_sent': '✅ {count}個のファイルを送信',
     'summary_total_size': '📦 合計サイズ：{size_mb} MB',
+    'summary_files_failed': '⚠️ {count}個のファイルを送信できませんでした',
     'footer_ai_summary': '✨ AI要約',
     'footer_flags': '🏷 フラグ',
     'footer_actions': '⚡ アクション',
@@ -1220,6 +1396,10 @@ _STRINGS['ja'] = {
     'action_ai_summary': 'AI要約',
     'action_anchor_comment': 'アンカーコメント',
     'settings_delete_original': '🗑 元のメッセージを削除する',
+    'settings_quality': '🎚 メディア画質',
+    'quality_saver': 'データ節約',
+    'quality_balanced': 'バランス',
+    'quality_original': '最高',
     'settings_group_title': '⚙️ <b>グループ設定</b>\n',
     'settings_group_admin_only': '⚠️ グループ管理者のみグループ設定を変更できます。',
 }
@@ -1285,8 +1465,16 @@ _STRINGS['ar'] = {
     'summary_upload_time': '📤 الرفع: {elapsed}ث',
     'summary_size': '📦 الحجم: {size_mb} ميغابايت',
     'summary_duration': '⏱ المدة: {duration}',
+    'video_too_large_skipped': '⛔ كبير جدًا ({size_mb} ميغابايت > {limit_mb} ميغابايت)، تم التخطي',
+    'video_too_large_no_duration': '⛔ كبير جدًا ({size_mb} ميغابايت > {limit_mb} ميغابايت)، المدة غير معروفة، تم التخطي',
+    'video_split_failed': '⛔ كبير جدًا ({size_mb} ميغابايت > {limit_mb} ميغابايت)، تعذر التقسيم، تم التخطي',
+    'video_downscale_failed': '⛔ كبير جدًا ({size_mb} ميغابايت > {limit_mb} ميغابايت)، تعذر التصغير، تم التخطي',
+    'video_remuxed': '⚡ أعيد تغليفه للبث (faststart)',
+    'video_split': '✂️ قُسِّم إلى {count} أجزاء (أكثر من {limit_mb} ميغابايت)',
+    'video_downscaled': '📉 صُغِّر {size_mb} ميغابايت → {new_mb} ميغابايت (أكثر من {limit_mb} ميغابايت)',
     'summary_n_files_sent': '✅ تم إرسال {count} ملف(ات)',
     'summary_total_size': '📦 الحجم الإجمالي: {size_mb} ميغابايت',
+    'summary_files_failed': '⚠️ تعذر إرسال {count} ملف(ات)',
     'footer_ai_summary': '✨ ملخص AI',
     'footer_flags': '🏷 الأعلام',
     'footer_actions': '⚡ الإجراءات',
@@ -1300,6 +1488,10 @@ _STRINGS['ar'] = {
     'action_ai_summary': 'ملخص AI',
     'action_anchor_comment': 'تعليق الرابط',
     'settings_delete_original': '🗑 حذف الرسالة الأصلية',
+    'settings_quality': '🎚 جودة الوسائط',
+    'quality_saver': 'توفير البيانات',
+    'quality_balanced': 'متوازنة',
+    'quality_original': 'الأفضل',
     'settings_group_title': '⚙️ <b>إعدادات المجموعة</b>\n',
     'settings_group_admin_only': '⚠️ يمكن فقط لمديري المجموعة تغيير إعداداتها.',
 }
@@ -1365,8 +1557,16 @@ _STRINGS['pt'] = {
     'summary_upload_time': '📤 Upload: {elapsed}s',
     'summary_size': '📦 Tamanho: {size_mb} MB',
     'summary_duration': '⏱ Duração: {duration}',
+    'video_too_large_skipped': '⛔ Grande demais ({size_mb} MB > {limit_mb} MB), ignorado',
+    'video_too_large_no_duration': '⛔ Grande demais ({size_mb} MB > {limit_mb} MB), duração desconhecida, ignorado',
+    'video_split_failed': '⛔ Grande demais ({size_mb} MB > {limit_mb} MB), não foi possível dividir, ignorado',
+    'video_downscale_failed': '⛔ Grande demais ({size_mb} MB > {limit_mb} MB), não foi possível reduzir, ignorado',
+    'video_remuxed': '⚡ Reempacotado para streaming (faststart)',
+    'video_split': '✂️ Dividido em {count} partes (mais de {limit_mb} MB)',
+    'video_downscaled': '📉 Reduzido {size_mb} MB → {new_mb} MB (mais de {limit_mb} MB)',
     'summary_n_files_sent': '✅ {count} arquivo(s) enviado(s)',
     'summary_total_size': '📦 Tamanho total: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count} arquivo(s) não puderam ser enviados',
     'footer_ai_summary': '✨ Resumo IA',
     'footer_flags': '🏷 Opções',
     'footer_actions': '⚡ Ações',
@@ -1380,6 +1580,10 @@ _STRINGS['pt'] = {
     'action_ai_summary': 'Resumo IA',
     'action_anchor_comment': 'Comentário âncora',
     'settings_delete_original': '🗑 Apagar mensagem original',
+    'settings_quality': '🎚 Qualidade da mídia',
+    'quality_saver': 'economia de dados',
+    'quality_balanced': 'equilibrada',
+    'quality_original': 'máxima',
     'settings_group_title': '⚙️ <b>Configurações do grupo</b>\n',
     'settings_group_admin_only': '⚠️ Apenas administradores do grupo podem alterar suas configurações.',
 }
@@ -1445,8 +1649,16 @@ _STRINGS['ko'] = {
     'summary_upload_time': '📤 업로드: {elapsed}s',
     'summary_size': '📦 크기: {size_mb} MB',
     'summary_duration': '⏱ 재생시간: {duration}',
+    'video_too_large_skipped': '⛔ 너무 큼 ({size_mb} MB > {limit_mb} MB), 건너뜀',
+    'video_too_large_no_duration': '⛔ 너무 큼 ({size_mb} MB > {limit_mb} MB), 길이 알 수 없음, 건너뜀',
+    'video_split_failed': '⛔ 너무 큼 ({size_mb} MB > {limit_mb} MB), 분할 실패, 건너뜀',
+    'video_downscale_failed': '⛔ 너무 큼 ({size_mb} MB > {limit_mb} MB), 축소 실패, 건너뜀',
+    'video_remuxed': '⚡ 스트리밍용으로 리먹싱됨 (faststart)',
+    'video_split': '✂️ {count}개로 분할됨 ({limit_mb} MB 초과)',
+    'video_downscaled': '📉 축소됨 {size_mb} MB → {new_mb} MB ({limit_mb} MB 초과)',
     'summary_n_files_sent': '✅ {count}개 파일 전송 완료',
     'summary_total_size': '📦 총 크기: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count}개 파일을 전송하지 못했습니다',
     'footer_ai_summary': '✨ AI 요약',
     'footer_flags': '🏷 플래그',
     'footer_actions': '⚡ 작업',
@@ -1460,6 +1672,10 @@ _STRINGS['ko'] = {
     'action_ai_summary': 'AI 요약',
     'action_anchor_comment': '앵커 댓글',
     'settings_delete_original': '🗑 원본 메시지 삭제',
+    'settings_quality': '🎚 미디어 화질',
+    'quality_saver': '데이터 절약',
+    'quality_balanced': '균형',
+    'quality_original': '최고',
     'settings_group_title': '⚙️ <b>그룹 설정</b>\n',
     'settings_group_admin_only': '⚠️ 그룹 관리자만 그룹 설정을 변경할 수 있습니다.',
 }
@@ -1525,8 +1741,16 @@ _STRINGS['hi'] = {
     'summary_upload_time': '📤 अपलोड: {elapsed}s',
     'summary_size': '📦 आकार: {size_mb} MB',
     'summary_duration': '⏱ अवधि: {duration}',
+    'video_too_large_skipped': '⛔ बहुत बड़ी ({size_mb} MB > {limit_mb} MB), छोड़ दी गई',
+    'video_too_large_no_duration': '⛔ बहुत बड़ी ({size_mb} MB > {limit_mb} MB), अवधि अज्ञात, छोड़ दी गई',
+    'video_split_failed': '⛔ बहुत बड़ी ({size_mb} MB > {limit_mb} MB), विभाजित नहीं हो सकी, छोड़ दी गई',
+    'video_downscale_failed': '⛔ बहुत बड़ी ({size_mb} MB > {limit_mb} MB), छोटी नहीं हो सकी, छोड़ दी गई',
+    'video_remuxed': '⚡ स्ट्रीमिंग के लिए रीमक्स की गई (faststart)',
+    'video_split': '✂️ {count} भागों में विभाजित ({limit_mb} MB से अधिक)',
+    'video_downscaled': '📉 छोटी की गई {size_mb} MB → {new_mb} MB ({limit_mb} MB से अधिक)',
     'summary_n_files_sent': '✅ {count} फ़ाइलें भेजी गईं',
     'summary_total_size': '📦 कुल आकार: {size_mb} MB',
+    'summary_files_failed': '⚠️ {count} फ़ाइलें नहीं भेजी जा सकीं',
     'footer_ai_summary': '✨ AI सारांश',
     'footer_flags': '🏷 फ़्लैग',
     'footer_actions': '⚡ क्रियाएं',
@@ -1540,6 +1764,10 @@ _STRINGS['hi'] = {
     'action_ai_summary': 'AI सारांश',
     'action_anchor_comment': 'एंकर टिप्पणी',
     'settings_delete_original': '🗑 मूल संदेश हटाएं',
+    'settings_quality': '🎚 मीडिया गुणवत्ता',
+    'quality_saver': 'डेटा सेवर',
+    'quality_balanced': 'संतुलित',
+    'quality_original': 'सर्वश्रेष्ठ',
     'settings_group_title': '⚙️ <b>समूह सेटिंग्स</b>\n',
     'settings_group_admin_only': '⚠️ केवल समूह प्रशासक ही समूह सेटिंग्स बदल सकते हैं।',
 }
@@ -0,0 +1,27 @@
+"""Make xhsfwbot importable from the tests without touching the checkout.
+
+Importing the bot creates log/ and data/ in the working directory, reads
+redtoemoji.json from it and opens the SQLite database next to db.py, so the
+tests run it from a scratch directory with a database of its own.
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix='xhsfwbot-tests-')
+shutil.copy(os.path.join(ROOT, 'redtoemoji.json'), _scratch)
+os.chdir(_scratch)
+
+import db  # noqa: E402
+
+db.DB_PATH = os.path.join(_scratch, 'xhsfwbot.db')
+
+import xhsfwbot  # noqa: E402,F401
+
+logging.disable(logging.CRITICAL)
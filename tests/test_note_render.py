@@ -0,0 +1,56 @@
+"""Golden tests for Note's Telegraph page and message text.
+
+fixtures/note_render.json holds note and comment payloads together with what
+the renderer produced before it was reworked: ``nodes`` is the Telegraph Node
+JSON the old HTML turned into on upload, ``text`` the old ``str(note)``.
+"""
+
+import copy
+import json
+import os
+
+import pytest
+from telegraph.utils import nodes_to_html
+
+import xhsfwbot
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'note_render.json'), encoding='utf-8') as _f:
+    CASES = json.load(_f)
+
+
+def _note(case):
+    return xhsfwbot.Note(
+        copy.deepcopy(case['note_data']),
+        comment_list_data=copy.deepcopy(case['comment_list_data']),
+        live=case['live'],
+        xsec_token=case['xsec_token'],
+        anchorCommentId=case['anchorCommentId'],
+    )
+
+
+def _case_id(case):
+    note = case['note_data']['data'][0]['note_list'][0]
+    comments = len(case['comment_list_data']['data']['comments'])
+    return f"{note['title'] or 'untitled'}-{comments}c-{'tok' if case['xsec_token'] else 'notok'}"
+
+
+@pytest.mark.parametrize('case', CASES, ids=[_case_id(c) for c in CASES])
+def test_to_nodes_matches_golden(case):
+    assert _note(case).to_nodes() == case['nodes']
+
+
+@pytest.mark.parametrize('case', CASES, ids=[_case_id(c) for c in CASES])
+def test_to_html_matches_golden(case):
+    assert _note(case).to_html() == nodes_to_html(case['nodes'])
+
+
+@pytest.mark.parametrize('case', CASES, ids=[_case_id(c) for c in CASES])
+def test_str_matches_golden(case):
+    assert str(_note(case)) == case['text']
+
+
+def test_renderings_are_memoized():
+    note = _note(CASES[-1])
+    assert note.to_nodes() is note.to_nodes()
+    assert note.to_html() is note.to_html()
+    assert str(note) is str(note)
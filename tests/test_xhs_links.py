@@ -0,0 +1,188 @@
+"""Fuzz extract_xhs_links() and get_url_info() against the URL_REGEX path.
+
+The reference below is the link handling the bot had before
+extract_xhs_links(): the general URL_REGEX, filtered down to XHS hosts, and the
+get_url_info() built on it.  Generated share texts must give the same links
+and the same note info, apart from the intentional differences:
+
+- an XHS link glued onto another URL without whitespace yields the XHS part,
+  not the whole URL;
+- a profile link elsewhere in the text no longer hides the note links;
+- texts the old code raised IndexError on are not compared.
+"""
+
+import random
+import re
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+import xhsfwbot
+
+URL_REGEX = r"""(?i)\b((?:https?:(?:/{1,3}|[a-z0-9%])|[a-z0-9.\-]+[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)/)(?:[^\s()<>{}\[\]]+|\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\))+(?:\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\)|[^\s`!()\[\]{};:\'\".,<>?«»""''])|(?:(?<!@)[a-z0-9]+(?:[.\-][a-z0-9]+)*[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)\b/?(?!@)))"""
+
+REDIRECTED = f'https://www.xiaohongshu.com/discovery/item/{"f" * 24}?xsec_token=RT'
+
+
+def old_extract(message_text):
+    # Hosts compare case-insensitively, as XHS_LINK_RE does; the old filter
+    # missed upper-case ones.
+    return [
+        u for u in re.findall(URL_REGEX, message_text)
+        if 'xhslink.com' in u.lower() or 'xiaohongshu.com' in u.lower()
+    ]
+
+
+def old_get_url_info(message_text):
+    xsec_token = ''
+    urls = re.findall(URL_REGEX, message_text)
+    anchorCommentId = ''
+    had_multiple = len(old_extract(message_text)) > 1
+    if len(urls) == 0:
+        return {'success': False, 'msg': 'No URL found in the message.', 'noteId': '', 'xsec_token': '', 'anchorCommentId': ''}
+    elif re.findall(r"[a-z0-9]{24}", message_text) and not re.findall(r"user/profile/[a-z0-9]{24}", message_text):
+        noteId = re.findall(r"[a-z0-9]{24}", message_text)[0]
+        note_url = [u for u in urls if re.findall(r"[a-z0-9]{24}", u) and not re.findall(r"user/profile/[a-z0-9]{24}", u)][0]
+        query = parse_qs(urlparse(str(note_url)).query)
+        xsec_token = query.get('xsec_token', [''])[0]
+        anchorCommentId = query.get('anchorCommentId', [''])[0]
+    elif 'xhslink.com' in message_text or 'xiaohongshu.com' in message_text:
+        xhslink = [u for u in urls if 'xhslink.com' in u][0]
+        redirectPath = REDIRECTED
+        if re.findall(r"https?://(?:www.)?xhslink.com/[a-z]/[A-Za-z0-9]+", xhslink):
+            clean_url = xhsfwbot.get_clean_url(redirectPath)
+            if 'xiaohongshu.com/404' in redirectPath or 'xiaohongshu.com/login' in redirectPath:
+                noteId = re.findall(r"noteId=([a-z0-9]+)", redirectPath)[0]
+                if 'redirectPath=' in redirectPath:
+                    redirectPath = unquote(
+                        redirectPath
+                        .replace('https://www.xiaohongshu.com/login?redirectPath=', '')
+                        .replace('https://www.xiaohongshu.com/404?redirectPath=', '')
+                    )
+            else:
+                noteId = re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/discovery\/item\/([a-z0-9]+)", clean_url)[0]
+            query = parse_qs(urlparse(str(redirectPath)).query)
+        elif re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/discovery\/item\/[0-9a-z]+", xhslink):
+            noteId = re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/discovery\/item\/([a-z0-9]+)", xhslink)[0]
+            query = parse_qs(urlparse(str(xhslink)).query)
+        elif re.findall(r"https?://(?:www.)?xiaohongshu.com/explore/[a-z0-9]+", message_text):
+            noteId = re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/explore\/([a-z0-9]+)", xhslink)[0]
+            query = parse_qs(urlparse(str(xhslink)).query)
+        else:
+            return {'success': False, 'msg': 'Invalid URL or the note is no longer available.', 'noteId': '', 'xsec_token': ''}
+        xsec_token = query.get('xsec_token', [''])[0]
+        anchorCommentId = query.get('anchorCommentId', [''])[0]
+    else:
+        return {'success': False, 'msg': 'Invalid URL.', 'noteId': '', 'xsec_token': ''}
+    return {'success': True, 'msg': 'Success.', 'noteId': noteId, 'xsec_token': xsec_token, 'anchorCommentId': anchorCommentId, 'had_multiple': had_multiple}
+
+
+def _note_id(rng):
+    return ''.join(rng.choice('0123456789abcdef') for _ in range(24))
+
+
+def _link(rng):
+    scheme = rng.choice(['https://', 'http://', 'HTTPS://', ''])
+    www = rng.choice(['www.', ''])
+    query = rng.choice([
+        '', f'?xsec_token=AB{rng.randrange(999)}=&xsec_source=app_share',
+        f'?anchorCommentId={_note_id(rng)}&xsec_token=x', '?a=(b)',
+    ])
+    kind = rng.randrange(10)
+    if kind == 0:
+        return f'{scheme}xhslink.com/{rng.choice("abmo")}/{rng.choice(["AbC12", "x9Z"])}'
+    if kind == 1:
+        return f'{scheme}{www}xiaohongshu.com/discovery/item/{_note_id(rng)}{query}'
+    if kind == 2:
+        return f'{scheme}{www}xiaohongshu.com/explore/{_note_id(rng)}{query}'
+    if kind == 3:
+        return f'{scheme}{www}xiaohongshu.com/user/profile/{_note_id(rng)}{query}'
+    if kind == 4:
+        return f'{scheme}{www}xiaohongshu.com/'
+    if kind == 5:
+        return f'{scheme}xhslink.com/{rng.choice(["AbC", ""])}'
+    if kind == 6:
+        return rng.choice([
+            'https://example.com/x', 'google.com', 'foo.cn/bar', 'https://t.me/x?u=xiaohongshu.com',
+            'a@xiaohongshu.com', 'https://t.me/x',
+        ])
+    if kind == 7:
+        return f'https://{www}xiaohongshu.com/a/{_note_id(rng)}'
+    if kind == 8:
+        return f'{scheme}{www.upper()}XIAOHONGSHU.COM/explore/{_note_id(rng)}{query}'
+    return f'{scheme}{www}xiaohongshu.com/discovery/item/{_note_id(rng)}?t=1'
+
+
+def _share_text(rng):
+    parts = []
+    for _ in range(rng.randrange(1, 4)):
+        parts.append(rng.choice(['', '看看这篇笔记 ', '【标题】', 'hi ', '(', '「', 'Check: ']))
+        parts.append(_link(rng))
+        parts.append(rng.choice(['', ' ', '。', '，复制后打开', ')', '」', '.', ', ', '! ', '"']))
+    return ''.join(parts)
+
+
+TEXTS = [_share_text(random.Random(seed)) for seed in range(5000)]
+
+
+def _upper_case_short_link(text):
+    # The short link get_url_info() resolves, if its scheme or host is upper-case.
+    link = next((u for u in xhsfwbot.extract_xhs_links(text) if 'xhslink.com' in u.lower()), '')
+    return bool(re.search(r'(?i)https?://(?:www.)?xhslink.com/[a-z]/[A-Za-z0-9]+', link)
+                and not re.search(r'https?://(?:www.)?xhslink.com/[a-z]/[A-Za-z0-9]+', link))
+
+
+@pytest.fixture(autouse=True)
+def _no_redirects(monkeypatch):
+    monkeypatch.setattr(xhsfwbot, 'get_redirected_url', lambda url: REDIRECTED)
+
+
+def test_extract_matches_url_regex():
+    for text in TEXTS:
+        old = old_extract(text)
+        new = xhsfwbot.extract_xhs_links(text)
+        if old != new:
+            # Glued links: the XHS part of each old match.
+            assert [x for u in old for x in xhsfwbot.extract_xhs_links(u)] == new, text
+
+
+def test_get_url_info_matches_url_regex_path():
+    compared = 0
+    for text in TEXTS:
+        try:
+            old = old_get_url_info(text)
+        except IndexError:
+            continue
+        new = xhsfwbot.get_url_info(text)
+        if old == new or not (old['success'] or new['success']):
+            compared += 1
+        elif new['success'] and not old['success'] and _upper_case_short_link(text):
+            # The old code missed short links with an upper-case scheme or host.
+            pass
+        elif old_extract(text) != xhsfwbot.extract_xhs_links(text):
+            # Glued links: the same note, but query parameters and
+            # had_multiple now come from the XHS parts alone.
+            assert (old['success'], old['noteId']) == (new['success'], new['noteId']), text
+        else:
+            # The old code skipped every note link once a profile link was present.
+            assert 'user/profile/' in text, text
+    assert compared > len(TEXTS) // 2
+
+
+@pytest.mark.parametrize('text, links', [
+    ('no links here', []),
+    ('see HTTPS://WWW.XIAOHONGSHU.COM/explore/0123456789abcdef01234567 ok',
+     ['HTTPS://WWW.XIAOHONGSHU.COM/explore/0123456789abcdef01234567']),
+    ('【标题】http://xhslink.com/a/AbC12 复制后打开', ['http://xhslink.com/a/AbC12']),
+    ('(https://www.xiaohongshu.com/explore/0123456789abcdef01234567?a=(b))',
+     ['https://www.xiaohongshu.com/explore/0123456789abcdef01234567?a=(b)']),
+    ('mail a@xiaohongshu.com', []),
+])
+def test_extract_examples(text, links):
+    assert xhsfwbot.extract_xhs_links(text) == links
+
+
+@pytest.mark.parametrize('text', ['http://XHSLINK.COM/a/AbCd12', 'HTTPS://www.XhsLink.com/a/AbCd12'])
+def test_get_url_info_upper_case_short_link(text):
+    info = xhsfwbot.get_url_info(text)
+    assert info['success'] and info['noteId'] == 'f' * 24
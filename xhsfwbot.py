@@ -3,13 +3,23 @@ import sys
 import re
 import json
 import time
+import copy
 import asyncio
+import heapq
+import hashlib
 import logging
 import psutil
 import requests
 import traceback
+import shutil
+import signal
 import subprocess
+import tempfile
 import platform
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone
 from pprint import pformat
 from dotenv import load_dotenv
@@ -20,7 +30,11 @@ from io import BytesIO
 from google import genai
 from google.genai import types as genai_types
 
-from telethon import TelegramClient, events, Button
+from telethon import TelegramClient, events, Button, utils as tl_utils
+from telethon.helpers import generate_random_long
+from telethon.network import MTProtoSender
+from telethon.tl.custom import InputSizedFile
+from telethon.tl.alltlobjects import LAYER
 from telethon.tl import functions, types as tl_types
 from telethon.tl.types import (
     DocumentAttributeAudio,
@@ -34,9 +48,11 @@ from telethon.errors import (
     MessageDeleteForbiddenError,
     NetworkMigrateError,
     QueryIdInvalidError,
+    SlowModeWaitError,
 )
 
 from telegraph.aio import Telegraph  # type: ignore
+from telegraph.utils import nodes_to_html  # type: ignore
 from PIL import Image
 from pyzbar.pyzbar import decode  # pyright: ignore[reportUnknownVariableType, reportMissingTypeStubs]
 
@@ -82,6 +98,14 @@ if _migrated:
 
 max_concurrent_requests = 5
 processing_semaphore = asyncio.Semaphore(max_concurrent_requests)
+# Inline queries don't queue behind media jobs: they get their own slots and
+# must be answered within INLINE_DEADLINE seconds of arriving.
+INLINE_CONCURRENCY = max(1, int(os.getenv('INLINE_CONCURRENCY', '3')))
+INLINE_DEADLINE = float(os.getenv('INLINE_DEADLINE', '25'))
+# Answer inline queries at once with a card built from the link, and edit the
+# chosen message into the full card when it is ready (needs inline feedback
+# enabled with @BotFather /setinlinefeedback).
+INLINE_TWO_PHASE = os.getenv('INLINE_TWO_PHASE', '0').strip().lower() in ('1', 'true', 'yes')
 
 # ── AI summary limits ─────────────────────────────────────────────────────────
 
@@ -90,14 +114,92 @@ processing_semaphore = asyncio.Semaphore(max_concurrent_requests)
 # hint is hidden and the 🤔 reaction is rejected.
 AI_SUMMARY_MAX_MEDIA_BYTES = 8 * 1024 * 1024  # 8 MB
 
+# ── CDN mirrors ───────────────────────────────────────────────────────────────
+
+# Mirrors tried for rewritable xhscdn URLs, in initial preference order.  At
+# runtime they are re-ranked by measured throughput and error rate.
+CDN_IMAGE_HOSTS = [h.strip() for h in os.getenv(
+    'CDN_IMAGE_HOSTS', 'sns-na-i6.xhscdn.com,sns-na-i3.xhscdn.com,sns-na-i8.xhscdn.com',
+).split(',') if h.strip()] or ['sns-na-i6.xhscdn.com']
+CDN_VIDEO_HOSTS = [h.strip() for h in os.getenv(
+    'CDN_VIDEO_HOSTS', 'sns-bak-v1.xhscdn.com,sns-bak-v6.xhscdn.com,sns-bak-v8.xhscdn.com',
+).split(',') if h.strip()] or ['sns-bak-v1.xhscdn.com']
+# Seconds to wait for a mirror's response headers before hedging to the next
+# one (0 disables hedging).
+CDN_HEDGE_DELAY = float(os.getenv('CDN_HEDGE_DELAY', '1.5'))
+CDN_REQUEST_TIMEOUT = 30
+
+# ── Parallel uploads ──────────────────────────────────────────────────────────
+
+# Files at least PARALLEL_UPLOAD_MIN_MB large are uploaded to Telegram in
+# 512 KB parts over PARALLEL_UPLOAD_WORKERS connections at once.
+PARALLEL_UPLOAD_WORKERS = int(os.getenv('PARALLEL_UPLOAD_WORKERS', '4'))
+PARALLEL_UPLOAD_MIN_BYTES = int(float(os.getenv('PARALLEL_UPLOAD_MIN_MB', '10')) * 1024 * 1024)
+# Album members uploaded at the same time (album order is kept regardless).
+ALBUM_UPLOAD_CONCURRENCY = max(1, int(os.getenv('ALBUM_UPLOAD_CONCURRENCY', '3')))
+# Comment-thread media downloaded ahead of the thread's (ordered) sends.
+COMMENT_PREFETCH_CONCURRENCY = max(1, int(os.getenv('COMMENT_PREFETCH_CONCURRENCY', '4')))
+
+# ── Media tools ───────────────────────────────────────────────────────────────
+
+# ffmpeg/ffprobe processes allowed to run at once, and their default timeout.
+MEDIA_TOOL_WORKERS = int(os.getenv('MEDIA_TOOL_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+MEDIA_TOOL_TIMEOUT = 15
+# Transcoded voice comments are cached here, oldest evicted past the size cap.
+AUDIO_CACHE_DIR = os.path.join('data', 'audio_cache')
+AUDIO_CACHE_MAX_BYTES = int(float(os.getenv('AUDIO_CACHE_MAX_MB', '200')) * 1024 * 1024)
+# Telegram's upload limit.  Longer videos are sent per VIDEO_OVERSIZE_POLICY:
+# 'split' into parts by stream copy, 'downscale' by re-encoding, or 'skip'
+# (checked against Content-Length, before the download starts).
+TELEGRAM_MAX_UPLOAD_BYTES = int(float(os.getenv('TELEGRAM_MAX_UPLOAD_MB', '2000')) * 1024 * 1024)
+VIDEO_OVERSIZE_POLICY = os.getenv('VIDEO_OVERSIZE_POLICY', 'split').strip().lower()
+
+# ── Bandwidth ─────────────────────────────────────────────────────────────────
+
+# Global caps in MB/s shared by all jobs (0 = unlimited).  Set them slightly
+# below the link speed so the fair scheduler, rather than the network, decides
+# which job gets the bandwidth.
+BANDWIDTH_DOWNLOAD_MBPS = float(os.getenv('BANDWIDTH_DOWNLOAD_MBPS', '0'))
+BANDWIDTH_UPLOAD_MBPS = float(os.getenv('BANDWIDTH_UPLOAD_MBPS', '0'))
+# A job's fair share halves once it has moved this many bytes and keeps
+# shrinking after that, so small notes overtake long-running videos.
+BANDWIDTH_SMALL_JOB_BYTES = 8 * 1024 * 1024
+
+
+# ── Progress messages ─────────────────────────────────────────────────────────
+
+# Progress edits go out at most once per PROGRESS_CHAT_INTERVAL seconds in a
+# chat and PROGRESS_GLOBAL_EDITS_PER_SEC across the bot; newer states replace
+# ones still waiting.
+PROGRESS_CHAT_INTERVAL = float(os.getenv('PROGRESS_CHAT_INTERVAL', '2'))
+PROGRESS_GLOBAL_EDITS_PER_SEC = float(os.getenv('PROGRESS_GLOBAL_EDITS_PER_SEC', '20'))
+# Sent/edited messages whose content is remembered for local re-rendering.
+MESSAGE_STATE_MAX_ENTRIES = 5000
+
+
+# ── Outbound requests ─────────────────────────────────────────────────────────
+
+# Telegram's bot limits: about 30 messages/s overall, 1/s in a private chat
+# and 20/min in a group (short bursts are tolerated).  Flood waits are slept
+# out and retried for up to OUTBOUND_MAX_FLOOD_WAIT seconds per request.
+OUTBOUND_GLOBAL_PER_SEC = float(os.getenv('OUTBOUND_GLOBAL_PER_SEC', '30'))
+OUTBOUND_CHAT_PER_SEC = float(os.getenv('OUTBOUND_CHAT_PER_SEC', '1'))
+OUTBOUND_GROUP_PER_MIN = float(os.getenv('OUTBOUND_GROUP_PER_MIN', '20'))
+OUTBOUND_CHAT_BURST = 5
+OUTBOUND_MAX_FLOOD_WAIT = float(os.getenv('OUTBOUND_MAX_FLOOD_WAIT', '600'))
+
 
 class _OperationCancelled(Exception):
     """Raised when a progress operation is cancelled by the user."""
 
 
+class _VideoSkipped(Exception):
+    """Raised to abandon a video download that could not be sent anyway."""
+
+
 class _ProgressControl:
     """Allows pausing/resuming/cancelling a running download/upload via inline keyboard buttons."""
-    __slots__ = ('_event', 'cancelled', 'paused', 'chat_id')
+    __slots__ = ('_event', 'cancelled', 'paused', 'chat_id', 'transferred')
 
     def __init__(self, chat_id: int) -> None:
         self._event = asyncio.Event()
@@ -105,6 +207,12 @@ class _ProgressControl:
         self.cancelled = False
         self.paused = False
         self.chat_id = chat_id
+        self.transferred = 0  # bytes moved so far, for the bandwidth scheduler
+
+    @property
+    def weight(self) -> float:
+        """Fair-share weight: starts at 1 and shrinks as the job moves more data."""
+        return 1 / (1 + self.transferred / BANDWIDTH_SMALL_JOB_BYTES)
 
     async def check(self) -> None:
         """Call periodically in loops. Blocks while paused; raises on cancel."""
@@ -163,7 +271,7 @@ def _abort_url_buttons(
         sep = '&' if anchor_qs else '?'
         xsec_url = f'{clean}{sep}xsec_token={quote(xsec_token)}'
         url_btns.append(Button.url('⚠️ xsec_token', xsec_url))
-    if original_url and 'xhslink.com' in original_url:
+    if original_url and 'xhslink.com' in original_url.lower():
         url_btns.append(Button.url('☣️ Original', original_url))
     rows: list[list[Button]] = [url_btns]
     if telegraph_url:
@@ -225,15 +333,34 @@ help_config = load_help_config()
 
 with open('redtoemoji.json', 'r', encoding='utf-8') as _f:
     redtoemoji: dict = json.load(_f)
-
-URL_REGEX = r"""(?i)\b((?:https?:(?:/{1,3}|[a-z0-9%])|[a-z0-9.\-]+[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)/)(?:[^\s()<>{}\[\]]+|\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\))+(?:\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\)|[^\s`!()\[\]{};:\'\".,<>?«»""''])|(?:(?<!@)[a-z0-9]+(?:[.\-][a-z0-9]+)*[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)\b/?(?!@)))"""
+# Every RED emoji code in one alternation, longest first, so text is
+# translated in a single pass.
+_REDEMOJI_RE = re.compile('|'.join(re.escape(k) for k in sorted(redtoemoji, key=len, reverse=True)))
+
+# XHS links (xhslink.com share links and xiaohongshu.com URLs), matched where
+# a general URL matcher would start and end them: trailing punctuation and
+# unbalanced brackets are left out.
+_XHS_HOST = r"(?:[a-z0-9\-]+\.)*(?:xhslink|xiaohongshu)\.com"
+_URL_PART = r"""(?:[^\s()<>{}\[\]]+|\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\))"""
+_URL_END = r"""(?:\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\)|[^\s`!()\[\]{};:\'\".,<>?«»""''])"""
+XHS_LINK_RE = re.compile(
+    rf"(?i)\b(?:https?:/{{0,3}}{_XHS_HOST}(?:{_URL_PART}*{_URL_END})?"
+    rf"|{_XHS_HOST}/{_URL_PART}+{_URL_END}"
+    rf"|(?<!@){_XHS_HOST}\b/?(?!@))"
+)
+_NOTE_ID_RE = re.compile(r"[a-z0-9]{24}")
+_PROFILE_ID_RE = re.compile(r"user/profile/[a-z0-9]{24}")
+_SHORT_LINK_RE = re.compile(r"https?://(?:www.)?xhslink.com/[a-z]/[A-Za-z0-9]+", re.IGNORECASE)
+_DISCOVERY_ID_RE = re.compile(r"https?:\/\/(?:www.)?xiaohongshu.com\/discovery\/item\/([a-z0-9]+)", re.IGNORECASE)
+_EXPLORE_ID_RE = re.compile(r"https?:\/\/(?:www.)?xiaohongshu.com\/explore\/([a-z0-9]+)", re.IGNORECASE)
+_REDIRECT_NOTE_ID_RE = re.compile(r"noteId=([a-z0-9]+)")
 
 # ── Pure-Python helpers (identical to xhsfwbot.py) ────────────────────────────
 
 def replace_redemoji_with_emoji(text: str) -> str:
-    for red_emoji, emoji in redtoemoji.items():
-        text = text.replace(red_emoji, emoji)
-    return text
+    if '[' not in text:
+        return text
+    return _REDEMOJI_RE.sub(lambda m: redtoemoji[m.group(0)], text)
 
 
 def tg_msg_escape_html(t: str | int) -> str:
@@ -429,12 +556,1015 @@ def convert_timestamp_to_timestr(timestamp: int) -> str:
     return utc_plus_8.strftime('%Y-%m-%d %H:%M:%S')
 
 
+@lru_cache(maxsize=4096)
+def _timestamp_line(timestamp: int) -> str:
+    """Clock emoji and UTC+8 time, as shown under notes and comments."""
+    return f'{get_time_emoji(timestamp)} {convert_timestamp_to_timestr(timestamp)}'
+
+
 def remove_image_url_params(url: str) -> str:
     for k, v in parse_qs(url).items():
         url = url.replace(f'&{k}={v[0]}', '')
     return url
 
 
+# ── Rendered message state ─────────────────────────────────────────────────────
+
+class _MessageState:
+    __slots__ = ('msg', 'text', 'entities', 'buttons')
+
+    def __init__(self, msg: Any) -> None:
+        self.msg = msg
+        self.text: str = msg.message or ''
+        self.entities: list[Any] | None = msg.entities
+        self.buttons: Any = msg.reply_markup
+
+
+class MessageStateStore:
+    """The last known content of every message this bot sent or edited.
+
+    Filled from the ``Message`` objects Telegram returns for our own sends and
+    edits, so handlers can rebuild a message (text, formatting entities and
+    buttons) without reading it back with ``get_messages``.  Least recently
+    rendered entries are dropped past *max_entries*.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._states: OrderedDict[tuple[int, int], _MessageState] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, msg: Any) -> None:
+        if not isinstance(msg, tl_types.Message) or msg.chat_id is None:
+            return
+        key = (msg.chat_id, msg.id)
+        self._states[key] = _MessageState(msg)
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+
+    def get(self, chat_id: int, msg_id: int) -> _MessageState | None:
+        state = self._states.get((chat_id, msg_id))
+        if state is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return state
+
+    def forget(self, chat_id: int, msg_ids: Any) -> None:
+        for msg_id in (msg_ids if isinstance(msg_ids, (list, tuple, set)) else [msg_ids]):
+            self._states.pop((chat_id, getattr(msg_id, 'id', msg_id)), None)
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        return [f'tracked messages: {len(self._states)}/{self.max_entries}, '
+                f'{self.hits} lookups served, {self.misses} misses']
+
+
+message_states = MessageStateStore(MESSAGE_STATE_MAX_ENTRIES)
+
+
+# ── Outbound scheduler ─────────────────────────────────────────────────────────
+
+# Request priorities: answers the user is waiting on, then text messages,
+# edits and deletes, then media, then progress-bar edits (which would
+# otherwise take a group's few tokens ahead of the content they report on).
+OUTBOUND_INTERACTIVE, OUTBOUND_MESSAGE, OUTBOUND_MEDIA, OUTBOUND_PROGRESS = 0, 1, 2, 3
+_OUTBOUND_PRIORITY: dict[type, int] = {
+    functions.messages.SetBotCallbackAnswerRequest: OUTBOUND_INTERACTIVE,
+    functions.messages.SetInlineBotResultsRequest: OUTBOUND_INTERACTIVE,
+    functions.messages.SendReactionRequest: OUTBOUND_MESSAGE,
+    functions.messages.SendMessageRequest: OUTBOUND_MESSAGE,
+    functions.messages.EditMessageRequest: OUTBOUND_MESSAGE,
+    functions.messages.EditInlineBotMessageRequest: OUTBOUND_MESSAGE,
+    functions.messages.DeleteMessagesRequest: OUTBOUND_MESSAGE,
+    functions.channels.DeleteMessagesRequest: OUTBOUND_MESSAGE,
+    functions.messages.SendMediaRequest: OUTBOUND_MEDIA,
+    functions.messages.SendMultiMediaRequest: OUTBOUND_MEDIA,
+    functions.messages.ForwardMessagesRequest: OUTBOUND_MEDIA,
+}
+
+# Set while a scheduled request is inside Telethon, so flood waits reach the
+# scheduler instead of being slept on by the library.
+_outbound_active: ContextVar[bool] = ContextVar('_outbound_active', default=False)
+# Cleared by callers that handle flood waits themselves (the progress renderer
+# drops stale edits rather than retrying them).
+_outbound_retry: ContextVar[bool] = ContextVar('_outbound_retry', default=True)
+# Set by the progress renderer, whose edits go out at OUTBOUND_PROGRESS.
+_outbound_progress: ContextVar[bool] = ContextVar('_outbound_progress', default=False)
+
+
+class _TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'stamp', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+
+    def ready_at(self, now: float, need: float = 1.0) -> float:
+        """When *need* tokens are available (``now`` if they already are)."""
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        else:
+            self.tokens = self.capacity
+        self.stamp = now
+        at = now if self.tokens >= need else now + (need - self.tokens) / self.rate
+        return max(at, self.blocked_until)
+
+    @property
+    def idle(self) -> bool:
+        return self.tokens >= self.capacity and self.blocked_until <= self.stamp
+
+
+def _request_chat_id(request: Any) -> int | None:
+    peer = getattr(request, 'peer', None) or getattr(request, 'channel', None)
+    if peer is None:
+        return None
+    try:
+        return tl_utils.get_peer_id(peer)
+    except (TypeError, ValueError):
+        return None
+
+
+class OutboundScheduler:
+    """Paces outgoing Telegram requests under the bot API flood limits.
+
+    Each request waits for a token from the global bucket and from its
+    chat's bucket (groups refill slower than private chats; interactive
+    answers only need a global token).  Waiting requests are granted in
+    priority order, so callback and inline answers overtake queued media.
+    Progress-bar edits come last and only take a chat token when another
+    one is left over, so the content they report on is not held back.
+    A ``FloodWaitError`` blocks the chat (or everything, for requests with
+    no chat) for the requested time and the request is retried, giving up
+    only after ``max_flood_wait`` seconds of waiting in total.
+    """
+
+    def __init__(
+        self, global_rate: float, chat_rate: float, group_rate: float,
+        burst: float, max_flood_wait: float,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_flood_wait = max_flood_wait
+        self._global = _TokenBucket(global_rate, global_rate)
+        self._chats: dict[int, _TokenBucket] = {}
+        self._waiters: list[tuple[int, int, int | None, asyncio.Future[None]]] = []
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: asyncio.Task[None] | None = None
+        self.sent = [0, 0, 0, 0]
+        self.queue_wait = [0.0, 0.0, 0.0, 0.0]
+        self.max_queue_wait = 0.0
+        self.flood_waits = 0
+        self.flood_wait_time = 0
+        self.gave_up = 0
+
+    def _bucket(self, chat_id: int) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 1000:
+                self._chats = {c: b for c, b in self._chats.items() if not b.idle}
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = _TokenBucket(rate, self.burst)
+        return bucket
+
+    async def acquire(self, chat_id: int | None, priority: int) -> None:
+        """Wait until a request to *chat_id* may be sent."""
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append((priority, self._seq, chat_id, fut))
+        self._seq += 1
+        self._wakeup.set()
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await fut
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+
+    async def _dispatch(self) -> None:
+        try:
+            while True:
+                self._waiters = [w for w in self._waiters if not w[3].done()]
+                if not self._waiters:
+                    return
+                self._waiters.sort()
+                now = time.monotonic()
+                global_at = self._global.ready_at(now)
+                next_at = float('inf')
+                for waiter in self._waiters:
+                    priority, _, chat_id, fut = waiter
+                    bucket = self._bucket(chat_id) if chat_id is not None and priority != OUTBOUND_INTERACTIVE else None
+                    need = min(2.0, bucket.capacity) if bucket and priority == OUTBOUND_PROGRESS else 1.0
+                    at = max(global_at, bucket.ready_at(now, need)) if bucket else global_at
+                    if at <= now:
+                        self._global.tokens -= 1
+                        if bucket:
+                            bucket.tokens -= 1
+                        fut.set_result(None)
+                        break
+                    next_at = min(next_at, at)
+                else:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=next_at - now)
+                    except TimeoutError:
+                        pass
+        finally:
+            self._dispatcher = None
+
+    def block(self, chat_id: int | None, seconds: float) -> None:
+        """Hold back requests to *chat_id* (all requests if None) for *seconds*."""
+        bucket = self._bucket(chat_id) if chat_id is not None else self._global
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+
+    async def call(self, chat_id: int | None, priority: int, send: Any, retry: bool = True) -> Any:
+        """Run ``await send()`` when allowed, retrying it after flood waits."""
+        waited = 0
+        while True:
+            queued = time.monotonic()
+            await self.acquire(chat_id, priority)
+            wait = time.monotonic() - queued
+            self.queue_wait[priority] += wait
+            self.max_queue_wait = max(self.max_queue_wait, wait)
+            try:
+                result = await send()
+                self.sent[priority] += 1
+                return result
+            except (FloodWaitError, SlowModeWaitError) as e:
+                seconds = max(1, e.seconds)
+                self.flood_waits += 1
+                self.flood_wait_time += seconds
+                self.block(chat_id, seconds)
+                waited += seconds
+                if not retry or waited > self.max_flood_wait:
+                    self.gave_up += 1
+                    raise
+                bot_logger.warning(f"Flood wait of {seconds}s in chat {chat_id}, retrying {type(e).__name__}")
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        names = ('interactive', 'messages', 'media', 'progress')
+        waits = ', '.join(
+            f'{name} {self.sent[p]} (avg wait {self.queue_wait[p] / self.sent[p] * 1000 if self.sent[p] else 0:.0f} ms)'
+            for p, name in enumerate(names)
+        )
+        return [
+            f'sent: {waits}',
+            f'queued now: {len(self._waiters)}, max wait {self.max_queue_wait:.1f}s',
+            f'flood waits: {self.flood_waits} ({self.flood_wait_time}s), gave up {self.gave_up}',
+        ]
+
+
+outbound = OutboundScheduler(
+    OUTBOUND_GLOBAL_PER_SEC, OUTBOUND_CHAT_PER_SEC, OUTBOUND_GROUP_PER_MIN / 60,
+    OUTBOUND_CHAT_BURST, OUTBOUND_MAX_FLOOD_WAIT,
+)
+
+
+class ScheduledTelegramClient(TelegramClient):
+    """TelegramClient whose outgoing messages, edits and answers go through :data:`outbound`.
+
+    Messages it sends or edits are also recorded in :data:`message_states`.
+    """
+
+    async def send_message(self, *args: Any, **kwargs: Any) -> Any:
+        msg = await super().send_message(*args, **kwargs)
+        message_states.record(msg)
+        return msg
+
+    async def edit_message(self, *args: Any, **kwargs: Any) -> Any:
+        msg = await super().edit_message(*args, **kwargs)
+        message_states.record(msg)
+        return msg
+
+    async def delete_messages(self, entity: Any, message_ids: Any, *args: Any, **kwargs: Any) -> Any:
+        result = await super().delete_messages(entity, message_ids, *args, **kwargs)
+        try:
+            message_states.forget(tl_utils.get_peer_id(entity), message_ids)
+        except (TypeError, ValueError):
+            pass
+        return result
+
+    @property
+    def flood_sleep_threshold(self) -> float:
+        return 0 if _outbound_active.get() else self._flood_sleep_threshold
+
+    @flood_sleep_threshold.setter
+    def flood_sleep_threshold(self, value: float) -> None:
+        TelegramClient.flood_sleep_threshold.fset(self, value)  # type: ignore[attr-defined]
+
+    async def _call(self, sender: Any, request: Any, ordered: bool = False, flood_sleep_threshold: Any = None) -> Any:
+        priority = _OUTBOUND_PRIORITY.get(type(request))
+        if priority is None or _outbound_active.get():
+            return await super()._call(sender, request, ordered, flood_sleep_threshold)
+        if _outbound_progress.get():
+            priority = OUTBOUND_PROGRESS
+        parent = super()._call
+
+        async def _send() -> Any:
+            token = _outbound_active.set(True)
+            try:
+                return await parent(sender, request, ordered, flood_sleep_threshold)
+            except (FloodWaitError, SlowModeWaitError):
+                # Flood waits are tracked per chat by the scheduler; Telethon
+                # would otherwise hold back this request type in every chat.
+                self._flood_waited_requests.pop(request.CONSTRUCTOR_ID, None)
+                raise
+            finally:
+                _outbound_active.reset(token)
+
+        return await outbound.call(_request_chat_id(request), priority, _send, retry=_outbound_retry.get())
+
+
+# ── Progress renderer ──────────────────────────────────────────────────────────
+
+class _PendingEdit:
+    __slots__ = ('msg', 'text', 'kwargs', 'waiters')
+
+    def __init__(self, msg: Any, text: str, kwargs: dict[str, Any]) -> None:
+        self.msg = msg
+        self.text = text
+        self.kwargs = kwargs
+        self.waiters: list[asyncio.Future[bool]] = []
+
+
+class ProgressRenderer:
+    """Owns every progress-message edit so transfers never wait on Telegram.
+
+    ``update()`` only records the latest text for a message and returns; a
+    per-chat worker sends it when the chat's edit interval and the global
+    edit rate allow, taking the chat's messages in turn, so intermediate
+    states that were superseded in the meantime are never sent.
+    ``finish()`` queues a final state the same way and waits until it has
+    been delivered.  A ``FloodWaitError`` blocks the chat for the requested
+    time and the pending state is retried afterwards.
+    """
+
+    def __init__(self, chat_interval: float, global_rate: float) -> None:
+        self.chat_interval = chat_interval
+        self.global_interval = 1 / global_rate if global_rate > 0 else 0.0
+        # chat_id -> message id -> latest unsent state, oldest request first
+        self._pending: dict[int, dict[int, _PendingEdit]] = {}
+        self._workers: dict[int, asyncio.Task[None]] = {}
+        self._chat_next: dict[int, float] = {}
+        self._global_next = 0.0
+        self.requested = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.flood_wait_time = 0
+
+    def _queue(self, msg: Any, text: str, kwargs: dict[str, Any]) -> _PendingEdit:
+        self.requested += 1
+        chat = self._pending.setdefault(msg.chat_id, {})
+        entry = _PendingEdit(msg, text, kwargs)
+        previous = chat.get(msg.id)
+        if previous:
+            self.coalesced += 1
+            entry.waiters = previous.waiters
+        chat[msg.id] = entry
+        if msg.chat_id not in self._workers:
+            self._workers[msg.chat_id] = asyncio.create_task(self._drain(msg.chat_id))
+        return entry
+
+    def update(self, msg: Any, text: str, **kwargs: Any) -> None:
+        """Show *text* on *msg* as soon as allowed, replacing any state not yet sent."""
+        if msg is not None:
+            self._queue(msg, text, kwargs)
+
+    async def finish(self, msg: Any, text: str, **kwargs: Any) -> bool:
+        """Queue *text* as the final state of *msg* and wait until it is shown."""
+        if msg is None:
+            return False
+        waiter: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self._queue(msg, text, kwargs).waiters.append(waiter)
+        return await waiter
+
+    async def flush(self, msg: Any) -> None:
+        """Wait until the state queued for *msg*, if any, has been sent."""
+        entry = self._pending.get(msg.chat_id, {}).get(msg.id)
+        if entry:
+            waiter: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+            entry.waiters.append(waiter)
+            await waiter
+
+    def discard(self, msg: Any) -> None:
+        """Drop any state not yet sent for *msg*, e.g. before deleting it."""
+        entry = self._pending.get(msg.chat_id, {}).pop(msg.id, None)
+        if entry:
+            for waiter in entry.waiters:
+                if not waiter.done():
+                    waiter.set_result(False)
+
+    async def _wait_turn(self, chat_id: int) -> None:
+        while True:
+            now = time.monotonic()
+            ready = max(self._chat_next.get(chat_id, 0.0), self._global_next)
+            if ready <= now:
+                self._chat_next[chat_id] = now + self.chat_interval
+                self._global_next = now + self.global_interval
+                return
+            await asyncio.sleep(ready - now)
+
+    async def _drain(self, chat_id: int) -> None:
+        chat = self._pending[chat_id]
+        try:
+            while chat:
+                await self._wait_turn(chat_id)
+                if not chat:
+                    break
+                entry = chat.pop(next(iter(chat)))
+                ok = False
+                no_retry = _outbound_retry.set(False)
+                progress = _outbound_progress.set(True)
+                try:
+                    await entry.msg.edit(entry.text, **entry.kwargs)
+                    ok = True
+                except MessageNotModifiedError:
+                    ok = True
+                except FloodWaitError as e:
+                    self.flood_waits += 1
+                    self.flood_wait_time += e.seconds
+                    bot_logger.warning(f"Progress edits in chat {chat_id} flood-waited for {e.seconds}s")
+                    self._chat_next[chat_id] = time.monotonic() + e.seconds
+                    # Retry unless a newer state arrived meanwhile (it inherits the waiters).
+                    newer = chat.setdefault(entry.msg.id, entry)
+                    if newer is not entry:
+                        newer.waiters[:0] = entry.waiters
+                    continue
+                except Exception as e:
+                    self.failed += 1
+                    bot_logger.debug(f"Progress edit failed: {e}")
+                finally:
+                    _outbound_progress.reset(progress)
+                    _outbound_retry.reset(no_retry)
+                if ok:
+                    self.sent += 1
+                for waiter in entry.waiters:
+                    if not waiter.done():
+                        waiter.set_result(ok)
+        finally:
+            self._workers.pop(chat_id, None)
+            if not chat:
+                self._pending.pop(chat_id, None)
+            if len(self._chat_next) > 1000:
+                now = time.monotonic()
+                self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        waiting = sum(len(chat) for chat in self._pending.values())
+        return [
+            f'edits: {self.sent} sent of {self.requested} requested, {self.coalesced} coalesced, {self.failed} failed',
+            f'flood waits: {self.flood_waits} ({self.flood_wait_time}s), {waiting} edits waiting in {len(self._workers)} chats',
+        ]
+
+
+progress_renderer = ProgressRenderer(PROGRESS_CHAT_INTERVAL, PROGRESS_GLOBAL_EDITS_PER_SEC)
+
+
+# ── Bandwidth scheduler ────────────────────────────────────────────────────────
+
+# The job whose transfers are being accounted, set around a note's media sends
+# and inside album pipeline stages.  Transfers outside any job share one slot.
+_transfer_job: ContextVar[_ProgressControl | None] = ContextVar('_transfer_job', default=None)
+
+
+@contextmanager
+def _bandwidth_job(ctrl: _ProgressControl | None):
+    token = _transfer_job.set(ctrl)
+    try:
+        yield
+    finally:
+        _transfer_job.reset(token)
+
+
+class BandwidthScheduler:
+    """Token bucket for one direction, granted to jobs in weighted-fair order.
+
+    Each grant gets a virtual finish tag ``max(vtime, job's last tag) +
+    nbytes / weight``; while callers are waiting for tokens they are served
+    smallest tag first, so every job gets a share of the cap proportional to
+    its :attr:`_ProgressControl.weight`.  The bucket may go into debt by one
+    chunk, which keeps grants cheap when the cap is not reached.
+    """
+
+    def __init__(self, name: str, rate: float) -> None:
+        self.name = name
+        self.rate = rate  # bytes/s, 0 = unlimited
+        self._burst = max(rate / 4, 256 * 1024)
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+        self._vtime = 0.0
+        self._last_tag: dict[int, float] = {}
+        self._queue: list[tuple[float, int, int, asyncio.Future[None]]] = []
+        self._seq = 0
+        self._dispatcher: asyncio.Task[None] | None = None
+        self.bytes = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, nbytes: int) -> None:
+        """Wait until the current job may move *nbytes* more bytes."""
+        job = _transfer_job.get()
+        weight = job.weight if job else 1.0
+        if job:
+            job.transferred += nbytes
+        self.bytes += nbytes
+        if not self.rate:
+            return
+        key = id(job)
+        tag = max(self._vtime, self._last_tag.get(key, 0.0)) + nbytes / weight
+        self._last_tag[key] = tag
+        self._refill()
+        if not self._queue and self._tokens >= 0:
+            self._vtime = tag
+            self._tokens -= nbytes
+            return
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._queue, (tag, self._seq, nbytes, fut))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        started = time.monotonic()
+        self.waits += 1
+        try:
+            await fut
+        finally:
+            self.wait_time += time.monotonic() - started
+
+    async def _dispatch(self) -> None:
+        while self._queue:
+            self._refill()
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self.rate)
+                continue
+            tag, _, nbytes, fut = heapq.heappop(self._queue)
+            if fut.done():  # waiter was cancelled
+                continue
+            self._vtime = tag
+            self._tokens -= nbytes
+            fut.set_result(None)
+        # Tags at or below vtime no longer affect ordering.
+        if len(self._last_tag) > 64:
+            self._last_tag = {k: v for k, v in self._last_tag.items() if v > self._vtime}
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        cap = f'{self.rate / (1024 * 1024):.1f} MB/s' if self.rate else 'unlimited'
+        avg = self.wait_time / self.waits * 1000 if self.waits else 0
+        return [f'{self.name}: cap {cap}, {self.bytes / (1024 * 1024):.1f} MB moved, '
+                f'{self.waits} throttled waits (avg {avg:.0f} ms)']
+
+
+download_bandwidth = BandwidthScheduler('download', BANDWIDTH_DOWNLOAD_MBPS * 1024 * 1024)
+upload_bandwidth = BandwidthScheduler('upload', BANDWIDTH_UPLOAD_MBPS * 1024 * 1024)
+
+
+# ── CDN mirror selection ───────────────────────────────────────────────────────
+
+_IMAGE_HOST_RE = re.compile(r'sns-(?:na|note)-i\d+\.xhscdn\.com')
+_VIDEO_HOST_RE = re.compile(r'[0-9a-z\-]+\.xhscdn\.(?:com|net)')
+_SIGNED_URL_RE = re.compile(r'sign=[0-9a-z]+')
+
+
+def _dedupe(urls: list[str]) -> list[str]:
+    seen: set[str] = set()
+    return [u for u in urls if u and not (u in seen or seen.add(u))]
+
+
+def image_mirror_urls(url: str) -> list[str]:
+    """Return *url* re-hosted on every configured image mirror, its own host last."""
+    if not _IMAGE_HOST_RE.search(url):
+        return [url]
+    return _dedupe([_IMAGE_HOST_RE.sub(host, url, count=1) for host in CDN_IMAGE_HOSTS] + [url])
+
+
+def video_mirror_urls(url: str) -> list[str]:
+    """Return *url* re-hosted on every configured video mirror.
+
+    Signed URLs are bound to their host and are returned unchanged.
+    """
+    if not url:
+        return []
+    if _SIGNED_URL_RE.search(url) or not _VIDEO_HOST_RE.search(url):
+        return [url]
+    return _dedupe([_VIDEO_HOST_RE.sub(host, url, count=1) for host in CDN_VIDEO_HOSTS] + [url])
+
+
+def media_candidates(url: str, mirrors: list[str] | None = None) -> list[str]:
+    """All URLs that serve the same media as *url*: explicit mirrors first, then re-hosted copies."""
+    if _IMAGE_HOST_RE.search(url):
+        derived = image_mirror_urls(url)
+    elif 'mp4' in url or 'sns-bak-v' in url or 'sns-video' in url:
+        derived = video_mirror_urls(url)
+    else:
+        derived = [url]
+    return _dedupe([url] + list(mirrors or []) + derived)
+
+
+class _CdnHostStats:
+    """Exponentially weighted throughput, time-to-first-byte and error rate of one host."""
+    __slots__ = ('throughput', 'ttfb', 'error_rate', 'requests', 'errors', 'bytes')
+
+    def __init__(self) -> None:
+        self.throughput = 0.0  # bytes/s
+        self.ttfb = 0.0        # seconds
+        self.error_rate = 0.0  # 0..1
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+
+
+class CdnMirrorSelector:
+    """Ranks CDN mirrors by observed performance and fetches from the best one.
+
+    When a mirror has not answered within ``hedge_delay`` seconds, a second
+    request is started on the next-best mirror and whichever responds first
+    wins; the loser is closed in the background.
+    """
+
+    _ALPHA = 0.3
+    # Optimistic prior for hosts without measurements, so they get explored.
+    _PRIOR_TTFB = 0.4
+    _PRIOR_THROUGHPUT = 2 * 1024 * 1024
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, hedge_delay: float = 1.5, timeout: float = 30) -> None:
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.hedges_started = 0
+        self.hedges_won = 0
+        self._stats: dict[str, _CdnHostStats] = {}
+
+    def score(self, host: str) -> float:
+        """Expected seconds to fetch 1 MB from *host*, inflated by its error rate. Lower is better."""
+        s = self._stats.get(host)
+        if s is None:
+            ttfb, throughput = self._PRIOR_TTFB, self._PRIOR_THROUGHPUT
+        elif s.requests == s.errors:
+            ttfb, throughput = max(self._PRIOR_TTFB, s.ttfb), self._PRIOR_THROUGHPUT
+        else:
+            ttfb, throughput = s.ttfb, max(s.throughput, 1.0)
+        error_rate = s.error_rate if s else 0.0
+        return (ttfb + 1024 * 1024 / throughput) * (1 + 4 * error_rate)
+
+    def rank(self, urls: list[str]) -> list[str]:
+        """Order *urls* fastest-host-first; ties keep the caller's preference order."""
+        return sorted(_dedupe(urls), key=lambda u: self.score(urlparse(u).netloc))
+
+    def record_success(self, host: str, nbytes: int, ttfb: float, elapsed: float) -> None:
+        s = self._stats.setdefault(host, _CdnHostStats())
+        a = self._ALPHA
+        first = s.requests == s.errors
+        s.requests += 1
+        s.bytes += nbytes
+        s.ttfb = ttfb if first else (1 - a) * s.ttfb + a * ttfb
+        # Tiny bodies say more about latency than bandwidth; don't let them skew throughput.
+        if nbytes >= 64 * 1024 and elapsed > 0:
+            rate = nbytes / elapsed
+            s.throughput = rate if first or not s.throughput else (1 - a) * s.throughput + a * rate
+        s.error_rate *= (1 - a)
+
+    def record_latency(self, host: str, seconds: float) -> None:
+        """Record a lower bound on *host*'s time-to-first-byte, e.g. for a hedge loser."""
+        s = self._stats.setdefault(host, _CdnHostStats())
+        s.ttfb = max(s.ttfb, seconds) if s.requests == s.errors else (1 - self._ALPHA) * s.ttfb + self._ALPHA * seconds
+
+    def record_error(self, host: str) -> None:
+        s = self._stats.setdefault(host, _CdnHostStats())
+        s.requests += 1
+        s.errors += 1
+        s.error_rate = (1 - self._ALPHA) * s.error_rate + self._ALPHA
+
+    def _get(self, url: str) -> requests.Response:
+        resp = requests.get(url, stream=True, timeout=self.timeout)
+        try:
+            resp.raise_for_status()
+        except Exception:
+            resp.close()
+            raise
+        return resp
+
+    @staticmethod
+    def _close_loser(task: 'asyncio.Task[requests.Response]') -> None:
+        if not task.cancelled() and task.exception() is None:
+            task.result().close()
+
+    async def open(self, urls: list[str]) -> tuple[requests.Response, str, float]:
+        """Open a streaming GET on the best mirror, hedging when it is slow to respond.
+
+        Returns (response, url, ttfb). Raises the last error if every mirror fails.
+        """
+        ranked = self.rank(urls)
+        if not ranked:
+            raise ValueError('No media URL to fetch')
+        pending: dict[asyncio.Task[requests.Response], tuple[str, float]] = {}
+        hedges: set[asyncio.Task[requests.Response]] = set()
+        next_idx = 0
+        last_exc: Exception | None = None
+
+        def _launch() -> asyncio.Task[requests.Response]:
+            nonlocal next_idx
+            url = ranked[next_idx]
+            next_idx += 1
+            task = asyncio.create_task(asyncio.to_thread(self._get, url))
+            pending[task] = (url, time.monotonic())
+            return task
+
+        _launch()
+        try:
+            while pending:
+                can_hedge = self.hedge_delay > 0 and len(pending) == 1 and next_idx < len(ranked)
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    self.hedges_started += 1
+                    slow_url = next(iter(pending.values()))[0]
+                    bot_logger.info(f"CDN {urlparse(slow_url).netloc} slow to respond, hedging to {urlparse(ranked[next_idx]).netloc}")
+                    hedges.add(_launch())
+                    continue
+                for task in done:
+                    url, started = pending.pop(task)
+                    host = urlparse(url).netloc
+                    try:
+                        resp = task.result()
+                    except Exception as e:
+                        bot_logger.warning(f"CDN {host} failed: {e}")
+                        self.record_error(host)
+                        last_exc = e
+                        continue
+                    # Only a hedge that beat a request still in flight is a win;
+                    # taking over after the other mirror failed is plain failover.
+                    if task in hedges and pending:
+                        self.hedges_won += 1
+                    return resp, url, time.monotonic() - started
+                if not pending and next_idx < len(ranked):
+                    _launch()
+        finally:
+            now = time.monotonic()
+            for task, (url, started) in pending.items():
+                self.record_latency(urlparse(url).netloc, now - started)
+                task.add_done_callback(self._close_loser)
+        raise last_exc or RuntimeError('All mirrors failed')
+
+    async def read(
+        self,
+        resp: requests.Response,
+        url: str,
+        ttfb: float,
+        on_chunk: Any = None,
+    ) -> bytes:
+        """Read the body of a response from :meth:`open` without blocking the event loop.
+
+        ``on_chunk(received, total)`` is awaited after every chunk; it may raise
+        to abort the transfer.
+        """
+        host = urlparse(url).netloc
+        total = int(resp.headers.get('Content-Length', '0') or 0)
+        chunks: list[bytes] = []
+        received = 0
+        started = time.monotonic()
+        try:
+            it = resp.iter_content(chunk_size=self.CHUNK_SIZE)
+            while True:
+                chunk = await asyncio.to_thread(next, it, b'')
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                received += len(chunk)
+                await download_bandwidth.acquire(len(chunk))
+                if on_chunk:
+                    await on_chunk(received, total)
+        except _OperationCancelled:
+            raise
+        except Exception:
+            self.record_error(host)
+            raise
+        finally:
+            resp.close()
+        self.record_success(host, received, ttfb, time.monotonic() - started)
+        return b''.join(chunks)
+
+    async def fetch(self, urls: list[str], on_chunk: Any = None) -> bytes:
+        """Download the first URL that works out of *urls*, best mirror first."""
+        resp, url, ttfb = await self.open(urls)
+        return await self.read(resp, url, ttfb, on_chunk=on_chunk)
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable per-host figures for the admin /stats command."""
+        lines: list[str] = []
+        for host in sorted(self._stats, key=self.score):
+            s = self._stats[host]
+            lines.append(
+                f'{host}: {s.throughput / (1024 * 1024):.1f} MB/s, ttfb {s.ttfb * 1000:.0f} ms, '
+                f'err {s.error_rate * 100:.0f}% ({s.errors}/{s.requests}), {s.bytes / (1024 * 1024):.1f} MB'
+            )
+        lines.append(f'hedges: {self.hedges_started} started, {self.hedges_won} won')
+        return lines
+
+
+cdn_mirrors = CdnMirrorSelector(hedge_delay=CDN_HEDGE_DELAY, timeout=CDN_REQUEST_TIMEOUT)
+
+
+# ── Image renditions ───────────────────────────────────────────────────────────
+
+# What note image URLs are normalised to; the Telegraph page keeps using it.
+REFERENCE_IMAGE_VIEW = 'imageView2/2/w/5000/h/5000/format/webp/q/56'
+
+QUALITY_LEVELS = ('saver', 'balanced', 'original')
+
+# imageView2 parameters per destination and user quality preference.  Telegram
+# re-encodes photos to at most 2560 px, so photo mode never fetches more, and
+# Gemini gets images downscaled to 1280 px by _compress_image_for_llm anyway.
+IMAGE_RENDITIONS: dict[str, dict[str, str]] = {
+    'photo': {
+        'saver': 'imageView2/2/w/1280/h/1280/format/webp/q/50',
+        'balanced': 'imageView2/2/w/2560/h/2560/format/webp/q/56',
+        'original': 'imageView2/2/w/2560/h/2560/format/webp/q/80',
+    },
+    'document': {
+        'saver': 'imageView2/2/w/2560/h/2560/format/webp/q/56',
+        'balanced': REFERENCE_IMAGE_VIEW,
+        'original': 'imageView2/2/w/5000/h/5000/format/webp/q/90',
+    },
+    'ai': {
+        'saver': 'imageView2/2/w/1024/h/1024/format/jpg/q/60',
+        'balanced': 'imageView2/2/w/1280/h/1280/format/jpg/q/75',
+        'original': 'imageView2/2/w/1280/h/1280/format/jpg/q/85',
+    },
+    'preview': {
+        'saver': 'imageView2/2/w/320/h/320/format/jpg/q/60',
+        'balanced': 'imageView2/2/w/320/h/320/format/jpg/q/75',
+        'original': 'imageView2/2/w/320/h/320/format/jpg/q/85',
+    },
+}
+
+_IMAGE_VIEW_RE = re.compile(r'(?<=\?)imageView2/[^&?#]*')
+
+
+def rendition_url(url: str, profile: str, quality: str = 'balanced') -> str:
+    """Rewrite the imageView2 parameters of *url* for *profile*; other URLs pass through."""
+    levels = IMAGE_RENDITIONS.get(profile)
+    if not levels:
+        return url
+    return _IMAGE_VIEW_RE.sub(levels.get(quality, levels['balanced']), url, count=1)
+
+
+class RenditionStats:
+    """Bytes fetched per rendition profile, with an estimate of the bytes saved.
+
+    The saving is estimated by occasionally asking the CDN for the size of the
+    reference rendition of the same image (a HEAD request in the background).
+    """
+
+    SAMPLE_EVERY = 10
+
+    def __init__(self) -> None:
+        # (profile, quality) → [images, bytes, sampled bytes, sampled reference bytes]
+        self._stats: dict[tuple[str, str], list[int]] = {}
+        # The event loop only keeps weak references to tasks.
+        self._probes: set[asyncio.Task[None]] = set()
+
+    def record(self, profile: str, quality: str, url: str, nbytes: int) -> None:
+        s = self._stats.setdefault((profile, quality), [0, 0, 0, 0])
+        s[0] += 1
+        s[1] += nbytes
+        reference = _IMAGE_VIEW_RE.sub(REFERENCE_IMAGE_VIEW, url, count=1)
+        if reference != url and (s[0] <= 3 or s[0] % self.SAMPLE_EVERY == 0):
+            task = asyncio.create_task(self._sample(s, reference, nbytes))
+            self._probes.add(task)
+            task.add_done_callback(self._probes.discard)
+
+    @staticmethod
+    async def _sample(s: list[int], reference: str, nbytes: int) -> None:
+        try:
+            resp = await asyncio.to_thread(requests.head, reference, timeout=CDN_REQUEST_TIMEOUT)
+            size = int(resp.headers.get('Content-Length', '0') or 0)
+        except Exception as e:
+            bot_logger.debug(f"Rendition reference probe failed: {e}")
+            return
+        if size:
+            s[2] += nbytes
+            s[3] += size
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        lines: list[str] = []
+        for (profile, quality), (count, nbytes, sampled, reference) in sorted(self._stats.items()):
+            line = f'{profile}/{quality}: {count} images, {nbytes / (1024 * 1024):.1f} MB'
+            if sampled:
+                saved = nbytes * (reference / sampled - 1)
+                line += f', ~{saved / (1024 * 1024):.1f} MB saved'
+            lines.append(line)
+        return lines or ['no images fetched yet']
+
+
+rendition_stats = RenditionStats()
+
+
+async def fetch_image(
+    url: str,
+    mirrors: list[str] | None = None,
+    profile: str = 'document',
+    quality: str = 'balanced',
+) -> bytes:
+    """Fetch an image through the CDN mirrors in the rendition for *profile*.
+
+    Non-image URLs (videos, audio) are fetched unchanged, so callers can pass
+    any note media.
+    """
+    candidates = [rendition_url(u, profile, quality) for u in media_candidates(url, mirrors)]
+    content = await cdn_mirrors.fetch(candidates)
+    if _IMAGE_VIEW_RE.search(candidates[0]):
+        rendition_stats.record(profile, quality, candidates[0], len(content))
+    return content
+
+
+# ── Video stream selection ─────────────────────────────────────────────────────
+
+# Limits per quality preference: the shorter side in pixels and a size budget
+# in bytes (0 = no limit), plus acceptable codecs, most preferred first.  H.264
+# plays inline on every Telegram client; H.265 is smaller but not universal.
+VIDEO_STREAM_POLICIES: dict[str, dict[str, Any]] = {
+    'saver': {'max_side': 720, 'max_bytes': 30 * 1024 * 1024, 'codecs': ('h265', 'h264')},
+    'balanced': {'max_side': 1080, 'max_bytes': 200 * 1024 * 1024, 'codecs': ('h264', 'h265')},
+    'original': {'max_side': 0, 'max_bytes': 0, 'codecs': ('h265', 'h264', 'av1')},
+}
+
+
+def _stream_renditions(streams: dict[str, Any]) -> list[dict[str, Any]]:
+    """Flatten an XHS ``stream`` map (``{codec: [rendition, ...]}``) into comparable dicts."""
+    renditions: list[dict[str, Any]] = []
+    for codec, entries in (streams or {}).items():
+        for r in entries or []:
+            urls = _dedupe(list(r.get('backup_urls') or []) + [r.get('master_url', '')])
+            if not urls:
+                continue
+            # avg_bitrate is in bit/s and duration in ms
+            size = int(r.get('size') or 0)
+            if not size and r.get('avg_bitrate') and r.get('duration'):
+                size = int(r['avg_bitrate']) * int(r['duration']) // 8000
+            renditions.append({
+                'codec': str(codec).lower(),
+                'width': int(r.get('width') or 0),
+                'height': int(r.get('height') or 0),
+                'duration': int(r.get('duration') or 0) // 1000,
+                'bitrate': int(r.get('avg_bitrate') or 0) // 1000,
+                'bytes': size,
+                'urls': urls,
+            })
+    return renditions
+
+
+def select_stream(streams: dict[str, Any], quality: str = 'balanced') -> dict[str, Any] | None:
+    """Pick the one rendition of a video to download for the *quality* preference.
+
+    Renditions in an accepted codec that fit the resolution cap and size
+    budget win, highest resolution first, then codec preference, then the
+    smaller file.  If none fits, the smallest accepted rendition is used; if
+    no codec is accepted, every codec is considered.  Returns the rendition
+    dict (``codec``, ``width``, ``height``, ``duration`` in s, ``bitrate`` in
+    kbps, ``bytes``, ``urls``) or None.
+    """
+    policy = VIDEO_STREAM_POLICIES.get(quality, VIDEO_STREAM_POLICIES['balanced'])
+    renditions = _stream_renditions(streams)
+    if not renditions:
+        return None
+    codecs: tuple[str, ...] = policy['codecs']
+    accepted = [r for r in renditions if r['codec'] in codecs] or renditions
+
+    def _side(r: dict[str, Any]) -> int:
+        return min(r['width'], r['height'])
+
+    def _codec_rank(r: dict[str, Any]) -> int:
+        return codecs.index(r['codec']) if r['codec'] in codecs else len(codecs)
+
+    def _fits(r: dict[str, Any]) -> bool:
+        return ((not policy['max_side'] or not _side(r) or _side(r) <= policy['max_side'])
+                and (not policy['max_bytes'] or not r['bytes'] or r['bytes'] <= policy['max_bytes']))
+
+    fitting = [r for r in accepted if _fits(r)]
+    if fitting:
+        return max(fitting, key=lambda r: (_side(r), -_codec_rank(r), -r['bytes']))
+    return min(accepted, key=lambda r: (r['bytes'] or float('inf'), _side(r), _codec_rank(r)))
+
+
 # ── Media range parser (-r flag) ──────────────────────────────────────────────
 
 def parse_media_range(text: str) -> tuple[set[int], set[int]] | None:
@@ -517,34 +1647,50 @@ def open_note(noteId: str, anchorCommentId: str | None = None) -> dict[str, Any]
         return None
 
 
+def extract_xhs_links(message_text: str) -> list[str]:
+    """All XHS links in a message, in order.
+
+    Hosts match case-insensitively, like XHS_LINK_RE itself.
+    """
+    lowered = message_text.lower()
+    if 'xhslink.com' not in lowered and 'xiaohongshu.com' not in lowered:
+        return []
+    return [
+        u for u in XHS_LINK_RE.findall(message_text)
+        if 'xhslink.com' in u.lower() or 'xiaohongshu.com' in u.lower()
+    ]
+
+
+def _link_params(url: str) -> tuple[str, str]:
+    """xsec_token and anchorCommentId from a link's query string."""
+    query = parse_qs(urlparse(url).query)
+    return query.get('xsec_token', [''])[0], query.get('anchorCommentId', [''])[0]
+
+
 def get_url_info(message_text: str) -> dict[str, str | bool]:
     xsec_token = ''
-    urls = re.findall(URL_REGEX, message_text)
+    urls = extract_xhs_links(message_text)
     bot_logger.info(f'URLs:\n{urls}')
     anchorCommentId = ''
-    # Count XHS-specific links (xhslink.com or xiaohongshu.com)
-    xhs_urls = [u for u in urls if 'xhslink.com' in u or 'xiaohongshu.com' in u]
-    had_multiple = len(xhs_urls) > 1
+    had_multiple = len(urls) > 1
+    note_url = next((u for u in urls if _NOTE_ID_RE.search(u) and not _PROFILE_ID_RE.search(u)), '')
     if len(urls) == 0:
         bot_logger.debug("NO URL FOUND!")
         return {'success': False, 'msg': 'No URL found in the message.', 'noteId': '', 'xsec_token': '', 'anchorCommentId': ''}
-    elif re.findall(r"[a-z0-9]{24}", message_text) and not re.findall(r"user/profile/[a-z0-9]{24}", message_text):
-        noteId = re.findall(r"[a-z0-9]{24}", message_text)[0]
-        note_url = [u for u in urls if re.findall(r"[a-z0-9]{24}", u) and not re.findall(r"user/profile/[a-z0-9]{24}", u)][0]
-        parsed_url = urlparse(str(note_url))
-        if 'xsec_token' in parse_qs(parsed_url.query):
-            xsec_token = parse_qs(parsed_url.query)['xsec_token'][0]
-        if 'anchorCommentId' in parse_qs(parsed_url.query):
-            anchorCommentId = parse_qs(parsed_url.query)['anchorCommentId'][0]
-    elif 'xhslink.com' in message_text or 'xiaohongshu.com' in message_text:
-        xhslink = [u for u in urls if 'xhslink.com' in u][0]
+    elif note_url:
+        noteId = _NOTE_ID_RE.search(note_url)[0]  # type: ignore[index]
+        xsec_token, anchorCommentId = _link_params(note_url)
+    else:
+        xhslink = next((u for u in urls if 'xhslink.com' in u.lower()), '')
+        if not xhslink:
+            return {'success': False, 'msg': 'Invalid URL.', 'noteId': '', 'xsec_token': ''}
         bot_logger.debug(f"URL found: {xhslink}")
         redirectPath = get_redirected_url(xhslink)
         bot_logger.debug(f"Redirected URL: {redirectPath}")
-        if re.findall(r"https?://(?:www.)?xhslink.com/[a-z]/[A-Za-z0-9]+", xhslink):
+        if _SHORT_LINK_RE.search(xhslink):
             clean_url = get_clean_url(redirectPath)
             if 'xiaohongshu.com/404' in redirectPath or 'xiaohongshu.com/login' in redirectPath:
-                noteId = re.findall(r"noteId=([a-z0-9]+)", redirectPath)[0]
+                noteId = _REDIRECT_NOTE_ID_RE.findall(redirectPath)[0]
                 if 'redirectPath=' in redirectPath:
                     redirectPath = unquote(
                         redirectPath
@@ -552,55 +1698,59 @@ def get_url_info(message_text: str) -> dict[str, str | bool]:
                         .replace('https://www.xiaohongshu.com/404?redirectPath=', '')
                     )
             else:
-                noteId = re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/discovery\/item\/([a-z0-9]+)", clean_url)[0]
-            parsed_url = urlparse(str(redirectPath))
-            if 'xsec_token' in parse_qs(parsed_url.query):
-                xsec_token = parse_qs(parsed_url.query)['xsec_token'][0]
-            if 'anchorCommentId' in parse_qs(parsed_url.query):
-                anchorCommentId = parse_qs(parsed_url.query)['anchorCommentId'][0]
-        elif re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/discovery\/item\/[0-9a-z]+", xhslink):
-            noteId = re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/discovery\/item\/([a-z0-9]+)", xhslink)[0]
-            parsed_url = urlparse(str(xhslink))
-            if 'xsec_token' in parse_qs(parsed_url.query):
-                xsec_token = parse_qs(parsed_url.query)['xsec_token'][0]
-            if 'anchorCommentId' in parse_qs(parsed_url.query):
-                anchorCommentId = parse_qs(parsed_url.query)['anchorCommentId'][0]
-        elif re.findall(r"https?://(?:www.)?xiaohongshu.com/explore/[a-z0-9]+", message_text):
-            noteId = re.findall(r"https?:\/\/(?:www.)?xiaohongshu.com\/explore\/([a-z0-9]+)", xhslink)[0]
-            parsed_url = urlparse(str(xhslink))
-            if 'xsec_token' in parse_qs(parsed_url.query):
-                xsec_token = parse_qs(parsed_url.query)['xsec_token'][0]
-            if 'anchorCommentId' in parse_qs(parsed_url.query):
-                anchorCommentId = parse_qs(parsed_url.query)['anchorCommentId'][0]
+                noteId = _DISCOVERY_ID_RE.findall(clean_url)[0]
+            xsec_token, anchorCommentId = _link_params(redirectPath)
+        elif m := _DISCOVERY_ID_RE.search(xhslink) or _EXPLORE_ID_RE.search(xhslink):
+            noteId = m[1]
+            xsec_token, anchorCommentId = _link_params(xhslink)
         else:
             return {'success': False, 'msg': 'Invalid URL or the note is no longer available.', 'noteId': '', 'xsec_token': ''}
-    else:
-        return {'success': False, 'msg': 'Invalid URL.', 'noteId': '', 'xsec_token': ''}
     return {'success': True, 'msg': 'Success.', 'noteId': noteId, 'xsec_token': xsec_token, 'anchorCommentId': anchorCommentId, 'had_multiple': had_multiple}
 
 
-def parse_comment(comment_data: dict[str, Any]):
+def quick_note_link(message_text: str) -> tuple[str, str]:
+    """Note ID and a link for the first XHS link in a message, without
+    resolving short links.
+
+    Short links come back as ``('', short_link)``; a message without any XHS
+    link as ``('', '')``.
+    """
+    urls = extract_xhs_links(message_text)
+    for u in urls:
+        if _NOTE_ID_RE.search(u) and not _PROFILE_ID_RE.search(u):
+            noteId = _NOTE_ID_RE.search(u)[0]  # type: ignore[index]
+            return noteId, f'https://www.xiaohongshu.com/discovery/item/{noteId}'
+    if not urls:
+        return '', ''
+    return '', urls[0] if '://' in urls[0] else f'https://{urls[0]}'
+
+
+def parse_comment(comment_data: dict[str, Any], quality: str = 'balanced'):
     target_comment = comment_data.get('target_comment', {})
     user = comment_data.get('user', {})
     content = comment_data.get('content', '')
     content = re.sub(r'(?P<tag>#\S+?)\[\S+\]#', r'\g<tag> ', content)
+    # Translated once here; every rendering of the comment reuses it.
+    content = replace_redemoji_with_emoji(content)
     pictures = comment_data.get('pictures', [])
     picture_urls: list[str] = []
+    # Alternative URLs for the same media, keyed by the URL in picture_urls
+    media_mirrors: dict[str, list[str]] = {}
     for p in pictures:
         original_url = p.get('origin_url', '')
         if 'video_info' in p:
             video_info = p.get('video_info', '')
             if video_info:
-                video_data = json.loads(video_info)
-                for stream in video_data['stream']:
-                    if video_data['stream'][stream]:
-                        if 'backup_urls' in video_data['stream'][stream][0]:
-                            video_url = video_data['stream'][stream][0]['backup_urls'][0]
-                            picture_urls.append(video_url)
-        picture_urls.append(
-            re.sub(r'sns-note-i\d.xhscdn.com', 'sns-na-i6.xhscdn.com', original_url)
-            .split('?imageView')[0] + '?imageView2/2/w/5000/h/5000/format/webp/q/56&redImage/frame/0'
-        )
+                # One rendition per video, not one per codec
+                stream = select_stream(json.loads(video_info).get('stream', {}), quality)
+                if stream:
+                    video_url = stream['urls'][0]
+                    picture_urls.append(video_url)
+                    media_mirrors[video_url] = stream['urls'][1:]
+        image_url = original_url.split('?imageView')[0] + f'?{REFERENCE_IMAGE_VIEW}&redImage/frame/0'
+        primary_url = re.sub(r'sns-note-i\d.xhscdn.com', CDN_IMAGE_HOSTS[0], image_url)
+        picture_urls.append(primary_url)
+        media_mirrors[primary_url] = [u for u in image_mirror_urls(image_url) if u != primary_url]
     audio_info = comment_data.get('audio_info', '')
     audio_url = ''
     if audio_info:
@@ -611,6 +1761,7 @@ def parse_comment(comment_data: dict[str, Any]):
         'user': user,
         'content': content,
         'pictures': picture_urls,
+        'media_mirrors': media_mirrors,
         'id': comment_data.get('id', ''),
         'time': comment_data.get('time', 0),
         'like_count': comment_data.get('like_count', 0),
@@ -623,7 +1774,7 @@ def parse_comment(comment_data: dict[str, Any]):
     return data
 
 
-def extract_anchor_comment_id(json_data: dict[str, Any]) -> list[dict[str, Any]]:
+def extract_anchor_comment_id(json_data: dict[str, Any], quality: str = 'balanced') -> list[dict[str, Any]]:
     comments = json_data.get('comments', [])
     if not comments:
         bot_logger.error("No comments found in the data.")
@@ -637,18 +1788,19 @@ def extract_anchor_comment_id(json_data: dict[str, Any]) -> list[dict[str, Any]]
         if page_context:
             page_context = json.loads(page_context)
             key_comments_id = page_context.get('top', [])
+            by_id: dict[str, list[dict[str, Any]]] = {}
+            for sub_comment in sub_comments:
+                by_id.setdefault(sub_comment.get('id', ''), []).append(sub_comment)
             for key in key_comments_id:
-                for sub_comment in sub_comments:
-                    if sub_comment.get('id', '') == key:
-                        related_sub_comments.append(sub_comment)
+                related_sub_comments.extend(by_id.get(key, ()))
     all_comments = [comment] + related_sub_comments
     data_parsed: list[dict[str, Any]] = []
     for c in all_comments:
-        data_parsed.append(parse_comment(c))
+        data_parsed.append(parse_comment(c, quality))
     return data_parsed
 
 
-def extract_all_comments(json_data: dict[str, Any]) -> list[dict[str, Any]]:
+def extract_all_comments(json_data: dict[str, Any], quality: str = 'balanced') -> list[dict[str, Any]]:
     comments = json_data.get('comments', [])
     if not comments:
         bot_logger.error("No comments found in the data.")
@@ -656,276 +1808,1682 @@ def extract_all_comments(json_data: dict[str, Any]) -> list[dict[str, Any]]:
         return []
     data_parsed: list[dict[str, Any]] = []
     for comment in comments:
-        parsed_comment = parse_comment(comment)
+        parsed_comment = parse_comment(comment, quality)
         sub_comments: list[dict[str, Any]] = []
         for sub_comment in comment.get('sub_comments', []):
-            sub_comments.append(parse_comment(sub_comment))
+            sub_comments.append(parse_comment(sub_comment, quality))
         parsed_comment["sub_comments"] = sub_comments
         data_parsed.append(parsed_comment)
     return data_parsed
 
 
-def convert_to_ogg_opus_pipe(input_bytes: bytes) -> bytes:
-    process = subprocess.Popen(
-        ["ffmpeg", "-i", "pipe:0", "-c:a", "libopus", "-f", "ogg", "pipe:1"],
-        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-    )
-    out, _ = process.communicate(input_bytes)
-    return out
+# ── Media tools (ffmpeg / ffprobe) ─────────────────────────────────────────────
 
+class MediaToolPool:
+    """Runs ffmpeg/ffprobe as asyncio subprocesses, at most ``workers`` at a time.
 
-def convert_to_mp3_pipe(input_bytes: bytes) -> bytes:
-    process = subprocess.Popen(
-        ["ffmpeg", "-i", "pipe:0", "-vn", "-c:a", "libmp3lame", "-q:a", "3", "-f", "mp3", "pipe:1"],
-        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-    )
-    out, _ = process.communicate(input_bytes)
-    return out
+    Keeps the event loop free while media is probed or transcoded, kills a
+    tool that overruns its timeout (raising :class:`subprocess.TimeoutExpired`
+    like ``subprocess.run``) or whose job is cancelled via ``ctrl``, and keeps
+    queue-wait and run-time figures for /stats.  A job paused via ``ctrl``
+    gives its worker slot up: queued tools wait for the resume, and a running
+    tool is stopped (SIGSTOP, where the platform has it) until the job resumes
+    and gets a slot back; paused time does not count towards the timeout.
+    """
 
+    _CAN_SUSPEND = hasattr(signal, 'SIGSTOP')
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, workers)
+        self._sem = asyncio.Semaphore(self.workers)
+        self.waiting = 0
+        self.running = 0
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.run_time = 0.0
+
+    async def _acquire(self, ctrl: _ProgressControl | None) -> None:
+        """Take a worker slot once *ctrl* (if any) is not paused."""
+        self.waiting += 1
+        try:
+            while True:
+                if ctrl:
+                    await ctrl.check()
+                await self._sem.acquire()
+                if not (ctrl and ctrl.paused):
+                    break
+                self._sem.release()
+        finally:
+            self.waiting -= 1
+        self.running += 1
 
-# ── Note class ─────────────────────────────────────────────────────────────────
+    def _release(self) -> None:
+        self.running -= 1
+        self._sem.release()
 
-class Note:
-    def __init__(
-            self,
-            note_data: dict[str, Any],
-            comment_list_data: dict[str, Any],
-            live: bool = False,
-            telegraph_account: Telegraph | None = None,
-            anchorCommentId: str = '',
-            xsec_token: str = '',
-    ) -> None:
-        self.telegraph_account = telegraph_account
-        self.live = live
-        self.xsec_token = xsec_token
-        if not note_data['data']:
-            raise Exception("Note data not found!")
-        self.user: dict[str, str | int] = {
-            'id': note_data['data'][0]['user']['id'],
-            'name': note_data['data'][0]['user']['name'],
-            'red_id': note_data['data'][0]['user'].get('red_id', ''),
-            'image': get_clean_url(note_data['data'][0]['user']['image']),
-        }
-        self.title: str = note_data['data'][0]['note_list'][0]['title'] if note_data['data'][0]['note_list'][0]['title'] else ''
-        self.type: str = note_data['data'][0]['note_list'][0]['type']
-        self.raw_desc = replace_redemoji_with_emoji(note_data['data'][0]['note_list'][0]['desc'])
-        bot_logger.debug(f"Note raw_desc\n\n {self.raw_desc}")
-        self.desc = re.sub(r'(?P<tag>#\S+?)\[\S+\]#', r'\g<tag> ', self.raw_desc)
-        self.time = note_data['data'][0]['note_list'][0]['time']
-        self.ip_location = note_data['data'][0]['note_list'][0].get('ip_location', '') or ''
-        self.collected_count = note_data['data'][0]['note_list'][0]['collected_count']
-        self.comments_count = note_data['data'][0]['note_list'][0]['comments_count']
-        self.shared_count = note_data['data'][0]['note_list'][0]['shared_count']
-        self.liked_count = note_data['data'][0]['note_list'][0]['liked_count']
-        self.comments_with_context: list[dict[str, Any]] = []
-        if anchorCommentId:
-            self.comments_with_context = extract_anchor_comment_id(comment_list_data['data'])
-            bot_logger.debug(f"Comments with context extracted for anchorCommentId {anchorCommentId}:\n{pformat(self.comments_with_context)}")
-        self.comments = extract_all_comments(comment_list_data['data'])
-        self.length: int = len(self.desc + self.title)
-        self.tags: list[str] = [tag['name'] for tag in note_data['data'][0]['note_list'][0]['hash_tag']]
-        self.tag_string: str = ' '.join([f"#{tag}" for tag in self.tags])
-        self.thumbnail = note_data['data'][0]['note_list'][0]['share_info']['image']
-        self.images_list: list[dict[str, str]] = []
-        if 'images_list' in note_data['data'][0]['note_list'][0]:
-            for each in note_data['data'][0]['note_list'][0]['images_list']:
-                if 'live_photo' in each and self.live:
-                    bot_logger.debug(f'live photo found in {each}')
-                    live_urls: list[str] = []
-                    for s in each['live_photo']['media']['stream']:
-                        if each['live_photo']['media']['stream'][s]:
-                            for ss in each['live_photo']['media']['stream'][s]:
-                                live_urls.append(ss['backup_urls'][0] if ss['backup_urls'] else ss['master_url'])
-                    if len(live_urls) > 0:
-                        self.images_list.append({'live': 'True', 'url': live_urls[0], 'thumbnail': remove_image_url_params(each['url'])})
-                original_img_url = each['original']
-                if re.findall(r'sns-na-i\d.xhscdn.com', original_img_url):
-                    original_img_url = (
-                        re.sub(r'sns-na-i\d.xhscdn.com', 'sns-na-i6.xhscdn.com', original_img_url)
-                        .split('?imageView')[0] + '?imageView2/2/w/5000/h/5000/format/webp/q/56&redImage/frame/0'
-                    )
-                self.images_list.append({
-                    'live': '',
-                    'url': remove_image_url_params(original_img_url),
-                    'thumbnail': remove_image_url_params(each['url_multi_level']['low']),
-                })
-        bot_logger.debug(f"Images found: {self.images_list}")
-        self.url = get_clean_url(note_data['data'][0]['note_list'][0]['share_info']['link'])
-        if self.xsec_token:
-            sep = '&' if '?' in self.url else '?'
-            self.url += f'{sep}xsec_token={quote(self.xsec_token)}'
-        self.noteId = re.findall(r"[a-z0-9]{24}", self.url)[0]
-        self.video_url = ''
-        if 'video' in note_data['data'][0]['note_list'][0]:
-            self.video_url = note_data['data'][0]['note_list'][0]['video']['url']
-            if not re.findall(r'sign=[0-9a-z]+', self.video_url):
-                self.video_url = re.sub(r'[0-9a-z\-]+\.xhscdn\.(com|net)', 'sns-bak-v1.xhscdn.com', self.video_url)
-        self.to_html()
+    async def run(
+        self,
+        args: list[str],
+        input: bytes | None = None,
+        timeout: float = MEDIA_TOOL_TIMEOUT,
+        ctrl: _ProgressControl | None = None,
+    ) -> subprocess.CompletedProcess[bytes]:
+        queued = time.monotonic()
+        await self._acquire(ctrl)
+        holding = True
+        started = time.monotonic()
+        wait = started - queued
+        self.wait_time += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.runs += 1
+        paused_time = 0.0
+        proc: asyncio.subprocess.Process | None = None
+        communicate: asyncio.Future[tuple[bytes, bytes]] | None = None
+        try:
+            if ctrl:
+                await ctrl.check()
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            )
+            communicate = asyncio.ensure_future(proc.communicate(input))
+            deadline = started + timeout
+            while not communicate.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise subprocess.TimeoutExpired(args, timeout)
+                if ctrl and ctrl.cancelled:
+                    raise _OperationCancelled()
+                if ctrl and ctrl.paused and self._CAN_SUSPEND and proc.returncode is None:
+                    paused_at = time.monotonic()
+                    proc.send_signal(signal.SIGSTOP)
+                    self._release()
+                    holding = False
+                    await self._acquire(ctrl)
+                    holding = True
+                    proc.send_signal(signal.SIGCONT)
+                    paused_time += time.monotonic() - paused_at
+                    deadline += time.monotonic() - paused_at
+                    continue
+                await asyncio.wait({communicate}, timeout=min(remaining, 0.5))
+            out, err = communicate.result()
+            if proc.returncode:
+                self.failures += 1
+            return subprocess.CompletedProcess(args, proc.returncode or 0, out, err)
+        except BaseException as e:
+            if isinstance(e, _OperationCancelled):
+                self.cancelled += 1
+            elif not isinstance(e, (subprocess.TimeoutExpired, asyncio.CancelledError)):
+                self.failures += 1
+            if proc and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            if communicate is not None:
+                # The pipes close with the process; collect the result so the
+                # future is not left pending (or its error unretrieved).
+                await asyncio.gather(communicate, return_exceptions=True)
+            raise
+        finally:
+            self.run_time += time.monotonic() - started - paused_time
+            if holding:
+                self._release()
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        avg_wait = self.wait_time / self.runs * 1000 if self.runs else 0
+        avg_run = self.run_time / self.runs * 1000 if self.runs else 0
+        return [
+            f'workers: {self.running}/{self.workers} busy, {self.waiting} queued',
+            f'runs: {self.runs}, failed {self.failures}, timed out {self.timeouts}, cancelled {self.cancelled}',
+            f'queue wait: avg {avg_wait:.0f} ms, max {self.max_wait * 1000:.0f} ms; run: avg {avg_run:.0f} ms',
+        ]
 
-    async def initialize(self) -> None:
-        await self.to_telegraph()
-        self.short_preview = ''
 
-    def to_dict(self) -> dict[str, str | int | Any]:
-        return {
-            'user': self.user,
-            'title': self.title,
-            'type': self.type,
-            'desc': self.desc,
-            'length': self.length,
-            'time': self.time,
-            'ip_location': self.ip_location,
-            'collected_count': self.collected_count,
-            'comments_count': self.comments_count,
-            'shared_count': self.shared_count,
-            'liked_count': self.liked_count,
-            'images_list': getattr(self, 'images_list', []),
-            'video_url': getattr(self, 'video_url', ''),
-            'url': self.url,
-        }
+media_tools = MediaToolPool(MEDIA_TOOL_WORKERS)
 
-    def media_for_llm(self) -> list[dict[str, str]]:
-        media_list: list[dict[str, str]] = []
-        for img in self.images_list:
-            if not img['live']:
-                media_list.append({'type': 'image', 'url': img['url']})
-        if self.video_url and self.thumbnail:
+
+class VideoInfo:
+    """What the video upload needs to know about a file: its attributes and a thumbnail."""
+    __slots__ = ('width', 'height', 'duration', 'codec', 'bitrate', 'thumb')
+
+    def __init__(self) -> None:
+        self.width = 0
+        self.height = 0
+        self.duration = 0  # seconds
+        self.codec = ''
+        self.bitrate = 0   # kbps
+        self.thumb: bytes | None = None
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.width and self.height and self.duration)
+
+
+def video_info_from_note(video: dict[str, Any], stream: dict[str, Any] | None = None) -> VideoInfo:
+    """Build a :class:`VideoInfo` from a note's ``video`` JSON and its selected rendition."""
+    stream = stream or {}
+    info = VideoInfo()
+    try:
+        info.width = int(stream.get('width') or video.get('width') or 0)
+        info.height = int(stream.get('height') or video.get('height') or 0)
+        info.duration = int(stream.get('duration') or float(video.get('duration') or 0))
+        info.codec = stream.get('codec', '')
+        info.bitrate = int(stream.get('bitrate') or 0)
+    except (TypeError, ValueError) as e:
+        bot_logger.debug(f"Unusable video metadata in note JSON: {e}")
+        return VideoInfo()
+    return info
+
+
+def _shrink_to_thumb(data: bytes) -> bytes | None:
+    """Re-encode *data* as a JPEG of at most 320 px, Telegram's thumbnail limit."""
+    try:
+        img = Image.open(BytesIO(data))
+        if img.format == 'JPEG' and max(img.size) <= 320:
+            return data
+        img.thumbnail((320, 320), Image.Resampling.LANCZOS)
+        out = BytesIO()
+        img.convert('RGB').save(out, format='JPEG', quality=85)
+        return out.getvalue()
+    except Exception as e:
+        bot_logger.debug(f"Cover thumbnail unusable: {e}")
+        return None
+
+
+async def fetch_cover_thumb(url: str) -> bytes | None:
+    """Download a note's CDN cover in the preview rendition as a video thumbnail."""
+    try:
+        content = await fetch_image(url, profile='preview')
+    except Exception as e:
+        bot_logger.debug(f"Cover download failed: {e}")
+        return None
+    return await asyncio.to_thread(_shrink_to_thumb, content)
+
+
+_FFMPEG_DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)(?:.*?bitrate: (\d+) kb/s)?')
+_FFMPEG_VIDEO_RE = re.compile(r'Stream #\S+.*?: Video: (\w+).*?\b(\d{2,5})x(\d{2,5})\b')
+
+# Results of inspect_video keyed by a sampled content hash, most recent last.
+_video_info_cache: OrderedDict[str, VideoInfo] = OrderedDict()
+_VIDEO_INFO_CACHE_SIZE = 256
+video_info_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _sampled_hash(data: bytes, sample: int = 64 * 1024) -> str:
+    """Hash the size and the first, middle and last *sample* bytes of *data*."""
+    h = hashlib.blake2b(len(data).to_bytes(8, 'little'), digest_size=16)
+    if len(data) <= 3 * sample:
+        h.update(data)
+    else:
+        mid = len(data) // 2
+        h.update(data[:sample])
+        h.update(data[mid:mid + sample])
+        h.update(data[-sample:])
+    return h.hexdigest()
+
+
+def _sampled_file_hash(path: str, sample: int = 64 * 1024) -> str:
+    """:func:`_sampled_hash` of the file at *path*, reading only the samples."""
+    size = os.path.getsize(path)
+    if size <= 3 * sample:
+        with open(path, 'rb') as f:
+            return _sampled_hash(f.read(), sample)
+    h = hashlib.blake2b(size.to_bytes(8, 'little'), digest_size=16)
+    with open(path, 'rb') as f:
+        for offset in (0, size // 2, size - sample):
+            f.seek(offset)
+            h.update(f.read(sample))
+    return h.hexdigest()
+
+
+def _parse_ffmpeg_banner(stderr: str, info: VideoInfo) -> None:
+    if m := _FFMPEG_DURATION_RE.search(stderr):
+        hours, minutes, seconds, bitrate = m.groups()
+        info.duration = int(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+        info.bitrate = int(bitrate or 0)
+    if m := _FFMPEG_VIDEO_RE.search(stderr):
+        info.codec = m.group(1)
+        info.width, info.height = int(m.group(2)), int(m.group(3))
+
+
+async def inspect_video(data: bytes | str, ctrl: _ProgressControl | None = None) -> VideoInfo:
+    """Probe a video and grab a ≤320 px first-frame thumbnail in one ffmpeg run.
+
+    *data* is the video itself or the path of a file holding it.  Bytes are
+    written to a temporary file so ffmpeg can seek to the moov index instead
+    of reading the stream over a pipe, and the metadata is parsed from its
+    banner on stderr.  ffprobe is only run when the banner
+    lacks dimensions or duration.  Complete results (metadata and a
+    thumbnail) are cached by a sampled hash of the content, so resending the
+    same video does not run either tool; a failed or partial inspection is
+    retried next time.
+    """
+    if isinstance(data, str):
+        key = await asyncio.to_thread(_sampled_file_hash, data)
+    else:
+        key = _sampled_hash(data)
+    if key in _video_info_cache:
+        video_info_cache_stats['hits'] += 1
+        _video_info_cache.move_to_end(key)
+        return _video_info_cache[key]
+    video_info_cache_stats['misses'] += 1
+
+    info = VideoInfo()
+    if isinstance(data, str):
+        path, temporary = data, False
+    else:
+        fd, path = tempfile.mkstemp(suffix='.mp4')
+        temporary = True
+    try:
+        if temporary:
+            with os.fdopen(fd, 'wb') as f:
+                await asyncio.to_thread(f.write, data)
+        try:
+            result = await media_tools.run(
+                ['ffmpeg', '-hide_banner', '-i', path, '-frames:v', '1',
+                 '-vf', 'scale=320:320:force_original_aspect_ratio=decrease',
+                 '-f', 'image2', '-c:v', 'mjpeg', 'pipe:1'],
+                ctrl=ctrl,
+            )
+            _parse_ffmpeg_banner(result.stderr.decode(errors='replace'), info)
+            if result.returncode == 0 and result.stdout:
+                info.thumb = result.stdout
+        except _OperationCancelled:
+            raise
+        except Exception as e:
+            bot_logger.warning(f"ffmpeg inspection failed: {e}")
+        if not info.complete:
+            try:
+                probe = await media_tools.run(
+                    ['ffprobe', '-v', 'quiet', '-print_format', 'json',
+                     '-show_streams', '-show_format', path],
+                    ctrl=ctrl,
+                )
+                probe_info = json.loads(probe.stdout)
+                for st in probe_info.get('streams', []):
+                    if st.get('codec_type') == 'video':
+                        info.width = int(st.get('width', 0))
+                        info.height = int(st.get('height', 0))
+                        info.codec = st.get('codec_name', '')
+                        break
+                fmt = probe_info.get('format', {})
+                info.duration = int(float(fmt.get('duration', 0)))
+                info.bitrate = int(int(fmt.get('bit_rate', 0)) / 1000)
+            except _OperationCancelled:
+                raise
+            except Exception as e:
+                bot_logger.warning(f"ffprobe failed, sending without dimensions: {e}")
+    finally:
+        if temporary:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    if info.complete and info.thumb:
+        _video_info_cache[key] = info
+        while len(_video_info_cache) > _VIDEO_INFO_CACHE_SIZE:
+            _video_info_cache.popitem(last=False)
+    return info
+
+
+def mp4_needs_faststart(data: bytes) -> bool:
+    """True if the top-level ``moov`` box of an MP4 comes after ``mdat``.
+
+    Players (and Telegram's streaming) need the index before the media data;
+    such files are fixed by a stream-copy remux with ``-movflags +faststart``.
+    """
+    pos, end = 0, len(data)
+    seen_mdat = False
+    while pos + 8 <= end:
+        size = int.from_bytes(data[pos:pos + 4], 'big')
+        kind = data[pos + 4:pos + 8]
+        header = 8
+        if size == 1:  # 64-bit largesize follows the type
+            if pos + 16 > end:
+                break
+            size = int.from_bytes(data[pos + 8:pos + 16], 'big')
+            header = 16
+        elif size == 0:  # box runs to the end of the file
+            size = end - pos
+        if kind == b'moov':
+            return seen_mdat
+        if kind == b'mdat':
+            seen_mdat = True
+        if size < header:
+            break
+        pos += size
+    return False
+
+
+class VideoPlan:
+    """How a downloaded video is sent: the files to upload and what was done to get them.
+
+    Each part is the downloaded video itself or, after ffmpeg, the path of a
+    file in ``workdir``, which :meth:`close` removes once the parts are sent.
+    ``decision`` is the i18n key of a short line for the progress summary
+    (empty when the video is sent as downloaded), with its placeholders in
+    ``decision_args``; :meth:`describe` renders it.  No ``parts`` means the
+    video is skipped.  ``resized`` is set when the parts no longer match the
+    note's video metadata (split or re-encoded), so they have to be probed
+    before sending.
+    """
+    __slots__ = ('parts', 'decision', 'decision_args', 'resized', 'workdir')
+
+    def __init__(
+        self, parts: list[bytes | str], decision: str = '', resized: bool = False,
+        workdir: str = '', **decision_args: Any,
+    ) -> None:
+        self.parts = parts
+        self.decision = decision
+        self.decision_args = decision_args
+        self.resized = resized
+        self.workdir = workdir
+
+    def describe(self, lang: str = 'en') -> str:
+        return _t(self.decision, lang, **self.decision_args) if self.decision else ''
+
+    def size(self) -> int:
+        """Total bytes of the parts."""
+        return sum(len(p) if isinstance(p, bytes) else os.path.getsize(p) for p in self.parts)
+
+    def close(self) -> None:
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.workdir = ''
+
+
+def _mb(n: int) -> str:
+    return f'{n / (1024 * 1024):.0f}'
+
+
+async def _remux_faststart(path: str, out: str, ctrl: _ProgressControl | None) -> str | None:
+    result = await media_tools.run(
+        ['ffmpeg', '-hide_banner', '-y', '-i', path, '-map', '0', '-c', 'copy',
+         '-movflags', '+faststart', out],
+        timeout=120, ctrl=ctrl,
+    )
+    if result.returncode or not os.path.exists(out):
+        bot_logger.warning(f"Faststart remux failed: {result.stderr.decode(errors='replace')[-300:]}")
+        return None
+    return out
+
+
+async def _split_video(
+    path: str, workdir: str, size: int, duration: int, limit: int, ctrl: _ProgressControl | None,
+) -> list[str] | None:
+    # Segments can only be cut at keyframes, so aim well below the limit and
+    # halve the segment length once if a part still comes out too big.
+    segment = max(1.0, duration * limit / size * 0.9)
+    for attempt in range(2):
+        pattern = os.path.join(workdir, f'part{attempt}_%03d.mp4')
+        result = await media_tools.run(
+            ['ffmpeg', '-hide_banner', '-y', '-i', path, '-map', '0', '-c', 'copy',
+             '-f', 'segment', '-segment_time', f'{segment:.2f}', '-reset_timestamps', '1',
+             '-segment_format_options', 'movflags=+faststart', pattern],
+            timeout=300, ctrl=ctrl,
+        )
+        if result.returncode:
+            bot_logger.warning(f"Video split failed: {result.stderr.decode(errors='replace')[-300:]}")
+            return None
+        names = sorted(n for n in os.listdir(workdir) if n.startswith(f'part{attempt}_'))
+        sizes = [os.path.getsize(os.path.join(workdir, n)) for n in names]
+        if names and max(sizes) <= limit:
+            return [os.path.join(workdir, n) for n in names]
+        segment = max(1.0, segment / 2)
+    return None
+
+
+async def _downscale_video(
+    path: str, out: str, duration: int, limit: int, ctrl: _ProgressControl | None,
+) -> str | None:
+    # Average bitrate that fits the limit with 10% headroom, minus 128 kbps audio.
+    video_kbps = int(limit * 8 * 0.9 / duration / 1000) - 128
+    if video_kbps < 300:
+        bot_logger.warning(f"Video too long to downscale under the limit ({video_kbps} kbps)")
+        return None
+    result = await media_tools.run(
+        ['ffmpeg', '-hide_banner', '-y', '-i', path,
+         '-vf', "scale=-2:'min(720,ih)'", '-c:v', 'libx264', '-preset', 'veryfast',
+         '-b:v', f'{video_kbps}k', '-maxrate', f'{video_kbps}k', '-bufsize', f'{video_kbps * 2}k',
+         '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', out],
+        timeout=max(600, duration * 3), ctrl=ctrl,
+    )
+    if result.returncode or not os.path.exists(out) or os.path.getsize(out) > limit:
+        bot_logger.warning(f"Video downscale failed: {result.stderr.decode(errors='replace')[-300:]}")
+        return None
+    return out
+
+
+async def prepare_video(
+    data: bytes,
+    duration: int = 0,
+    ctrl: _ProgressControl | None = None,
+    limit: int = TELEGRAM_MAX_UPLOAD_BYTES,
+    policy: str = VIDEO_OVERSIZE_POLICY,
+) -> VideoPlan:
+    """Turn a downloaded video into files Telegram will accept and can stream.
+
+    Videos within *limit* are remuxed to faststart (without re-encoding) only
+    when their ``moov`` box trails the media data.  Larger ones are split at
+    keyframes or downscaled according to *policy*; if that fails, or the
+    policy is ``skip``, the plan has no parts.  On any other ffmpeg failure
+    the video is sent as downloaded.  Parts made by ffmpeg stay on disk until
+    the caller closes the plan.
+    """
+    size = len(data)
+    if size <= limit and not mp4_needs_faststart(data):
+        return VideoPlan([data])
+    if size > limit and policy not in ('split', 'downscale'):
+        return VideoPlan([], 'video_too_large_skipped', size_mb=_mb(size), limit_mb=_mb(limit))
+
+    workdir = tempfile.mkdtemp(prefix='xhsvideo_')
+    kept = False
+    try:
+        path = os.path.join(workdir, 'in.mp4')
+        with open(path, 'wb') as f:
+            await asyncio.to_thread(f.write, data)
+        out = os.path.join(workdir, 'out.mp4')
+        try:
+            if size <= limit:
+                remuxed = await _remux_faststart(path, out, ctrl)
+                if remuxed:
+                    kept = True
+                    return VideoPlan([remuxed], 'video_remuxed', workdir=workdir)
+                return VideoPlan([data])
+            duration = duration or (await inspect_video(path, ctrl=ctrl)).duration
+            if not duration:
+                return VideoPlan([], 'video_too_large_no_duration', size_mb=_mb(size), limit_mb=_mb(limit))
+            if policy == 'split':
+                parts = await _split_video(path, workdir, size, duration, limit, ctrl)
+                if parts:
+                    kept = True
+                    return VideoPlan(
+                        parts, 'video_split', resized=True, workdir=workdir,
+                        count=len(parts), limit_mb=_mb(limit),
+                    )
+            else:
+                smaller = await _downscale_video(path, out, duration, limit, ctrl)
+                if smaller:
+                    kept = True
+                    return VideoPlan(
+                        [smaller], 'video_downscaled', resized=True, workdir=workdir,
+                        size_mb=_mb(size), new_mb=_mb(os.path.getsize(smaller)), limit_mb=_mb(limit),
+                    )
+        except (_OperationCancelled, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            bot_logger.warning(f"Video preparation failed: {e}")
+            if size <= limit:
+                return VideoPlan([data])
+        failed = 'video_split_failed' if policy == 'split' else 'video_downscale_failed'
+        return VideoPlan([], failed, size_mb=_mb(size), limit_mb=_mb(limit))
+    finally:
+        if kept:
+            # The parts are sent from here; the input copy is no longer needed.
+            os.unlink(path)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def convert_to_ogg_opus_pipe(input_bytes: bytes) -> bytes:
+    try:
+        result = await media_tools.run(
+            ["ffmpeg", "-i", "pipe:0", "-c:a", "libopus", "-f", "ogg", "pipe:1"],
+            input=input_bytes, timeout=60,
+        )
+    except Exception as e:
+        bot_logger.warning(f"Opus transcode failed: {e}")
+        return b''
+    return result.stdout
+
+
+async def convert_to_mp3_pipe(input_bytes: bytes) -> bytes:
+    try:
+        result = await media_tools.run(
+            ["ffmpeg", "-i", "pipe:0", "-vn", "-c:a", "libmp3lame", "-q:a", "3", "-f", "mp3", "pipe:1"],
+            input=input_bytes, timeout=60,
+        )
+    except Exception as e:
+        bot_logger.warning(f"MP3 transcode failed: {e}")
+        return b''
+    return result.stdout
+
+
+class AudioTranscoder:
+    """Voice-comment audio in the formats Telegram wants, made on demand and cached on disk.
+
+    Files live in *cache_dir* keyed by the source URL without its query string
+    (XHS signs audio URLs), as ``<key>.src`` for the download and
+    ``<key>.ogg`` / ``<key>.mp3`` for transcodes.  Least recently used files
+    are removed once the directory grows past *max_bytes*.  A format is only
+    transcoded when a send actually needs it.
+    """
+
+    _CONVERTERS = {'ogg': convert_to_ogg_opus_pipe, 'mp3': convert_to_mp3_pipe}
+
+    def __init__(self, cache_dir: str, max_bytes: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._lock_users: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.transcodes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str, ext: str) -> str:
+        key = hashlib.sha1(urlparse(url)._replace(query='').geturl().encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.{ext}')
+
+    def _read(self, path: str) -> bytes | None:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+            return data
+        except OSError:
+            return None
+
+    def _write(self, path: str, data: bytes) -> None:
+        tmp = f'{path}.{uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    async def _cached(self, path: str, produce: Any) -> bytes:
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        self._lock_users[path] = self._lock_users.get(path, 0) + 1
+        try:
+            async with lock:
+                data = await asyncio.to_thread(self._read, path)
+                if data is not None:
+                    self.hits += 1
+                    return data
+                self.misses += 1
+                data = await produce()
+                if data:
+                    await asyncio.to_thread(self._write, path, data)
+                return data
+        finally:
+            # A waiter woken by the release has not re-taken the lock yet, so
+            # lock.locked() alone can't tell whether it is still in use.
+            self._lock_users[path] -= 1
+            if not self._lock_users[path] and not lock.locked():
+                del self._lock_users[path]
+                self._locks.pop(path, None)
+
+    async def source(self, url: str) -> bytes:
+        """The original audio as downloaded from the CDN."""
+        return await self._cached(self._path(url, 'src'), lambda: cdn_mirrors.fetch([url]))
+
+    async def get(self, url: str, fmt: str) -> bytes:
+        """The audio at *url* transcoded to *fmt* ('ogg' or 'mp3'); b'' if ffmpeg fails."""
+        async def _transcode() -> bytes:
+            self.transcodes += 1
+            return await self._CONVERTERS[fmt](await self.source(url))
+        return await self._cached(self._path(url, fmt), _transcode)
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        size = sum(e.stat().st_size for e in os.scandir(self.cache_dir) if e.is_file())
+        return [f'audio cache: {self.hits} hits, {self.misses} misses, {self.transcodes} transcodes, '
+                f'{size / (1024 * 1024):.1f}/{self.max_bytes / (1024 * 1024):.0f} MB on disk']
+
+
+audio_transcoder = AudioTranscoder(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+
+
+# ── Parallel uploader ──────────────────────────────────────────────────────────
+
+UPLOAD_PART_SIZE = 512 * 1024
+_BIG_FILE_BYTES = 10 * 1024 * 1024  # Telegram's InputFile / InputFileBig cut-off
+
+
+def _read_file_part(path: str, offset: int, length: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _file_md5(path: str) -> Any:
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            md5.update(chunk)
+    return md5
+
+
+class ParallelUploader:
+    """Uploads large files to Telegram over several MTProto connections at once.
+
+    ``TelegramClient.upload_file`` awaits every part before sending the next,
+    so a big video is bounded by one round trip per 512 KB.  Here each worker
+    owns a :class:`MTProtoSender` to the home DC (sharing the client's auth
+    key), opened for the upload and disconnected when it ends, and pulls part
+    numbers from a shared counter.  If extra connections cannot be opened,
+    the workers pipeline their parts over the client's own connection
+    instead, which still keeps several parts in flight.
+    """
+
+    def __init__(self, workers: int = PARALLEL_UPLOAD_WORKERS,
+                 min_bytes: int = PARALLEL_UPLOAD_MIN_BYTES) -> None:
+        self.workers = max(1, workers)
+        self.min_bytes = min_bytes
+        self._senders_failed = False
+
+    async def _open_senders(self, bot: TelegramClient) -> list[MTProtoSender]:
+        """Connect one extra sender per worker; an empty list means "use the client itself"."""
+        if self._senders_failed:
+            return []
+        senders: list[MTProtoSender] = []
+        try:
+            dc = await bot._get_dc(bot.session.dc_id)  # pyright: ignore[reportPrivateUsage]
+            while len(senders) < self.workers:
+                sender = MTProtoSender(bot.session.auth_key, loggers=bot._log)  # pyright: ignore[reportPrivateUsage]
+                await sender.connect(bot._connection(  # pyright: ignore[reportPrivateUsage]
+                    dc.ip_address, dc.port, dc.id,
+                    loggers=bot._log,  # pyright: ignore[reportPrivateUsage]
+                    proxy=bot._proxy,  # pyright: ignore[reportPrivateUsage]
+                ))
+                senders.append(sender)
+                # Every new connection has to send InitConnection before
+                # Telegram accepts other requests on it.
+                init = copy.copy(bot._init_request)  # pyright: ignore[reportPrivateUsage]
+                init.query = functions.help.GetConfigRequest()
+                await sender.send(functions.InvokeWithLayerRequest(LAYER, init))
+        except Exception as e:
+            bot_logger.warning(f"Parallel upload: cannot open extra connections, using the main one: {e}")
+            self._senders_failed = True
+            await self._close_senders(senders)
+            return []
+        return senders
+
+    @staticmethod
+    async def _close_senders(senders: list[MTProtoSender]) -> None:
+        for sender in senders:
+            try:
+                await sender.disconnect()
+            except Exception as e:
+                bot_logger.debug(f"Parallel upload: disconnecting a sender failed: {e}")
+
+    async def _save_part(self, bot: TelegramClient, sender: MTProtoSender | None, request: Any) -> None:
+        for attempt in range(3):
+            try:
+                ok = await (sender.send(request) if sender else bot(request))
+                if ok:
+                    return
+            except FloodWaitError as e:
+                # Out of retries: let the caller see the flood wait itself,
+                # not a generic failure, so it can be honoured upstream.
+                if attempt == 2:
+                    raise
+                await asyncio.sleep(e.seconds)
+            except Exception as e:
+                if attempt == 2:
+                    raise
+                bot_logger.warning(f"Parallel upload: part {getattr(request, 'file_part', '?')} failed, retrying: {e}")
+                # A broken extra connection should not sink the upload; retry
+                # the part over the client's own connection.
+                sender = None
+        raise RuntimeError(f"Telegram refused file part {getattr(request, 'file_part', '?')}")
+
+    async def upload(self, bot: TelegramClient, data: bytes | str, file_name: str,
+                     progress_callback: Any = None) -> Any:
+        """Upload *data* and return the ``InputFile``/``InputFileBig`` handle.
+
+        *data* is the file itself or the path of a file on disk, which is
+        read one part at a time.  Files below ``min_bytes`` go through
+        ``bot.upload_file`` unchanged.  ``progress_callback(sent_bytes,
+        total)`` is awaited after every part, as with Telethon's own uploader.
+        """
+        on_disk = isinstance(data, str)
+        size = os.path.getsize(data) if on_disk else len(data)
+        if size < self.min_bytes or self.workers < 2:
+            if on_disk:
+                source: Any = data
+            else:
+                source = BytesIO(data)
+                source.name = file_name
+            accounted = 0
+
+            async def _accounting_progress(current: int, total: int) -> None:
+                nonlocal accounted
+                await upload_bandwidth.acquire(current - accounted)
+                accounted = current
+                if progress_callback:
+                    await progress_callback(current, total)
+
+            return await bot.upload_file(source, file_name=file_name, progress_callback=_accounting_progress)
+
+        file_id = generate_random_long()
+        part_count = (size + UPLOAD_PART_SIZE - 1) // UPLOAD_PART_SIZE
+        is_big = size > _BIG_FILE_BYTES
+        view = None if on_disk else memoryview(data)
+        next_part = 0
+        sent = 0
+
+        async def _worker(sender: MTProtoSender | None) -> None:
+            nonlocal next_part, sent
+            while next_part < part_count:
+                index = next_part
+                next_part += 1
+                if view is None:
+                    part = await asyncio.to_thread(
+                        _read_file_part, data, index * UPLOAD_PART_SIZE, UPLOAD_PART_SIZE)
+                else:
+                    part = bytes(view[index * UPLOAD_PART_SIZE:(index + 1) * UPLOAD_PART_SIZE])
+                await upload_bandwidth.acquire(len(part))
+                if is_big:
+                    request = functions.upload.SaveBigFilePartRequest(file_id, index, part_count, part)
+                else:
+                    request = functions.upload.SaveFilePartRequest(file_id, index, part)
+                await self._save_part(bot, sender, request)
+                sent += len(part)
+                if progress_callback:
+                    await progress_callback(sent, size)
+
+        senders = await self._open_senders(bot)
+        workers: list[MTProtoSender | None] = [*senders, *[None] * (self.workers - len(senders))]
+        tasks = [asyncio.create_task(_worker(s)) for s in workers]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            await self._close_senders(senders)
+
+        if is_big:
+            return tl_types.InputFileBig(file_id, part_count, file_name)
+        md5 = await asyncio.to_thread(_file_md5, data) if on_disk else hashlib.md5(data)
+        return InputSizedFile(file_id, part_count, file_name, md5=md5, size=size)
+
+
+parallel_uploader = ParallelUploader()
+
+
+# ── Album transfer pipeline ────────────────────────────────────────────────────
+
+class _AlbumProgress:
+    """Live counters of an album pipeline run, handed to its progress callback."""
+    __slots__ = ('total', 'downloaded', 'download_bytes', 'uploaded', 'upload_bytes',
+                 'sent', 'failed', 'failed_batches', 'dl_start', 'dl_elapsed', 'ul_start', 'ul_elapsed')
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.downloaded = 0
+        self.download_bytes = 0
+        self.uploaded = 0
+        self.upload_bytes = 0     # includes the partially uploaded current file
+        self.sent = 0
+        self.failed = 0           # files that could not be uploaded or sent
+        self.failed_batches = 0
+        self.dl_start = time.monotonic()
+        self.dl_elapsed = 0.0
+        self.ul_start = 0.0
+        self.ul_elapsed = 0.0
+
+    @property
+    def downloading(self) -> bool:
+        return self.downloaded < self.total
+
+    @property
+    def pct(self) -> float:
+        """Overall progress, counting each file's download and upload as one half."""
+        return (self.downloaded + self.uploaded) / (2 * self.total) if self.total else 0.0
+
+
+async def _run_album_pipeline(
+    bot: TelegramClient,
+    chat_id: int,
+    items: list[dict[str, Any]],
+    reply_to: int | None = None,
+    caption: str | None = None,
+    force_document: bool = False,
+    ctrl: _ProgressControl | None = None,
+    on_progress: Any = None,
+    keep_going: bool = False,
+) -> tuple[list[Any], _AlbumProgress]:
+    """Download, upload and send *items* as albums of 10 with the stages overlapped.
+
+    Each item is a dict with ``url``, optional ``mirrors`` and the file
+    ``name``.  A file starts uploading as soon as it is downloaded (up to
+    ``ALBUM_UPLOAD_CONCURRENCY`` at once), and an album batch is sent as soon
+    as its files are uploaded, so the CDN and Telegram connections are busy
+    at the same time.  ``caption`` goes on the
+    last batch.  ``on_progress(progress)`` is awaited after every change and
+    should hand the text to :data:`progress_renderer` rather than edit itself.
+
+    A file that fails to upload, or a batch that fails to send, stops all
+    stages and re-raises, unless *keep_going* is set: then the failure is
+    logged and the next batch is sent.  Files that failed to upload are
+    dropped from their batch and counted in ``progress.failed``; a batch that
+    failed to send counts all its files there and one in
+    ``progress.failed_batches``.
+
+    Returns (sent_messages, progress).  Cancelling via *ctrl* raises
+    :class:`_OperationCancelled` after stopping all stages.
+    """
+    prog = _AlbumProgress(len(items))
+    upload_q: asyncio.Queue[BytesIO | None] = asyncio.Queue()
+    batch_q: asyncio.Queue[list[asyncio.Task[Any]] | None] = asyncio.Queue()
+    upload_tasks: list[asyncio.Task[Any]] = []
+    sent_messages: list[Any] = []
+
+    async def _report() -> None:
+        if not on_progress or (ctrl and (ctrl.paused or ctrl.cancelled)):
+            return
+        try:
+            await on_progress(prog)
+        except Exception as e:
+            bot_logger.debug(f"Album progress update failed: {e}")
+
+    async def _download() -> None:
+        for item in items:
+            if ctrl:
+                await ctrl.check()
+            content = await fetch_image(
+                item['url'], item.get('mirrors'),
+                item.get('profile', 'document'), item.get('quality', 'balanced'),
+            )
+            bio = BytesIO(content)
+            bio.name = item['name']
+            prog.downloaded += 1
+            prog.download_bytes += len(content)
+            await upload_q.put(bio)
+            await _report()
+        prog.dl_elapsed = time.monotonic() - prog.dl_start
+        await upload_q.put(None)
+
+    async def _upload() -> None:
+        # Pre-upload each file individually (progress_callback only works for
+        # single-file uploads, not album send_file calls).  Up to
+        # ALBUM_UPLOAD_CONCURRENCY files upload at once; batches hold the
+        # upload tasks in album order and _send awaits them in that order.
+        sem = asyncio.Semaphore(ALBUM_UPLOAD_CONCURRENCY)
+        in_flight: dict[int, int] = {}  # index → bytes sent so far
+        finished_bytes = 0
+
+        async def _upload_one(index: int, bio: BytesIO) -> Any:
+            nonlocal finished_bytes
+
+            async def _file_progress(current: int, _total: int) -> None:
+                if ctrl:
+                    await ctrl.check()
+                in_flight[index] = current
+                prog.upload_bytes = finished_bytes + sum(in_flight.values())
+                await _report()
+
+            try:
+                handle = await parallel_uploader.upload(
+                    bot, bio.getvalue(), bio.name, progress_callback=_file_progress)
+            finally:
+                in_flight.pop(index, None)
+                sem.release()
+            finished_bytes += bio.getbuffer().nbytes
+            prog.upload_bytes = finished_bytes + sum(in_flight.values())
+            prog.uploaded += 1
+            await _report()
+            return handle
+
+        batch: list[asyncio.Task[Any]] = []
+        index = 0
+        while (bio := await upload_q.get()) is not None:
+            await sem.acquire()
+            if ctrl:
+                try:
+                    await ctrl.check()
+                except BaseException:
+                    sem.release()
+                    raise
+            if not prog.ul_start:
+                prog.ul_start = time.monotonic()
+            task = asyncio.create_task(_upload_one(index, bio))
+            upload_tasks.append(task)
+            batch.append(task)
+            index += 1
+            if len(batch) == 10:
+                await batch_q.put(batch)
+                batch = []
+        if batch:
+            await batch_q.put(batch)
+        await batch_q.put(None)
+
+    async def _send() -> None:
+        while (pending := await batch_q.get()) is not None:
+            batch: list[Any] = []
+            for handle in await asyncio.gather(*pending, return_exceptions=keep_going):
+                if not isinstance(handle, BaseException):
+                    batch.append(handle)
+                elif isinstance(handle, _OperationCancelled) or not isinstance(handle, Exception):
+                    raise handle
+                else:
+                    prog.failed += 1
+                    bot_logger.error(f"Album upload failed ({handle!r})")
+            is_last_batch = prog.sent + len(pending) == prog.total
+            if not batch:
+                prog.sent += len(pending)
+                continue
+            try:
+                result = await bot.send_file(
+                    chat_id, batch,
+                    caption=caption if is_last_batch else None, parse_mode='html',
+                    reply_to=reply_to, silent=True,
+                    force_document=force_document,
+                )
+                sent_messages.extend(result if isinstance(result, list) else [result])
+            except Exception as e:
+                if not keep_going:
+                    raise
+                prog.failed += len(batch)
+                prog.failed_batches += 1
+                bot_logger.error(f"Album batch at {prog.sent} failed ({e})\n{traceback.format_exc()}")
+            prog.sent += len(pending)
+        prog.ul_elapsed = time.monotonic() - (prog.ul_start or prog.dl_start)
+
+    # Stage tasks copy the current context, so their transfers count against ctrl.
+    with _bandwidth_job(ctrl or _transfer_job.get()):
+        tasks = [asyncio.create_task(_download()), asyncio.create_task(_upload()), asyncio.create_task(_send())]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks + upload_tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, *upload_tasks, return_exceptions=True)
+        raise
+    return sent_messages, prog
+
+
+# ── Comment media prefetch ─────────────────────────────────────────────────────
+
+class CommentMediaPrefetcher:
+    """Downloads the media of an anchor-comment thread ahead of its sends.
+
+    Fetches for every comment start on construction, at most *concurrency*
+    at a time and in thread order, so the ordered sender (which has to keep
+    reply chains intact) only waits for media that is not ready yet.
+    Pictures come in the send's rendition; voice comments are transcoded to
+    the format the send will try first (OGG voice note, or MP3 as a file).
+    A failed fetch raises when its result is taken, as if fetched inline.
+    """
+
+    def __init__(
+        self,
+        comments: list[dict[str, Any]],
+        include_live_videos: bool = False,
+        send_as_file: bool = False,
+        quality: str = 'balanced',
+        ctrl: _ProgressControl | None = None,
+        concurrency: int = COMMENT_PREFETCH_CONCURRENCY,
+    ) -> None:
+        self.include_live_videos = include_live_videos
+        self.ctrl = ctrl
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: dict[tuple[int, int], asyncio.Task[Any]] = {}
+        profile = 'document' if send_as_file else 'photo'
+        for ci, comment in enumerate(comments):
+            pics = self.pictures(comment)
+            for idx, url in enumerate(pics):
+                mirrors = comment.get('media_mirrors', {}).get(url)
+                self._start((ci, idx), lambda url=url, mirrors=mirrors: fetch_image(url, mirrors, profile, quality))
+            if not comment['pictures'] and comment.get('audio_url', ''):
+                fmt = 'mp3' if send_as_file else 'ogg'
+                self._start((ci, -1), lambda url=comment['audio_url']: audio_transcoder.get(url, fmt))
+
+    def pictures(self, comment: dict[str, Any]) -> list[str]:
+        """The picture (and, if included, live video) URLs sent for *comment*."""
+        if self.include_live_videos:
+            return list(comment['pictures'])
+        return [p for p in comment['pictures'] if 'mp4' not in p]
+
+    def _start(self, key: tuple[int, int], fetch: Any) -> None:
+        self._tasks[key] = asyncio.create_task(self._run(fetch))
+
+    async def _run(self, fetch: Any) -> Any:
+        try:
+            async with self._sem:
+                if self.ctrl:
+                    await self.ctrl.check()
+                return await fetch()
+        except Exception as e:  # handed to the consumer, which raises it
+            return e
+
+    async def _take(self, key: tuple[int, int]) -> bytes:
+        result = await self._tasks.pop(key)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def picture(self, ci: int, idx: int) -> bytes:
+        """Content of picture *idx* of comment *ci*."""
+        return await self._take((ci, idx))
+
+    async def audio(self, ci: int) -> bytes:
+        """Transcoded voice of comment *ci* (b'' if ffmpeg failed)."""
+        return await self._take((ci, -1))
+
+    def close(self) -> None:
+        """Stop fetches whose results will not be taken."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+# ── Inline answers ─────────────────────────────────────────────────────────────
+
+class InlineAnswerer:
+    """Shared state for answering inline queries before they expire.
+
+    Inline queries run in their own *concurrency* slots and every step is
+    bounded by what is left of *deadline* seconds.  Placeholder fills have no
+    Telegram deadline, so they take separate slots and get FILL_TIMEOUT
+    seconds, which keeps slow fills from starving live queries.  Cached note
+    data skips the device round-trip, and Telegraph pages made earlier (by a
+    full job or a previous inline query) are reused instead of created again.
+    """
+
+    # Seconds kept back for the answerInlineQuery call itself.
+    ANSWER_RESERVE = 1.5
+    # Result ID of two-phase placeholders, matched in UpdateBotInlineSend.
+    PLACEHOLDER_ID = 'placeholder'
+    # Seconds a placeholder fill may take before the fallback text is used.
+    FILL_TIMEOUT = 120.0
+
+    def __init__(self, concurrency: int, deadline: float, max_pages: int = 1000) -> None:
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.max_pages = max_pages
+        self.slots = asyncio.Semaphore(concurrency)
+        self.fill_slots = asyncio.Semaphore(concurrency)
+        self._pages: OrderedDict[str, str] = OrderedDict()
+        self.answered = 0
+        self.without_page = 0
+        self.expired = 0
+        self.failed = 0
+        self.note_hits = 0
+        self.page_hits = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.placeholders = 0
+        self.filled = 0
+        self.fill_failed = 0
+        self.fill_timeouts = 0
+        self.fill_total = 0.0
+
+    def remaining(self, started: float, reserve: float = 0.0) -> float:
+        """Seconds left of the deadline for a query that arrived at *started*."""
+        return self.deadline - reserve - (time.monotonic() - started)
+
+    def cached_note(self, note_id: str) -> dict[str, Any] | None:
+        """Cached note data, if it describes an available note."""
+        note_data, _ = botdb.load_note_cache(note_id)
+        try:
+            if note_data['data']['data'][0]['note_list'][0]['model_type'] == 'error':  # type: ignore[index]
+                return None
+        except (KeyError, IndexError, TypeError):
+            return None
+        self.note_hits += 1
+        return note_data
+
+    def page(self, note_id: str) -> str:
+        """URL of a Telegraph page already made for *note_id*, or ''."""
+        url = self._pages.get(note_id)
+        if url is None:
+            row = botdb.get_latest_telegraph(note_id)
+            if row is None:
+                return ''
+            url = row['telegraph_url']
+            self.remember_page(note_id, url)
+        else:
+            self._pages.move_to_end(note_id)
+        self.page_hits += 1
+        return url
+
+    def remember_page(self, note_id: str, url: str) -> None:
+        self._pages[note_id] = url
+        self._pages.move_to_end(note_id)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def record(self, outcome: str, started: float, with_page: bool = True, placeholder: bool = False) -> None:
+        """Count a finished query: 'answered', 'expired' or 'failed'."""
+        if outcome == 'answered':
+            elapsed = time.monotonic() - started
+            self.answered += 1
+            self.without_page += not with_page and not placeholder
+            self.placeholders += placeholder
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+        elif outcome == 'expired':
+            self.expired += 1
+        else:
+            self.failed += 1
+
+    def record_fill(self, ok: bool, started: float, timed_out: bool = False) -> None:
+        """Count a placeholder edited into the full card (or a failed fill)."""
+        if ok:
+            self.filled += 1
+            self.fill_total += time.monotonic() - started
+        else:
+            self.fill_failed += 1
+            self.fill_timeouts += timed_out
+
+    def summary_lines(self) -> list[str]:
+        """Human-readable figures for the admin /stats command."""
+        avg = self.latency_total / self.answered if self.answered else 0
+        busy = self.concurrency - self.slots._value
+        fills_busy = self.concurrency - self.fill_slots._value
+        lines = [
+            f'answered: {self.answered} ({self.placeholders} placeholders, '
+            f'{self.without_page} without Telegraph), avg {avg:.1f}s, max {self.latency_max:.1f}s',
+            f'expired: {self.expired}, failed: {self.failed} (deadline {self.deadline:.0f}s)',
+            f'cache hits: {self.note_hits} note data, {self.page_hits} Telegraph pages',
+            f'slots busy: {busy}/{self.concurrency}, fills {fills_busy}/{self.concurrency}',
+        ]
+        if self.placeholders:
+            fill_avg = self.fill_total / self.filled if self.filled else 0
+            lines.append(f'placeholders filled: {self.filled} (avg {fill_avg:.1f}s), '
+                         f'{self.fill_failed} failed ({self.fill_timeouts} timed out)')
+        return lines
+
+
+inline_answers = InlineAnswerer(INLINE_CONCURRENCY, INLINE_DEADLINE)
+
+
+# ── Telegraph nodes ────────────────────────────────────────────────────────────
+
+# Elements after which Telegraph's HTML importer drops leading whitespace.
+_TELEGRAPH_BLOCK_TAGS = frozenset({
+    'aside', 'blockquote', 'figcaption', 'figure', 'h3', 'h4', 'hr', 'li', 'ol', 'p', 'pre', 'ul', 'video',
+})
+_WHITESPACE_RE = re.compile(r'(\s+)', re.UNICODE)
+# Telegraph rejects pages whose content exceeds 64 KB; longer notes are split
+# into pages linked one to the next, each kept under this estimated size.
+TELEGRAPH_PAGE_MAX_BYTES = 60 * 1024
+# Pages already published, by a digest of their title and content, so a
+# publish that failed part-way reuses the pages it made when retried.
+_telegraph_page_cache: OrderedDict[str, str] = OrderedDict()
+_TELEGRAPH_PAGE_CACHE_MAX = 512
+
+
+class TelegraphNodeBuilder:
+    """Builds the Node JSON Telegraph pages are made of, without HTML.
+
+    Text is added unescaped and whitespace is collapsed the way
+    ``telegraph.utils.html_to_nodes`` does it, so the tree equals what the
+    equivalent HTML would have been parsed into.  ``size`` tracks an
+    estimate of the tree's compact JSON size in bytes as it grows.
+    """
+
+    __slots__ = ('nodes', 'size', 'marks', '_current', '_stack', '_last_text')
+
+    def __init__(self) -> None:
+        self.nodes: list[Any] = []
+        self.size = 2  # []
+        # Estimated size before each top-level node, for splitting into pages.
+        self.marks: list[int] = []
+        self._current = self.nodes
+        self._stack: list[list[Any]] = []
+        self._last_text: str | None = None
+
+    def text(self, s: str) -> None:
+        s = _WHITESPACE_RE.sub(' ', s)
+        if self._last_text is None or self._last_text.endswith(' '):
+            s = s.lstrip(' ')
+        if not s:
+            self._last_text = None
+            return
+        self._last_text = s
+        if self._current and isinstance(self._current[-1], str):
+            self._current[-1] += s
+            self.size += len(s.encode('utf-8'))
+        else:
+            if not self._stack:
+                self.marks.append(self.size)
+            self._current.append(s)
+            self.size += len(s.encode('utf-8')) + 3  # quotes and comma
+
+    def _start(self, tag: str, attrs: dict[str, str] | None) -> dict[str, Any]:
+        if tag in _TELEGRAPH_BLOCK_TAGS:
+            self._last_text = None
+        if not self._stack:
+            self.marks.append(self.size)
+        node: dict[str, Any] = {'tag': tag}
+        self.size += len(tag) + 11  # {"tag":""},
+        if attrs:
+            node['attrs'] = attrs
+            self.size += 11 + sum(len(k) + len(v.encode('utf-8')) + 6 for k, v in attrs.items())
+        self._current.append(node)
+        return node
+
+    def empty(self, tag: str, attrs: dict[str, str] | None = None) -> None:
+        """Add an element without children (img, video, br, hr)."""
+        self._start(tag, attrs)
+
+    def open(self, tag: str, attrs: dict[str, str] | None = None) -> None:
+        node = self._start(tag, attrs)
+        self._stack.append(self._current)
+        self._current = node['children'] = []
+        self.size += 14  # ,"children":[]
+
+    def close(self) -> None:
+        self._current = self._stack.pop()
+        node = self._current[-1]
+        if not node['children']:
+            del node['children']
+            self.size -= 14
+
+    def element(self, tag: str, text: str, attrs: dict[str, str] | None = None) -> None:
+        """Add an element holding just *text*."""
+        self.open(tag, attrs)
+        self.text(text)
+        self.close()
+
+
+def serialize_telegraph_nodes(nodes: list[Any]) -> str:
+    """Nodes as the compact JSON the Telegraph API receives."""
+    return json.dumps(nodes, separators=(',', ':'), ensure_ascii=False)
+
+
+def paginate_telegraph_nodes(nodes: list[Any], marks: list[int], size: int, limit: int) -> list[list[Any]]:
+    """Split top-level *nodes* into pages of at most *limit* estimated bytes.
+
+    *marks* and *size* come from the :class:`TelegraphNodeBuilder` that made
+    the nodes.  Pages end before an ``<hr>`` (between comments) when there is
+    one on the page, and that ``<hr>`` is dropped.  A single node larger than
+    *limit* gets a page of its own.
+    """
+    bounds = marks + [size]
+    pages: list[list[Any]] = []
+    start = 0
+    while start < len(nodes):
+        end = start + 1
+        while end < len(nodes) and bounds[end + 1] - bounds[start] + 2 <= limit:
+            end += 1
+        if end < len(nodes):
+            cut = next((j for j in range(end, start, -1) if nodes[j] == {'tag': 'hr'}), None)
+            if cut is not None:
+                pages.append(nodes[start:cut])
+                start = cut + 1
+                continue
+        pages.append(nodes[start:end])
+        start = end
+    return pages or [[]]
+
+
+# ── Note class ─────────────────────────────────────────────────────────────────
+
+class Note:
+    __slots__ = (
+        'telegraph_account', 'live', 'xsec_token', 'quality', 'anchorCommentId', 'user', 'title', 'type',
+        'raw_desc', 'desc', 'time', 'ip_location', 'collected_count', 'comments_count', 'shared_count',
+        'liked_count', 'length', 'tags', 'tag_string', 'thumbnail', 'images_list', 'url', 'noteId',
+        'video_url', 'video_mirrors', 'video_stream', 'video_info', '_comment_data', '_comments',
+        '_comments_with_context', 'nodes', 'nodes_size', '_node_marks', 'html', 'content', 'message', 'telegraph_url',
+        'telegraph_pages', 'short_preview',
+    )
+
+    def __init__(
+            self,
+            note_data: dict[str, Any],
+            comment_list_data: dict[str, Any],
+            live: bool = False,
+            telegraph_account: Telegraph | None = None,
+            anchorCommentId: str = '',
+            xsec_token: str = '',
+            quality: str = 'balanced',
+    ) -> None:
+        self.telegraph_account = telegraph_account
+        self.live = live
+        self.xsec_token = xsec_token
+        self.quality = quality
+        self.anchorCommentId = anchorCommentId
+        if not note_data['data']:
+            raise Exception("Note data not found!")
+        data = note_data['data'][0]
+        info = data['note_list'][0]
+        user = data['user']
+        self.user: dict[str, str | int] = {
+            'id': user['id'],
+            'name': user['name'],
+            'red_id': user.get('red_id', ''),
+            'image': get_clean_url(user['image']),
+        }
+        self.title: str = info['title'] if info['title'] else ''
+        self.type: str = info['type']
+        self.raw_desc = replace_redemoji_with_emoji(info['desc'])
+        bot_logger.debug(f"Note raw_desc\n\n {self.raw_desc}")
+        self.desc = re.sub(r'(?P<tag>#\S+?)\[\S+\]#', r'\g<tag> ', self.raw_desc)
+        self.time = info['time']
+        self.ip_location = info.get('ip_location', '') or ''
+        self.collected_count = info['collected_count']
+        self.comments_count = info['comments_count']
+        self.shared_count = info['shared_count']
+        self.liked_count = info['liked_count']
+        # Comments are parsed on first access; the inline path never needs them.
+        self._comment_data: dict[str, Any] = comment_list_data['data']
+        self._comments: list[dict[str, Any]] | None = None
+        self._comments_with_context: list[dict[str, Any]] | None = None
+        self.length: int = len(self.desc + self.title)
+        self.tags: list[str] = [tag['name'] for tag in info['hash_tag']]
+        self.tag_string: str = ' '.join([f"#{tag}" for tag in self.tags])
+        self.thumbnail = info['share_info']['image']
+        self.images_list: list[dict[str, str]] = []
+        for each in info.get('images_list', ()):
+            if 'live_photo' in each and self.live:
+                bot_logger.debug(f'live photo found in {each}')
+                live_stream = select_stream(each['live_photo']['media']['stream'], quality)
+                if live_stream:
+                    self.images_list.append({
+                        'live': 'True',
+                        'url': live_stream['urls'][0],
+                        'mirrors': live_stream['urls'][1:],
+                        'thumbnail': remove_image_url_params(each['url']),
+                    })
+            original_img_url = each['original']
+            img_mirrors: list[str] = []
+            if re.findall(r'sns-na-i\d.xhscdn.com', original_img_url):
+                original_img_url = original_img_url.split('?imageView')[0] + f'?{REFERENCE_IMAGE_VIEW}&redImage/frame/0'
+                img_mirrors = [remove_image_url_params(u) for u in image_mirror_urls(original_img_url)]
+                original_img_url = img_mirrors.pop(0)
+            self.images_list.append({
+                'live': '',
+                'url': remove_image_url_params(original_img_url),
+                'mirrors': img_mirrors,
+                'thumbnail': remove_image_url_params(each['url_multi_level']['low']),
+            })
+        bot_logger.debug(f"Images found: {self.images_list}")
+        self.url = get_clean_url(info['share_info']['link'])
+        if self.xsec_token:
+            sep = '&' if '?' in self.url else '?'
+            self.url += f'{sep}xsec_token={quote(self.xsec_token)}'
+        self.noteId = re.findall(r"[a-z0-9]{24}", self.url)[0]
+        self.video_url = ''
+        self.video_mirrors: list[str] = []
+        # The rendition picked by select_stream, when the note lists its streams
+        self.video_stream: dict[str, Any] | None = None
+        # Attributes known from the note JSON, so the upload can skip ffmpeg
+        self.video_info = VideoInfo()
+        if 'video' in info:
+            video = info['video']
+            self.video_stream = select_stream((video.get('media') or {}).get('stream') or {}, quality)
+            self.video_info = video_info_from_note(video, self.video_stream)
+            if self.video_stream:
+                primary = self.video_stream['urls'][0]
+                self.video_mirrors = _dedupe(video_mirror_urls(primary) + self.video_stream['urls'][1:])
+            else:
+                self.video_mirrors = video_mirror_urls(video['url'])
+            self.video_url = self.video_mirrors.pop(0)
+
+    @property
+    def comments(self) -> list[dict[str, Any]]:
+        if self._comments is None:
+            self._comments = extract_all_comments(self._comment_data, self.quality)
+        return self._comments
+
+    @property
+    def comments_with_context(self) -> list[dict[str, Any]]:
+        if self._comments_with_context is None:
+            self._comments_with_context = []
+            if self.anchorCommentId:
+                self._comments_with_context = extract_anchor_comment_id(self._comment_data, self.quality)
+                bot_logger.debug(
+                    f"Comments with context extracted for anchorCommentId {self.anchorCommentId}:\n"
+                    f"{pformat(self._comments_with_context)}"
+                )
+        return self._comments_with_context
+
+    async def initialize(self) -> None:
+        await self.to_telegraph()
+        self.short_preview = ''
+
+    def to_dict(self) -> dict[str, str | int | Any]:
+        return {
+            'user': self.user,
+            'title': self.title,
+            'type': self.type,
+            'desc': self.desc,
+            'length': self.length,
+            'time': self.time,
+            'ip_location': self.ip_location,
+            'collected_count': self.collected_count,
+            'comments_count': self.comments_count,
+            'shared_count': self.shared_count,
+            'liked_count': self.liked_count,
+            'images_list': getattr(self, 'images_list', []),
+            'video_url': getattr(self, 'video_url', ''),
+            'url': self.url,
+        }
+
+    def media_for_llm(self) -> list[dict[str, str]]:
+        media_list: list[dict[str, str]] = []
+        for img in self.images_list:
+            if not img['live']:
+                media_list.append({'type': 'image', 'url': img['url']})
+        if self.video_url and self.thumbnail:
             media_list.append({'type': 'image', 'url': self.thumbnail})
         return media_list
 
-    def to_html(self) -> str:
-        """Build HTML for the Telegraph page (unchanged from xhsfwbot.py)."""
-        html = ''
-        html += f'<h3><a href="{self.url}">{self.title}</a></h3>' if self.title else ''
+    def to_nodes(self) -> list[Any]:
+        """Build the Telegraph page as Node JSON.
+
+        Built on first use and memoized; ``nodes_size`` holds the estimated
+        upload size.
+        """
+        if hasattr(self, 'nodes'):
+            return self.nodes
+        # Fragments shared by every line of the page, computed once.
+        token_q = quote(self.xsec_token) if self.xsec_token else ''
+        profile_suffix = f'?xsec_token={token_q}' if token_q else ''
+        comment_suffix = f'&xsec_token={token_q}' if token_q else ''
+        comment_prefix = f'https://www.xiaohongshu.com/discovery/item/{self.noteId}?anchorCommentId='
+        profile_prefix = 'https://www.xiaohongshu.com/user/profile/'
+
+        b = TelegraphNodeBuilder()
+        if self.title:
+            b.open('h3')
+            b.element('a', self.title, {'href': self.url})
+            b.close()
         for img in self.images_list:
-            if not img['live']:
-                html += f'<img src="{img["url"]}"></img>'
-            else:
-                html += f'<video src="{img["url"]}"></video>'
+            b.empty('video' if img['live'] else 'img', {'src': img['url']})
         if self.video_url:
-            html += f'<video src="{self.video_url}"></video>'
+            b.empty('video', {'src': self.video_url})
         for lines in self.desc.split('\n'):
-            line_html = tg_msg_escape_html(lines)
-            html += f'<blockquote>{line_html}</blockquote>'
-        author_profile_url = f'https://www.xiaohongshu.com/user/profile/{self.user["id"]}'
-        if self.xsec_token:
-            author_profile_url += f'?xsec_token={quote(self.xsec_token)}'
-        html += f'<h4>👤 <a href="{author_profile_url}"> @{self.user["name"]} ({self.user.get("red_id", "")})</a></h4>'
-        html += f'<img src="{self.user["image"]}"></img>'
-        html += f'<p>{get_time_emoji(self.time)} {convert_timestamp_to_timestr(self.time)}</p>'
-        html += f'<p>❤️ {self.liked_count} ⭐ {self.collected_count} 💬 {self.comments_count} 🔗 {self.shared_count}</p>'
+            b.element('blockquote', lines)
+        b.open('h4')
+        b.text('👤 ')
+        b.element('a', f' @{self.user["name"]} ({self.user.get("red_id", "")})',
+                  {'href': f'{profile_prefix}{self.user["id"]}{profile_suffix}'})
+        b.close()
+        b.empty('img', {'src': str(self.user['image'])})
+        b.element('p', _timestamp_line(self.time))
+        b.element('p', f'❤️ {self.liked_count} ⭐ {self.collected_count} 💬 {self.comments_count} 🔗 {self.shared_count}')
         if self.ip_location:
-            html += f'<p>📍 {tg_msg_escape_html(self.ip_location)}</p>'
-        html += f'<blockquote><a href="{self.url}">Source</a></blockquote>' if not self.title else ''
+            b.element('p', f'📍 {self.ip_location}')
+        if not self.title:
+            b.open('blockquote')
+            b.element('a', 'Source', {'href': self.url})
+            b.close()
+
+        def add_comment(comment: dict[str, Any], reply: bool) -> None:
+            # Replies differ from top-level comments only by the <br> before
+            # each block and the spacing around the reply arrow.
+            b.open('h4')
+            b.text('💬 ')
+            b.element('a', 'Comment', {'href': f'{comment_prefix}{comment["id"]}{comment_suffix}'})
+            b.close()
+            if 'target_comment' in comment:
+                target = comment['target_comment']['user']
+                if reply:
+                    b.empty('br')
+                b.open('p')
+                b.text('  ↪️  ' if reply else '↪️ ')
+                b.element('a', f' @{target.get("nickname", "")} ({target.get("red_id", "")})',
+                          {'href': f'{profile_prefix}{target["userid"]}{profile_suffix}'})
+                b.close()
+            if reply:
+                b.empty('br')
+            b.element('p', comment['content'])
+            for pic in comment['pictures']:
+                if reply:
+                    b.empty('br')
+                b.empty('video' if 'mp4' in pic else 'img', {'src': pic})
+            if comment.get('audio_url', ''):
+                if reply:
+                    b.empty('br')
+                b.open('p')
+                b.element('a', '🎤 Voice', {'href': comment['audio_url']})
+                b.close()
+            if reply:
+                b.empty('br')
+            b.open('p')
+            b.text(f'❤️ {comment["like_count"]} 💬 {comment["sub_comment_count"]}')
+            if comment.get('ip_location'):
+                b.empty('br')
+                b.text(f'📍 {comment["ip_location"]}')
+            b.empty('br')
+            b.text(_timestamp_line(comment['time']))
+            b.close()
+            user = comment['user']
+            if reply:
+                b.empty('br')
+            b.open('p')
+            b.text('👤 ')
+            b.element('a', f' @{user.get("nickname", "")} ({user.get("red_id", "")})',
+                      {'href': f'{profile_prefix}{user["userid"]}{profile_suffix}'})
+            b.close()
+
         if self.comments:
-            html += '<hr>'
+            b.empty('hr')
+            last = len(self.comments) - 1
             for i, comment in enumerate(self.comments):
-                comment_url = f'https://www.xiaohongshu.com/discovery/item/{self.noteId}?anchorCommentId={comment["id"]}'
-                if self.xsec_token:
-                    comment_url += f'&xsec_token={quote(self.xsec_token)}'
-                html += f'<h4>💬 <a href="{comment_url}">Comment</a></h4>'
-                if 'target_comment' in comment:
-                    tc_profile = f'https://www.xiaohongshu.com/user/profile/{comment["target_comment"]["user"]["userid"]}'
-                    if self.xsec_token:
-                        tc_profile += f'?xsec_token={quote(self.xsec_token)}'
-                    html += f'<p>↪️ <a href="{tc_profile}"> {'@' + comment["target_comment"]["user"].get("nickname", "")} ({comment["target_comment"]["user"].get('red_id', '')})</a></p>'
-                html += f'<p>{tg_msg_escape_html(replace_redemoji_with_emoji(comment["content"]))}</p>'
-                for pic in comment['pictures']:
-                    if 'mp4' in pic:
-                        html += f'<video src="{pic}"></video>'
-                    else:
-                        html += f'<img src="{pic}"></img>'
-                if comment.get('audio_url', ''):
-                    html += f'<p><a href="{comment["audio_url"]}">🎤 Voice</a></p>'
-                _c_ip = tg_msg_escape_html(comment['ip_location']) if comment.get('ip_location') else ''
-                _c_stats = f'❤️ {comment["like_count"]} 💬 {comment["sub_comment_count"]}'
-                if _c_ip:
-                    _c_stats += f'<br>📍 {_c_ip}'
-                _c_stats += f'<br>{get_time_emoji(comment["time"])} {convert_timestamp_to_timestr(comment["time"])}'
-                html += f'<p>{_c_stats}</p>'
-                cu_profile = f'https://www.xiaohongshu.com/user/profile/{comment["user"]["userid"]}'
-                if self.xsec_token:
-                    cu_profile += f'?xsec_token={quote(self.xsec_token)}'
-                html += f'<p>👤 <a href="{cu_profile}"> {'@' + comment["user"].get("nickname", "")} ({comment["user"].get("red_id", "")})</a></p>'
+                add_comment(comment, reply=False)
                 for sub_comment in comment.get('sub_comments', []):
-                    html += '<blockquote><blockquote>'
-                    sub_comment_url = f'https://www.xiaohongshu.com/discovery/item/{self.noteId}?anchorCommentId={sub_comment["id"]}'
-                    if self.xsec_token:
-                        sub_comment_url += f'&xsec_token={quote(self.xsec_token)}'
-                    html += f'<h4>💬 <a href="{sub_comment_url}">Comment</a></h4>'
-                    if 'target_comment' in sub_comment:
-                        stc_profile = f'https://www.xiaohongshu.com/user/profile/{sub_comment["target_comment"]["user"]["userid"]}'
-                        if self.xsec_token:
-                            stc_profile += f'?xsec_token={quote(self.xsec_token)}'
-                        html += f'<br><p>  ↪️  <a href="{stc_profile}"> {'@' + sub_comment["target_comment"]["user"].get("nickname", "")} ({sub_comment["target_comment"]["user"].get("red_id", "")})</a></p>'
-                    html += f'<br><p>{tg_msg_escape_html(replace_redemoji_with_emoji(sub_comment["content"]))}</p>'
-                    for pic in sub_comment['pictures']:
-                        if 'mp4' in pic:
-                            html += f'<br><video src="{pic}"></video>'
-                        else:
-                            html += f'<br><img src="{pic}"></img>'
-                    if sub_comment.get('audio_url', ''):
-                        html += f'<br><p><a href="{sub_comment["audio_url"]}">🎤 Voice</a></p>'
-                    _sc_ip = tg_msg_escape_html(sub_comment['ip_location']) if sub_comment.get('ip_location') else ''
-                    _sc_stats = f'❤️ {sub_comment["like_count"]} 💬 {sub_comment["sub_comment_count"]}'
-                    if _sc_ip:
-                        _sc_stats += f'<br>📍 {_sc_ip}'
-                    _sc_stats += f'<br>{get_time_emoji(sub_comment["time"])} {convert_timestamp_to_timestr(sub_comment["time"])}'
-                    html += f'<br><p>{_sc_stats}</p>'
-                    scu_profile = f'https://www.xiaohongshu.com/user/profile/{sub_comment["user"]["userid"]}'
-                    if self.xsec_token:
-                        scu_profile += f'?xsec_token={quote(self.xsec_token)}'
-                    html += f'<br><p>👤 <a href="{scu_profile}"> {'@' + sub_comment["user"].get("nickname", "")} ({sub_comment["user"].get("red_id", "")})</a></p>'
-                    html += '</blockquote></blockquote>'
-                if i != len(self.comments) - 1:
-                    html += '<hr>'
-        self.html = html
+                    b.open('blockquote')
+                    b.open('blockquote')
+                    add_comment(sub_comment, reply=True)
+                    b.close()
+                    b.close()
+                if i != last:
+                    b.empty('hr')
+        self.nodes = b.nodes
+        self.nodes_size = b.size
+        self._node_marks = b.marks
+        bot_logger.debug(f"Telegraph nodes generated, about {self.nodes_size} bytes")
+        return self.nodes
+
+    def to_html(self) -> str:
+        """The Telegraph page as HTML, for debugging."""
+        if hasattr(self, 'html'):
+            return self.html
+        self.html = nodes_to_html(self.to_nodes())
         bot_logger.debug(f"HTML generated, \n\n{self.html}\n\n")
         return self.html
 
     def __str__(self) -> str:
-        self.content = '笔记标题：' + self.title + '\n' + '笔记正文：' + self.desc
-        self.content += f'\n发布者：@{self.user["name"]} ({self.user.get('red_id', '')})\n'
-        self.content += f'{get_time_emoji(self.time)} {convert_timestamp_to_timestr(self.time)}\n'
-        self.content += f'点赞：{self.liked_count}收藏：{self.collected_count}评论：{self.comments_count}分享：{self.shared_count}\n'
+        if hasattr(self, 'content'):
+            return self.content
+        out: list[str] = [
+            '笔记标题：' + self.title + '\n' + '笔记正文：' + self.desc,
+            f'\n发布者：@{self.user["name"]} ({self.user.get('red_id', '')})\n',
+            f'{_timestamp_line(self.time)}\n',
+            f'点赞：{self.liked_count}收藏：{self.collected_count}评论：{self.comments_count}分享：{self.shared_count}\n',
+        ]
+        add = out.append
         if self.ip_location:
-            self.content += f'IP 地址：{tg_msg_escape_html(self.ip_location)}\n'
-        self.content += '\n评论区：\n\n'
+            add(f'IP 地址：{tg_msg_escape_html(self.ip_location)}\n')
+        add('\n评论区：\n\n')
+
+        def add_comment(comment: dict[str, Any], label: str) -> None:
+            if not comment['content']:
+                return
+            add(f'{label}\n{tg_msg_escape_html(comment["content"])}\n')
+            ip = comment.get('ip_location', '')
+            ip_line = f'\nIP 地址：{tg_msg_escape_html(ip)}' if ip else ''
+            add(f'点赞：{comment["like_count"]}{ip_line}\n{_timestamp_line(comment["time"])}\n')
+
         if self.comments:
-            self.content += '\n'
+            add('\n')
+            last = len(self.comments) - 1
             for i, comment in enumerate(self.comments):
-                if comment["content"]:
-                    self.content += '💬 评论\n'
-                    self.content += f'{tg_msg_escape_html(replace_redemoji_with_emoji(comment["content"]))}\n'
-                    _cip = comment.get('ip_location', '')
-                    _cip_line = f'\nIP 地址：{tg_msg_escape_html(_cip)}' if _cip else ''
-                    self.content += f'点赞：{comment["like_count"]}{_cip_line}\n{get_time_emoji(comment["time"])} {convert_timestamp_to_timestr(comment["time"])}\n'
+                add_comment(comment, '💬 评论')
                 for sub_comment in comment.get('sub_comments', []):
-                    if sub_comment["content"]:
-                        self.content += '💬 回复\n'
-                        self.content += f'{tg_msg_escape_html(replace_redemoji_with_emoji(sub_comment["content"]))}\n'
-                        _scip = sub_comment.get('ip_location', '')
-                        _scip_line = f'\nIP 地址：{tg_msg_escape_html(_scip)}' if _scip else ''
-                        self.content += f'点赞：{sub_comment["like_count"]}{_scip_line}\n{get_time_emoji(sub_comment["time"])} {convert_timestamp_to_timestr(sub_comment["time"])}\n'
-                if i != len(self.comments) - 1:
-                    self.content += '\n'
+                    add_comment(sub_comment, '💬 回复')
+                if i != last:
+                    add('\n')
+        self.content = ''.join(out)
         bot_logger.debug(f"String generated, \n\n{self.content}\n\n")
         return self.content
 
     async def to_telegraph(self) -> str:
-        if not hasattr(self, 'html'):
-            self.to_html()
+        """Publish the note to Telegraph and return the URL of its first page.
+
+        Notes over TELEGRAPH_PAGE_MAX_BYTES are split into pages, each
+        ending with a link to the next.  Pages are created last to first so
+        every link target exists; all URLs are kept in ``telegraph_pages``.
+        """
+        self.to_nodes()
         if not self.telegraph_account:
             self.telegraph_account = Telegraph()
             await self.telegraph_account.create_account(short_name='@xhsfwbot')  # type: ignore
-        response = await self.telegraph_account.create_page(  # type: ignore
-            title=f"{self.title} @{self.user['name']}",
-            author_name=f'@{self.user["name"]} ({self.user.get('red_id', '')})',
-            author_url=f"https://www.xiaohongshu.com/user/profile/{self.user['id']}",
-            html_content=self.html,
-        )
-        self.telegraph_url = response['url']
-        bot_logger.debug(f"Generated Telegraph URL: {self.telegraph_url}")
+        pages = paginate_telegraph_nodes(self.nodes, self._node_marks, self.nodes_size, TELEGRAPH_PAGE_MAX_BYTES - 512)
+        title = f"{self.title} @{self.user['name']}"
+        urls: list[str] = []
+        next_url = ''
+        for page_no in range(len(pages), 0, -1):
+            content = pages[page_no - 1]
+            if next_url:
+                content = content + [{'tag': 'p', 'children': [
+                    {'tag': 'a', 'attrs': {'href': next_url}, 'children': [f'➡️ Page {page_no + 1}/{len(pages)}']},
+                ]}]
+            page_title = title if page_no == 1 else f'{title} ({page_no}/{len(pages)})'
+            key = hashlib.sha1(
+                (page_title + '\0' + serialize_telegraph_nodes(content)).encode('utf-8')
+            ).hexdigest()
+            next_url = _telegraph_page_cache.get(key, '')
+            if not next_url:
+                response = await self.telegraph_account.create_page(  # type: ignore
+                    title=page_title,
+                    author_name=f'@{self.user["name"]} ({self.user.get('red_id', '')})',
+                    author_url=f"https://www.xiaohongshu.com/user/profile/{self.user['id']}",
+                    content=content,
+                )
+                next_url = response['url']
+                _telegraph_page_cache[key] = next_url
+                while len(_telegraph_page_cache) > _TELEGRAPH_PAGE_CACHE_MAX:
+                    _telegraph_page_cache.popitem(last=False)
+            _telegraph_page_cache.move_to_end(key)
+            urls.append(next_url)
+        urls.reverse()
+        self.telegraph_pages = urls
+        self.telegraph_url = urls[0]
+        bot_logger.debug(f"Generated Telegraph URL: {self.telegraph_url} ({len(urls)} pages)")
         return self.telegraph_url
 
     # ── Telethon-specific message methods ─────────────────────────────────────
@@ -992,6 +3550,7 @@ class Note:
         anchor_comment_id: str = '',
         media_range: tuple[set[int], set[int]] | None = None,
         lang: str = 'en',
+        quality: str = 'balanced',
     ) -> None:
         """Send this note to Telegram using the Telethon client."""
         sent_messages: list = []
@@ -1042,233 +3601,309 @@ class Note:
                 live_photo_urls = filtered_live_urls
                 live_photo_count = len(filtered_live_urls)
 
-        # Handle video
-        video_data: bytes | None = None
-        dl_start_time = 0.0
-        total_media = len(photo_urls) + (1 if self.video_url else 0)
-        total_media_bytes = 0  # Track total media size for AI summary eligibility
-        show_progress = progress_msg is not None or total_media > 1 or self.video_url
-        _tg_url = self.telegraph_url if hasattr(self, 'telegraph_url') else ''
-
-        # Reply to progress/summary message instead of user's original message
-        if progress_msg:
-            reply_to = progress_msg.id
-
-        # Count comment media for overall progress bar decision
-        comment_with_media_count = 0
-        comment_file_count = 0
-        if self.comments_with_context:
-            for c in self.comments_with_context:
-                cp = c['pictures']
-                if cp:
-                    n = len(cp) if include_live_videos else len([p for p in cp if 'mp4' not in p])
-                    if n > 0:
+        # Comment media downloads alongside the main media; the thread is sent last.
+        comment_media = CommentMediaPrefetcher(
+            self.comments_with_context, include_live_videos, send_as_file, quality, _progress_ctrl,
+        ) if self.comments_with_context else None
+        video_plan: VideoPlan | None = None
+        try:
+            # Handle video
+            video_data: bytes | None = None
+            dl_start_time = 0.0
+            total_media = len(photo_urls) + (1 if self.video_url else 0)
+            total_media_bytes = 0  # Track total media size for AI summary eligibility
+            show_progress = progress_msg is not None or total_media > 1 or self.video_url
+            _tg_url = self.telegraph_url if hasattr(self, 'telegraph_url') else ''
+
+            # Reply to progress/summary message instead of user's original message
+            if progress_msg:
+                reply_to = progress_msg.id
+
+            # Count comment media for overall progress bar decision
+            comment_with_media_count = 0
+            comment_file_count = 0
+            if self.comments_with_context:
+                for c in self.comments_with_context:
+                    cp = c['pictures']
+                    if cp:
+                        n = len(cp) if include_live_videos else len([p for p in cp if 'mp4' not in p])
+                        if n > 0:
+                            comment_with_media_count += 1
+                            comment_file_count += n
+                    elif c.get('audio_url', ''):
                         comment_with_media_count += 1
-                        comment_file_count += n
-                elif c.get('audio_url', ''):
-                    comment_with_media_count += 1
-                    comment_file_count += 1
-        if not show_progress and (total_media + comment_file_count) > 1:
-            show_progress = True
+                        comment_file_count += 1
+            if not show_progress and (total_media + comment_file_count) > 1:
+                show_progress = True
 
-        if self.video_url:
-            try:
-                head = requests.head(self.video_url, timeout=10)
-                total_bytes = int(head.headers.get('Content-Length', '0'))
-                size_mb = total_bytes / (1024 * 1024)
-                bot_logger.info(f"Video size: {size_mb:.2f}MB")
-
-                if show_progress:
-                    msg_text = _progress_text(_t('progress_downloading_video', lang, size_mb=f'{size_mb:.1f}'), 0)
-                    _btns = _progress_buttons(telegraph_url=_tg_url) if _progress_ctrl else None
-                    if progress_msg:
-                        try:
-                            await progress_msg.edit(msg_text, buttons=_btns)
-                        except MessageNotModifiedError:
-                            pass
-                    else:
-                        progress_msg = await bot.send_message(
-                            chat_id, msg_text,
-                            reply_to=reply_to, silent=True,
-                            buttons=_btns,
+            if self.video_url:
+                try:
+                    resp, resp_url, ttfb = await cdn_mirrors.open([self.video_url] + self.video_mirrors)
+                    total_bytes = int(resp.headers.get('Content-Length', '0') or 0)
+                    size_mb = total_bytes / (1024 * 1024)
+                    bot_logger.info(f"Video size: {size_mb:.2f}MB")
+                    if total_bytes > TELEGRAM_MAX_UPLOAD_BYTES and VIDEO_OVERSIZE_POLICY not in ('split', 'downscale'):
+                        # Nothing could be sent; don't spend the download on it.
+                        resp.close()
+                        video_plan = VideoPlan(
+                            [], 'video_too_large_skipped',
+                            size_mb=_mb(total_bytes), limit_mb=_mb(TELEGRAM_MAX_UPLOAD_BYTES),
                         )
+                        raise _VideoSkipped()
+
+                    if show_progress:
+                        msg_text = _progress_text(_t('progress_downloading_video', lang, size_mb=f'{size_mb:.1f}'), 0)
+                        _btns = _progress_buttons(telegraph_url=_tg_url) if _progress_ctrl else None
+                        if progress_msg:
+                            progress_renderer.update(progress_msg, msg_text, buttons=_btns)
+                        else:
+                            progress_msg = await bot.send_message(
+                                chat_id, msg_text,
+                                reply_to=reply_to, silent=True,
+                                buttons=_btns,
+                            )
+                            if _progress_ctrl:
+                                _progress_controls[f'{chat_id}.{progress_msg.id}'] = _progress_ctrl
+
+                    # Stream download with progress
+                    dl_start_time = time.monotonic()
+
+                    async def _video_dl_progress(downloaded: int, _total: int) -> None:
                         if _progress_ctrl:
-                            _progress_controls[f'{chat_id}.{progress_msg.id}'] = _progress_ctrl
-
-                # Stream download with progress
-                chunks: list[bytes] = []
-                downloaded = 0
-                last_update = time.monotonic()
-                dl_start_time = last_update
-                resp = requests.get(self.video_url, stream=True)
-                for chunk in resp.iter_content(chunk_size=1024 * 256):
-                    if _progress_ctrl:
-                        await _progress_ctrl.check()
-                    chunks.append(chunk)
-                    downloaded += len(chunk)
-                    now = time.monotonic()
-                    if progress_msg and total_bytes and now - last_update >= 2:
-                        last_update = now
-                        pct = downloaded / total_bytes
-                        dl_mb = downloaded / (1024 * 1024)
-                        try:
-                            await progress_msg.edit(
+                            await _progress_ctrl.check()
+                        if progress_msg and total_bytes:
+                            pct = downloaded / total_bytes
+                            dl_mb = downloaded / (1024 * 1024)
+                            progress_renderer.update(
+                                progress_msg,
                                 _progress_text(_t('progress_downloading_video', lang, size_mb=f'{size_mb:.1f}'), pct, f'{dl_mb:.1f}/{size_mb:.1f} MB', dl_start_time, transferred_bytes=downloaded),
                                 buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
                             )
-                        except MessageNotModifiedError:
-                            pass
-                video_data = b''.join(chunks)
-                total_media_bytes += len(video_data)
-                dl_elapsed = time.monotonic() - dl_start_time
 
-                if progress_msg:
-                    try:
-                        await progress_msg.edit(
-                            _t('progress_video_downloaded_uploading', lang, size_mb=f'{size_mb:.1f}', elapsed=f'{dl_elapsed:.1f}'),
-                            buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
-                        )
-                    except MessageNotModifiedError:
-                        pass
-            except Exception as e:
-                bot_logger.error(f"Failed to download video: {e}")
+                    video_data = await cdn_mirrors.read(resp, resp_url, ttfb, on_chunk=_video_dl_progress)
+                    total_media_bytes += len(video_data)
+                    dl_elapsed = time.monotonic() - dl_start_time
 
-        if video_data and send_as_file:
-            # ── Send video as document (file) ─────────────────────────────
-            async with bot.action(chat_id, 'document'):
-                try:
-                    video_io = BytesIO(video_data)
-                    video_io.name = 'video.mp4'
-                    upload_mb = len(video_data) / (1024 * 1024)
-                    ul_start_time = time.monotonic()
+                    progress_renderer.update(
+                        progress_msg,
+                        _t('progress_video_downloaded_uploading', lang, size_mb=f'{size_mb:.1f}', elapsed=f'{dl_elapsed:.1f}'),
+                        buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
+                    )
+                except _VideoSkipped:
+                    pass
+                except Exception as e:
+                    bot_logger.error(f"Failed to download video: {e}")
 
+            if video_data:
+                try:
+                    video_plan = await prepare_video(video_data, self.video_info.duration, ctrl=_progress_ctrl)
+                except _OperationCancelled:
+                    raise
+                except Exception as e:
+                    bot_logger.warning(f"Video preparation failed, sending as downloaded: {e}")
+                    video_plan = VideoPlan([video_data])
+                if not video_plan.parts:
+                    video_data = None
+            if video_plan and video_plan.decision:
+                bot_logger.info(f"Video {self.noteId}: {video_plan.describe()}")
+                if not video_plan.parts:
                     if progress_msg:
-                        try:
-                            await progress_msg.edit(
-                                _progress_text(_t('progress_uploading_file', lang, size_mb=f'{upload_mb:.1f}'), 0),
-                                buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
-                            )
-                        except MessageNotModifiedError:
-                            pass
+                        progress_renderer.update(progress_msg, video_plan.describe(lang), buttons=None)
+                    else:
+                        progress_msg = await bot.send_message(chat_id, video_plan.describe(lang), reply_to=reply_to, silent=True)
 
-                    upload_last_update = time.monotonic()
+            if video_data and video_plan and send_as_file:
+                # ── Send video as document (file) ─────────────────────────────
+                async with bot.action(chat_id, 'document'):
+                    try:
+                        upload_bytes = video_plan.size()
+                        upload_mb = upload_bytes / (1024 * 1024)
+                        ul_start_time = time.monotonic()
 
-                    async def _file_upload_progress(current: int, total: int) -> None:
-                        nonlocal upload_last_update
-                        if not progress_msg:
-                            return
-                        if _progress_ctrl and (_progress_ctrl.paused or _progress_ctrl.cancelled):
-                            return
-                        now = time.monotonic()
-                        if now - upload_last_update < 2:
-                            return
-                        upload_last_update = now
-                        pct = current / total if total else 0
-                        cur_mb = current / (1024 * 1024)
-                        tot_mb = total / (1024 * 1024)
-                        try:
-                            await progress_msg.edit(
+                        progress_renderer.update(
+                            progress_msg,
+                            _progress_text(_t('progress_uploading_file', lang, size_mb=f'{upload_mb:.1f}'), 0),
+                            buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
+                        )
+
+                        async def _file_upload_progress(current: int, total: int) -> None:
+                            if not progress_msg:
+                                return
+                            if _progress_ctrl and (_progress_ctrl.paused or _progress_ctrl.cancelled):
+                                return
+                            pct = current / total if total else 0
+                            cur_mb = current / (1024 * 1024)
+                            tot_mb = total / (1024 * 1024)
+                            progress_renderer.update(
+                                progress_msg,
                                 _progress_text(_t('progress_uploading_file', lang, size_mb=f'{tot_mb:.1f}'), pct, f'{cur_mb:.1f}/{tot_mb:.1f} MB', ul_start_time, transferred_bytes=current),
                                 buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
                             )
-                        except MessageNotModifiedError:
-                            pass
 
-                    result = await bot.send_file(
-                        chat_id, video_io,
-                        caption=caption, parse_mode='html',
-                        reply_to=reply_to, silent=True,
-                        force_document=True,
-                        progress_callback=_file_upload_progress if progress_msg else None,
-                    )
-                    sent_messages = result if isinstance(result, list) else [result]
-                    ul_elapsed = time.monotonic() - ul_start_time
+                        n_parts = len(video_plan.parts)
+                        sent_messages = []
+                        for part_no, part in enumerate(video_plan.parts, 1):
+                            video_file = await parallel_uploader.upload(
+                                bot, part, f'video_{part_no}.mp4' if n_parts > 1 else 'video.mp4',
+                                progress_callback=_file_upload_progress if progress_msg else None,
+                            )
+                            result = await bot.send_file(
+                                chat_id, video_file,
+                                caption=caption if part_no == 1 else f'{part_no}/{n_parts}', parse_mode='html',
+                                reply_to=reply_to, silent=True,
+                                force_document=True,
+                            )
+                            sent_messages.extend(result if isinstance(result, list) else [result])
+                        ul_elapsed = time.monotonic() - ul_start_time
 
-                    if progress_msg:
-                        try:
-                            _dl_spd = _speed_str(dl_elapsed, len(video_data))
-                            _ul_spd = _speed_str(ul_elapsed, len(video_data))
-                            summary = _t('summary_video_file_sent', lang, size_mb=f'{upload_mb:.1f}') + '\n'
-                            summary += _t('summary_download_time', lang, elapsed=f'{dl_elapsed:.1f}')
-                            if _dl_spd:
-                                summary += f' ({_dl_spd})'
-                            summary += '\n' + _t('summary_upload_time', lang, elapsed=f'{ul_elapsed:.1f}')
-                            if _ul_spd:
-                                summary += f' ({_ul_spd})'
-                            await progress_msg.edit(summary, buttons=None)
-                        except Exception:
-                            pass
-                except Exception as e:
-                    bot_logger.error(f"Failed to send video as file: {e}")
+                        if progress_msg:
+                            try:
+                                _dl_spd = _speed_str(dl_elapsed, len(video_data))
+                                _ul_spd = _speed_str(ul_elapsed, upload_bytes)
+                                summary = _t('summary_video_file_sent', lang, size_mb=f'{upload_mb:.1f}') + '\n'
+                                if video_plan.decision:
+                                    summary += video_plan.describe(lang) + '\n'
+                                summary += _t('summary_download_time', lang, elapsed=f'{dl_elapsed:.1f}')
+                                if _dl_spd:
+                                    summary += f' ({_dl_spd})'
+                                summary += '\n' + _t('summary_upload_time', lang, elapsed=f'{ul_elapsed:.1f}')
+                                if _ul_spd:
+                                    summary += f' ({_ul_spd})'
+                                progress_renderer.update(progress_msg, summary, buttons=None)
+                            except Exception:
+                                pass
+                    except _OperationCancelled:
+                        raise
+                    except Exception as e:
+                        bot_logger.error(f"Failed to send video as file: {e}")
 
-        elif video_data:
-            async with bot.action(chat_id, 'video'):
-                try:
-                    # Probe video dimensions and duration with ffprobe
-                    v_w, v_h, v_dur = 0, 0, 0
-                    v_codec = ''
-                    v_bitrate = 0
+            elif video_data and video_plan:
+                async with bot.action(chat_id, 'video'):
                     try:
-                        probe = subprocess.run(
-                            ['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                             '-show_streams', '-show_format', 'pipe:0'],
-                            input=video_data, capture_output=True, timeout=15,
-                        )
-                        probe_info = json.loads(probe.stdout)
-                        for s in probe_info.get('streams', []):
-                            if s.get('codec_type') == 'video':
-                                v_w = int(s.get('width', 0))
-                                v_h = int(s.get('height', 0))
-                                v_codec = s.get('codec_name', '')
-                                break
-                        fmt = probe_info.get('format', {})
-                        v_dur = int(float(fmt.get('duration', 0)))
-                        v_bitrate = int(int(fmt.get('bit_rate', 0)) / 1000)
-                    except Exception as pe:
-                        bot_logger.warning(f"ffprobe failed, sending without dimensions: {pe}")
-
-                    # Generate a thumbnail from the first frame
-                    thumb_bytes: bytes | None = None
-                    try:
-                        thumb_proc = subprocess.run(
-                            ['ffmpeg', '-i', 'pipe:0', '-vframes', '1',
-                             '-f', 'image2', '-c:v', 'mjpeg', 'pipe:1'],
-                            input=video_data, capture_output=True, timeout=15,
-                        )
-                        if thumb_proc.returncode == 0 and thumb_proc.stdout:
-                            thumb_bytes = thumb_proc.stdout
-                    except Exception as te:
-                        bot_logger.warning(f"Thumbnail extraction failed: {te}")
-
-                    video_io = BytesIO(video_data)
-                    video_io.name = 'video.mp4'
-
-                    thumb_io = None
-                    if thumb_bytes:
-                        thumb_io = BytesIO(thumb_bytes)
-                        thumb_io.name = 'thumb.jpg'
+                        # Attributes from the note JSON and the CDN cover as thumbnail;
+                        # ffmpeg only runs when either is missing, or per part once
+                        # the video has been split or re-encoded.
+                        cover_thumb = await fetch_cover_thumb(self.thumbnail) if self.thumbnail else None
+                        part_infos: list[VideoInfo] = []
+                        for part in video_plan.parts:
+                            v_info = self.video_info
+                            if video_plan.resized or not v_info.complete or not cover_thumb:
+                                v_info = await inspect_video(part, ctrl=_progress_ctrl)
+                            part_infos.append(v_info)
+                        v_w, v_h = v_info.width, v_info.height
+                        v_dur = sum(info.duration for info in part_infos)
+                        v_codec = v_info.codec or self.video_info.codec
+                        v_bitrate = v_info.bitrate or (0 if video_plan.resized else self.video_info.bitrate)
+
+                        # Upload with progress bar
+                        upload_bytes = video_plan.size()
+                        upload_mb = upload_bytes / (1024 * 1024)
+                        ul_start_time = time.monotonic()
 
-                    # Upload with progress bar
-                    upload_mb = len(video_data) / (1024 * 1024)
-                    upload_last_update = time.monotonic()
-                    ul_start_time = upload_last_update
-
-                    if progress_msg:
-                        try:
-                            await progress_msg.edit(
+                        if progress_msg:
+                            progress_renderer.update(
+                                progress_msg,
                                 _progress_text(_t('progress_uploading_video', lang, size_mb=f'{upload_mb:.1f}'), 0),
                                 buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
                             )
-                        except MessageNotModifiedError:
-                            pass
-                    elif show_progress:
-                        msg_text = _progress_text(_t('progress_uploading_video', lang, size_mb=f'{upload_mb:.1f}'), 0)
-                        _btns = _progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None
+                        elif show_progress:
+                            progress_msg = await bot.send_message(
+                                chat_id, _progress_text(_t('progress_uploading_video', lang, size_mb=f'{upload_mb:.1f}'), 0),
+                                reply_to=reply_to, silent=True,
+                                buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
+                            )
+                            if _progress_ctrl:
+                                _progress_controls[f'{chat_id}.{progress_msg.id}'] = _progress_ctrl
+
+                        async def _upload_progress(current: int, total: int) -> None:
+                            if not progress_msg:
+                                return
+                            if _progress_ctrl and (_progress_ctrl.paused or _progress_ctrl.cancelled):
+                                return
+                            pct = current / total if total else 0
+                            cur_mb = current / (1024 * 1024)
+                            tot_mb = total / (1024 * 1024)
+                            progress_renderer.update(
+                                progress_msg,
+                                _progress_text(_t('progress_uploading_video', lang, size_mb=f'{tot_mb:.1f}'), pct, f'{cur_mb:.1f}/{tot_mb:.1f} MB', ul_start_time, transferred_bytes=current),
+                                buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
+                            )
+
+                        n_parts = len(video_plan.parts)
+                        sent_messages = []
+                        for part_no, (part, info) in enumerate(zip(video_plan.parts, part_infos), 1):
+                            thumb_bytes = info.thumb if video_plan.resized else (cover_thumb or info.thumb)
+                            thumb_io = None
+                            if thumb_bytes:
+                                thumb_io = BytesIO(thumb_bytes)
+                                thumb_io.name = 'thumb.jpg'
+                            video_file = await parallel_uploader.upload(
+                                bot, part, f'video_{part_no}.mp4' if n_parts > 1 else 'video.mp4',
+                                progress_callback=_upload_progress if progress_msg else None,
+                            )
+                            result = await bot.send_file(
+                                chat_id, video_file,
+                                caption=caption if part_no == 1 else f'{part_no}/{n_parts}', parse_mode='html',
+                                reply_to=reply_to, silent=True,
+                                supports_streaming=True,
+                                thumb=thumb_io,
+                                attributes=[DocumentAttributeVideo(
+                                    duration=info.duration, w=info.width, h=info.height,
+                                    supports_streaming=True,
+                                )] if info.width and info.height else None,
+                            )
+                            sent_messages.extend(result if isinstance(result, list) else [result])
+                        ul_elapsed = time.monotonic() - ul_start_time
+
+                        # Update progress message with intermediate summary
                         if progress_msg:
                             try:
-                                await progress_msg.edit(msg_text, buttons=_btns)
-                            except MessageNotModifiedError:
+                                summary = '✅ Video sent\n'
+                                if video_plan.decision:
+                                    summary += video_plan.describe(lang) + '\n'
+                                summary += f'📦 Size: {upload_mb:.1f} MB'
+                                if v_w and v_h:
+                                    summary += f' | {v_w}×{v_h}'
+                                if v_codec:
+                                    summary += f' | {v_codec.upper()}'
+                                if v_bitrate:
+                                    summary += f' | {v_bitrate} kbps'
+                                if v_dur:
+                                    mins, secs = divmod(v_dur, 60)
+                                    summary += f'\n⏱ Duration: {mins}:{secs:02d}'
+                                _dl_spd = _speed_str(dl_elapsed, len(video_data))
+                                _ul_spd = _speed_str(ul_elapsed, upload_bytes)
+                                summary += f'\n📥 Download: {dl_elapsed:.1f}s'
+                                if _dl_spd:
+                                    summary += f' ({_dl_spd})'
+                                summary += f'\n📤 Upload: {ul_elapsed:.1f}s'
+                                if _ul_spd:
+                                    summary += f' ({_ul_spd})'
+                                progress_renderer.update(progress_msg, summary, buttons=None)
+                            except Exception:
                                 pass
+                    except _OperationCancelled:
+                        raise
+                    except Exception as e:
+                        bot_logger.error(f"Failed to send video: {e}\n{traceback.format_exc()}")
+
+            elif photo_urls or (include_live_videos and live_photo_urls):
+                # Build download list, preserving interleaved order from images_list
+                download_list: list[dict[str, Any]] = []
+                for img in self.images_list:
+                    if img['live']:
+                        if include_live_videos:
+                            download_list.append({'url': img['url'], 'mirrors': img.get('mirrors', []), 'type': 'live_video'})
+                    else:
+                        download_list.append({'url': img['url'], 'mirrors': img.get('mirrors', []), 'type': 'photo'})
+                total_download = len(download_list)
+
+                async with bot.action(chat_id, 'document' if send_as_file else 'photo'):
+                    if show_progress or total_download > 1:
+                        msg_text = _progress_text(_t('progress_downloading_n_files', lang, count=total_download), 0)
+                        _btns = _progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None
+                        if progress_msg:
+                            progress_renderer.update(progress_msg, msg_text, buttons=_btns)
                         else:
                             progress_msg = await bot.send_message(
                                 chat_id, msg_text,
@@ -1277,460 +3912,343 @@ class Note:
                             )
                             if _progress_ctrl:
                                 _progress_controls[f'{chat_id}.{progress_msg.id}'] = _progress_ctrl
-
-                    async def _upload_progress(current: int, total: int) -> None:
-                        nonlocal upload_last_update, progress_msg
+                    album_items = [
+                        {**item,
+                         'name': f'live_{idx + 1}.mp4' if item['type'] == 'live_video' else f'photo_{idx + 1}.jpg',
+                         'profile': 'document' if send_as_file else 'photo', 'quality': quality}
+                        for idx, item in enumerate(download_list)
+                    ]
+
+                    async def _album_progress(p: _AlbumProgress) -> None:
                         if not progress_msg:
                             return
-                        if _progress_ctrl and (_progress_ctrl.paused or _progress_ctrl.cancelled):
-                            return
-                        now = time.monotonic()
-                        if now - upload_last_update < 2:
-                            return
-                        upload_last_update = now
-                        pct = current / total if total else 0
-                        cur_mb = current / (1024 * 1024)
-                        tot_mb = total / (1024 * 1024)
-                        try:
-                            await progress_msg.edit(
-                                _progress_text(_t('progress_uploading_video', lang, size_mb=f'{tot_mb:.1f}'), pct, f'{cur_mb:.1f}/{tot_mb:.1f} MB', ul_start_time, transferred_bytes=current),
-                                buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
-                            )
-                        except MessageNotModifiedError:
-                            pass
+                        if p.downloading:
+                            header = _t('progress_downloading_files_n', lang, current=p.downloaded, total=p.total)
+                            detail = f'📤 {p.uploaded}/{p.total}'
+                            start, transferred = p.dl_start, p.download_bytes
+                        else:
+                            header = _t('progress_uploading_photos_n', lang, current=min(p.uploaded + 1, p.total), total=p.total)
+                            total_mb = p.download_bytes / (1024 * 1024)
+                            detail = f'{p.upload_bytes / (1024 * 1024):.1f}/{total_mb:.1f} MB'
+                            start, transferred = p.ul_start or p.dl_start, p.upload_bytes
+                        progress_renderer.update(
+                            progress_msg,
+                            _progress_text(header, p.pct, detail, start, transferred_bytes=transferred),
+                            buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
+                        )
 
-                    result = await bot.send_file(
-                        chat_id, video_io,
-                        caption=caption, parse_mode='html',
-                        reply_to=reply_to, silent=True,
-                        supports_streaming=True,
-                        thumb=thumb_io,
-                        progress_callback=_upload_progress if progress_msg else None,
-                        attributes=[DocumentAttributeVideo(
-                            duration=v_dur, w=v_w or 1280, h=v_h or 720,
-                            supports_streaming=True,
-                        )] if v_w and v_h else None,
+                    album_sent, album = await _run_album_pipeline(
+                        bot, chat_id, album_items,
+                        reply_to=reply_to, caption=caption,
+                        force_document=send_as_file,
+                        ctrl=_progress_ctrl,
+                        on_progress=_album_progress,
+                        keep_going=True,
                     )
-                    sent_messages = result if isinstance(result, list) else [result]
-                    ul_elapsed = time.monotonic() - ul_start_time
+                    sent_messages.extend(album_sent)
+                    total_media_bytes += album.download_bytes
+                    dl_elapsed = album.dl_elapsed
+                    ul_elapsed = album.ul_elapsed
 
-                    # Update progress message with intermediate summary
+                    total_size = album.download_bytes / (1024 * 1024)
                     if progress_msg:
                         try:
-                            summary = '✅ Video sent\n'
-                            summary += f'📦 Size: {upload_mb:.1f} MB'
-                            if v_w and v_h:
-                                summary += f' | {v_w}×{v_h}'
-                            if v_codec:
-                                summary += f' | {v_codec.upper()}'
-                            if v_bitrate:
-                                summary += f' | {v_bitrate} kbps'
-                            if v_dur:
-                                mins, secs = divmod(v_dur, 60)
-                                summary += f'\n⏱ Duration: {mins}:{secs:02d}'
-                            _dl_spd = _speed_str(dl_elapsed, len(video_data))
-                            _ul_spd = _speed_str(ul_elapsed, len(video_data))
-                            summary += f'\n📥 Download: {dl_elapsed:.1f}s'
+                            _dl_spd = _speed_str(dl_elapsed, album.download_bytes)
+                            _ul_spd = _speed_str(ul_elapsed, album.download_bytes)
+                            summary = _t('summary_n_files_sent', lang, count=len(download_list) - album.failed) + '\n'
+                            summary += _t('summary_total_size', lang, size_mb=f'{total_size:.1f}') + '\n'
+                            if album.failed:
+                                summary += _t('summary_files_failed', lang, count=album.failed) + '\n'
+                            summary += _t('summary_download_time', lang, elapsed=f'{dl_elapsed:.1f}')
                             if _dl_spd:
                                 summary += f' ({_dl_spd})'
-                            summary += f'\n📤 Upload: {ul_elapsed:.1f}s'
+                            summary += '\n' + _t('summary_upload_time', lang, elapsed=f'{ul_elapsed:.1f}')
                             if _ul_spd:
-                                summary += f' ({_ul_spd})'
-                            await progress_msg.edit(summary, buttons=None)
-                        except Exception:
-                            pass
-                except Exception as e:
-                    bot_logger.error(f"Failed to send video: {e}\n{traceback.format_exc()}")
-
-        elif photo_urls or (include_live_videos and live_photo_urls):
-            # Build download list, preserving interleaved order from images_list
-            download_list: list[dict[str, str]] = []
-            for img in self.images_list:
-                if img['live']:
-                    if include_live_videos:
-                        download_list.append({'url': img['url'], 'type': 'live_video'})
-                else:
-                    download_list.append({'url': img['url'], 'type': 'photo'})
-            total_download = len(download_list)
-
-            async with bot.action(chat_id, 'document' if send_as_file else 'photo'):
-                if show_progress or total_download > 1:
-                    msg_text = _progress_text(_t('progress_downloading_n_files', lang, count=total_download), 0)
-                    _btns = _progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None
-                    if progress_msg:
-                        try:
-                            await progress_msg.edit(msg_text, buttons=_btns)
-                        except MessageNotModifiedError:
-                            pass
-                    else:
-                        progress_msg = await bot.send_message(
-                            chat_id, msg_text,
-                            reply_to=reply_to, silent=True,
-                            buttons=_btns,
-                        )
-                        if _progress_ctrl:
-                            _progress_controls[f'{chat_id}.{progress_msg.id}'] = _progress_ctrl
-                dl_start_time = time.monotonic()
-                last_update = dl_start_time
-                all_files: list[BytesIO] = []
-                for idx, item in enumerate(download_list):
-                    if _progress_ctrl:
-                        await _progress_ctrl.check()
-                    resp = requests.get(item['url'])
-                    total_media_bytes += len(resp.content)
-                    bio = BytesIO(resp.content)
-                    if item['type'] == 'live_video':
-                        bio.name = f'live_{idx + 1}.mp4'
-                    else:
-                        bio.name = f'photo_{idx + 1}.jpg'
-                    all_files.append(bio)
-                    now = time.monotonic()
-                    if progress_msg and now - last_update >= 1.5:
-                        last_update = now
-                        pct = (idx + 1) / total_download
-                        try:
-                            await progress_msg.edit(
-                                _progress_text(_t('progress_downloading_files', lang), pct, f'{idx + 1}/{total_download}', dl_start_time, transferred_bytes=total_media_bytes),
-                                buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
-                            )
-                        except MessageNotModifiedError:
-                            pass
-                dl_elapsed = time.monotonic() - dl_start_time
-
-                if progress_msg:
-                    try:
-                        await progress_msg.edit(
-                            _progress_text(_t('progress_uploading_n_photos', lang, count=len(photo_urls)), 0),
-                            buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
-                        )
-                    except MessageNotModifiedError:
-                        pass
-
-                ul_start_time = time.monotonic()
-                total_upload_bytes = sum(f.getbuffer().nbytes for f in all_files)
-                total_size = total_upload_bytes / (1024 * 1024)
-                upload_last_update = ul_start_time
-                num_batches = (len(all_files) + 9) // 10
-
-                # Pre-upload each file individually (progress_callback only
-                # works for single-file uploads, not album send_file calls).
-                uploaded_files = []
-                _completed_bytes = 0
-                for fi, bio in enumerate(all_files):
-                    if _progress_ctrl:
-                        await _progress_ctrl.check()
-                    file_size = bio.getbuffer().nbytes
-                    _file_completed = _completed_bytes  # snapshot for closure
-
-                    async def _per_file_progress(current: int, total: int,
-                                                 _base=_file_completed) -> None:
-                        nonlocal upload_last_update
-                        if not progress_msg:
-                            return
-                        if _progress_ctrl and (_progress_ctrl.paused or _progress_ctrl.cancelled):
-                            return
-                        now = time.monotonic()
-                        if now - upload_last_update < 2:
-                            return
-                        upload_last_update = now
-                        overall = _base + current
-                        pct = overall / total_upload_bytes if total_upload_bytes else 0
-                        cur_mb = overall / (1024 * 1024)
-                        try:
-                            await progress_msg.edit(
-                                _progress_text(_t('progress_uploading_photos_n', lang, current=fi + 1, total=len(all_files)), pct, f'{cur_mb:.1f}/{total_size:.1f} MB', ul_start_time, transferred_bytes=overall),
-                                buttons=_progress_buttons(telegraph_url=_tg_url, lang=lang) if _progress_ctrl else None,
-                            )
-                        except MessageNotModifiedError:
+                                summary += f' ({_ul_spd})'
+                            progress_renderer.update(progress_msg, summary, buttons=None)
+                        except Exception:
                             pass
 
-                    input_file = await bot.upload_file(
-                        bio, progress_callback=_per_file_progress if progress_msg else None,
-                    )
-                    uploaded_files.append(input_file)
-                    _completed_bytes += file_size
-
-                # Send pre-uploaded files in album batches of 10
-                for i in range(0, len(uploaded_files), 10):
-                    batch = uploaded_files[i:i + 10]
-                    is_last_batch = (i + 10 >= len(uploaded_files))
-                    cap = caption if is_last_batch else None
-                    try:
-                        result = await bot.send_file(
-                            chat_id, batch,
-                            caption=cap, parse_mode='html',
-                            reply_to=reply_to, silent=True,
-                            force_document=send_as_file,
-                        )
-                        result_list = result if isinstance(result, list) else [result]
-                        sent_messages.extend(result_list)
-                    except Exception as e:
-                        bot_logger.error(f"Photo batch {i} failed ({e})\n{traceback.format_exc()}")
-                ul_elapsed = time.monotonic() - ul_start_time
-
-                total_size = sum(f.getbuffer().nbytes for f in all_files) / (1024 * 1024)
-                if progress_msg:
+            else:
+                # No media at all – text only
+                msg = await bot.send_message(
+                    chat_id, caption, parse_mode='html',
+                    reply_to=reply_to, silent=True, link_preview=False,
+                )
+                sent_messages = [msg]
+                # Clean up progress bar for text-only notes without comment media
+                if progress_msg and comment_with_media_count == 0:
                     try:
-                        total_bytes_photos = int(total_size * 1024 * 1024)
-                        _dl_spd = _speed_str(dl_elapsed, total_media_bytes)
-                        _ul_spd = _speed_str(ul_elapsed, total_bytes_photos)
-                        lv_included = sum(1 for d in download_list if d['type'] == 'live_video')
-                        summary = _t('summary_n_files_sent', lang, count=len(download_list)) + '\n'
-                        summary += _t('summary_total_size', lang, size_mb=f'{total_size:.1f}') + '\n'
-                        summary += _t('summary_download_time', lang, elapsed=f'{dl_elapsed:.1f}')
-                        if _dl_spd:
-                            summary += f' ({_dl_spd})'
-                        summary += '\n' + _t('summary_upload_time', lang, elapsed=f'{ul_elapsed:.1f}')
-                        if _ul_spd:
-                            summary += f' ({_ul_spd})'
-                        await progress_msg.edit(summary, buttons=None)
+                        await progress_msg.delete()
+                        progress_msg = None
                     except Exception:
                         pass
 
-        else:
-            # No media at all – text only
-            msg = await bot.send_message(
-                chat_id, caption, parse_mode='html',
-                reply_to=reply_to, silent=True, link_preview=False,
-            )
-            sent_messages = [msg]
-            # Clean up progress bar for text-only notes without comment media
-            if progress_msg and comment_with_media_count == 0:
-                try:
-                    await progress_msg.delete()
-                    progress_msg = None
-                except Exception:
-                    pass
-
-        if not sent_messages:
-            bot_logger.error("No message was sent!")
-            return
+            if not sent_messages:
+                bot_logger.error("No message was sent!")
+                return
 
-        # Persist message data for reactions (🤔 AI / 👨‍💻 files / 👀 live photos)
-        # Check live photos in both main note and comments
-        comment_has_live = any(
-            any('mp4' in p for p in c.get('pictures', []))
-            for c in self.comments_with_context
-        ) if self.comments_with_context else False
-        has_live_photos = live_photo_count > 0 or comment_has_live
-        try:
-            first_id = sent_messages[0].id
-            msg_identifier = f"{chat_id}.{first_id}"
-            msg_data = {
-                '_primary_id': msg_identifier,
-                'content': str(self),
-                'media': self.media_for_llm(),
-                'images_list': self.images_list,
-                'video_url': getattr(self, 'video_url', ''),
-                'noteId': self.noteId,
-                'xsec_token': self.xsec_token,
-                'anchorCommentId': anchor_comment_id,
-                'original_url': original_url,
-                'progress_msg_id': progress_msg.id if progress_msg else None,
-                'lang': lang,
-                'reactions_used': {'file': False, 'eyes': False, 'thinking': False},
-                'ai_summary': '',
-                'flags': {'send_as_file': send_as_file, 'include_live_videos': include_live_videos, 'use_xsec': use_xsec},
-                'has_live_photos': has_live_photos,
-                'has_xsec_token': has_xsec_token,
-                'total_media_bytes': total_media_bytes,
-                'has_anchor_comments': bool(self.comments_with_context),
-                'anchor_comments_sent': False,
-            }
-            botdb.save_message_state(msg_identifier, chat_id, msg_data)
-            bot_logger.debug(f"Saved message data to DB")
-
-            # Create alias files so reactions on any media-group message
-            # or the summary message resolve to the primary data file.
-            alias_ids: set[int] = set()
-            for sm in sent_messages[1:]:
-                alias_ids.add(sm.id)
-            if progress_msg:
-                alias_ids.add(progress_msg.id)
-            for aid in alias_ids:
-                alias_key = f'{chat_id}.{aid}'
-                botdb.save_message_alias(alias_key, msg_identifier)
-            bot_logger.debug(f"Created {len(alias_ids)} alias file(s) for {msg_identifier}")
-        except Exception as e:
-            bot_logger.error(f"Failed to save message data: {e}")
+            # Persist message data for reactions (🤔 AI / 👨‍💻 files / 👀 live photos)
+            # Check live photos in both main note and comments
+            comment_has_live = any(
+                any('mp4' in p for p in c.get('pictures', []))
+                for c in self.comments_with_context
+            ) if self.comments_with_context else False
+            has_live_photos = live_photo_count > 0 or comment_has_live
+            try:
+                first_id = sent_messages[0].id
+                msg_identifier = f"{chat_id}.{first_id}"
+                msg_data = {
+                    '_primary_id': msg_identifier,
+                    'content': str(self),
+                    'media': self.media_for_llm(),
+                    'images_list': self.images_list,
+                    'video_url': getattr(self, 'video_url', ''),
+                    'video_mirrors': self.video_mirrors,
+                    'noteId': self.noteId,
+                    'xsec_token': self.xsec_token,
+                    'anchorCommentId': anchor_comment_id,
+                    'original_url': original_url,
+                    'progress_msg_id': progress_msg.id if progress_msg else None,
+                    'lang': lang,
+                    'quality': quality,
+                    'reactions_used': {'file': False, 'eyes': False, 'thinking': False},
+                    'ai_summary': '',
+                    'flags': {'send_as_file': send_as_file, 'include_live_videos': include_live_videos, 'use_xsec': use_xsec},
+                    'has_live_photos': has_live_photos,
+                    'has_xsec_token': has_xsec_token,
+                    'total_media_bytes': total_media_bytes,
+                    'has_anchor_comments': bool(self.comments_with_context),
+                    'anchor_comments_sent': False,
+                }
+                botdb.save_message_state(msg_identifier, chat_id, msg_data)
+                bot_logger.debug(f"Saved message data to DB")
+
+                # Create alias files so reactions on any media-group message
+                # or the summary message resolve to the primary data file.
+                alias_ids: set[int] = set()
+                for sm in sent_messages[1:]:
+                    alias_ids.add(sm.id)
+                if progress_msg:
+                    alias_ids.add(progress_msg.id)
+                for aid in alias_ids:
+                    alias_key = f'{chat_id}.{aid}'
+                    botdb.save_message_alias(alias_key, msg_identifier)
+                bot_logger.debug(f"Created {len(alias_ids)} alias file(s) for {msg_identifier}")
+            except Exception as e:
+                bot_logger.error(f"Failed to save message data: {e}")
 
-        # Send anchor-comment thread
-        reply_id = sent_messages[0].id
-        comment_id_to_msg_id: dict[str, int] = {}
+            # Send anchor-comment thread
+            reply_id = sent_messages[0].id
 
-        if self.comments_with_context:
-            comment_media_sent = 0
-            cm_start_time = time.monotonic()
-            if comment_with_media_count > 0:
-                msg_text = _progress_text(_t('progress_sending_comment_media', lang), 0)
-                if progress_msg:
-                    try:
-                        await progress_msg.edit(msg_text)
-                    except MessageNotModifiedError:
-                        pass
-                elif show_progress:
-                    progress_msg = await bot.send_message(
-                        chat_id, msg_text,
-                        reply_to=reply_to, silent=True,
-                    )
-            for ci, comment in enumerate(self.comments_with_context):
-                comment_html = _build_comment_html(comment, self.noteId, xsec_token=self.xsec_token)
-
-                this_reply_id = reply_id
-                if 'target_comment' in comment and ci > 0:
-                    target_id = comment['target_comment']['id']
-                    if target_id in comment_id_to_msg_id:
-                        this_reply_id = comment_id_to_msg_id[target_id]
-
-                if comment['pictures']:
-                    if include_live_videos:
-                        # Include all media (photos + videos) in original order
-                        pics = comment['pictures']
-                    else:
-                        # Exclude video URLs
-                        pics = [p for p in comment['pictures'] if 'mp4' not in p]
-                    chunks = [pics[k:k + 10] for k in range(0, len(pics), 10)]
-                    async with bot.action(chat_id, 'document' if send_as_file else 'photo'):
-                        for j, chunk in enumerate(chunks):
-                            files = []
-                            for idx, url in enumerate(chunk):
-                                resp = requests.get(url)
-                                bio = BytesIO(resp.content)
-                                ext = '.mp4' if 'mp4' in url else '.jpg'
-                                bio.name = f'comment_{ci + 1}_{j + 1}_{idx + 1}{ext}'
-                                files.append(bio)
-                            cap = comment_html if j == len(chunks) - 1 else None
-                            result = await bot.send_file(
-                                chat_id, files,
-                                caption=cap, parse_mode='html',
-                                reply_to=this_reply_id, silent=True,
-                                force_document=send_as_file,
-                            )
-                            if j == len(chunks) - 1:
-                                r0 = result[0] if isinstance(result, list) else result
-                                comment_id_to_msg_id[comment['id']] = r0.id
-
-                elif comment.get('audio_url', ''):
-                    if send_as_file:
-                        # Send audio directly as file
-                        async with bot.action(chat_id, 'document'):
-                            src_audio = requests.get(comment['audio_url']).content
-                            mp3 = convert_to_mp3_pipe(src_audio)
-                            file_io = BytesIO(mp3 if mp3 else src_audio)
-                            file_io.name = f'comment_{comment.get("id", "voice")}.mp3'
-                            try:
-                                result = await bot.send_file(
-                                    chat_id, file_io,
-                                    caption=comment_html, parse_mode='html',
-                                    reply_to=this_reply_id, silent=True,
-                                    force_document=True,
-                                )
-                            except Exception as fe:
-                                bot_logger.warning(f"Audio file send failed, fallback to text-only: {fe}")
-                                result = await bot.send_message(
-                                    chat_id, comment_html,
-                                    parse_mode='html',
-                                    reply_to=this_reply_id, silent=True,
-                                    link_preview=False,
-                                )
-                            comment_id_to_msg_id[comment['id']] = result.id  # type: ignore[union-attr]
-                    else:
-                        async with bot.action(chat_id, 'record-audio'):
-                            src_audio = requests.get(comment['audio_url']).content
-                            ogg = convert_to_ogg_opus_pipe(src_audio)
-                            mp3 = convert_to_mp3_pipe(src_audio)
-                            try:
-                                voice_io = BytesIO(ogg)
-                                voice_io.name = f'comment_{comment.get("id", "voice")}.ogg'
+            if self.comments_with_context and comment_media is not None:
+                comment_media_sent = 0
+                cm_start_time = time.monotonic()
+                if comment_with_media_count > 0:
+                    msg_text = _progress_text(_t('progress_sending_comment_media', lang), 0)
+                    if progress_msg:
+                        progress_renderer.update(progress_msg, msg_text)
+                    elif show_progress:
+                        progress_msg = await bot.send_message(
+                            chat_id, msg_text,
+                            reply_to=reply_to, silent=True,
+                        )
+                # Comments form a tree through 'target_comment' (a reply to an
+                # earlier comment in the thread; anything else replies to the
+                # note).  Each comment fetches and uploads its media right away,
+                # then waits only for its parent's message; siblings under the
+                # same parent still go out in thread order.
+                comments = self.comments_with_context
+                index_by_id: dict[str, int] = {}
+                parents: list[int | None] = []
+                for ci, comment in enumerate(comments):
+                    target_id = comment['target_comment']['id'] if 'target_comment' in comment and ci > 0 else None
+                    parents.append(index_by_id.get(target_id) if target_id else None)
+                    index_by_id.setdefault(comment['id'], ci)
+                loop = asyncio.get_running_loop()
+                sent_ids: list[asyncio.Future[int | None]] = [loop.create_future() for _ in comments]
+                sibling_gate: list[asyncio.Future[int | None] | None] = []
+                last_child: dict[int | None, asyncio.Future[int | None]] = {}
+                for ci, parent in enumerate(parents):
+                    sibling_gate.append(last_child.get(parent))
+                    last_child[parent] = sent_ids[ci]
+                upload_sem = asyncio.Semaphore(ALBUM_UPLOAD_CONCURRENCY)
+
+                async def _upload(data: bytes, name: str) -> Any:
+                    async with upload_sem:
+                        return await parallel_uploader.upload(bot, data, name)
+
+                async def _upload_picture(ci: int, k: int, url: str) -> Any:
+                    content = await comment_media.picture(ci, k)
+                    ext = '.mp4' if 'mp4' in url else '.jpg'
+                    return await _upload(content, f'comment_{ci + 1}_{k // 10 + 1}_{k % 10 + 1}{ext}')
+
+                async def _turn(ci: int) -> int:
+                    """Wait for the parent's message and the previous sibling; returns the reply target."""
+                    parent = parents[ci]
+                    parent_msg_id = await sent_ids[parent] if parent is not None else None
+                    if sibling_gate[ci] is not None:
+                        await sibling_gate[ci]
+                    return parent_msg_id or reply_id
+
+                async def _send_comment(ci: int, comment: dict[str, Any]) -> None:
+                    nonlocal comment_media_sent
+                    comment_html = _build_comment_html(comment, self.noteId, xsec_token=self.xsec_token)
+                    msg_id: int | None = None
+                    had_media = False
+
+                    if comment['pictures']:
+                        pics = comment_media.pictures(comment)
+                        had_media = bool(pics)
+                        handles = await asyncio.gather(*(_upload_picture(ci, k, url) for k, url in enumerate(pics)))
+                        chunks = [handles[k:k + 10] for k in range(0, len(handles), 10)]
+                        this_reply_id = await _turn(ci)
+                        async with bot.action(chat_id, 'document' if send_as_file else 'photo'):
+                            for j, chunk in enumerate(chunks):
+                                cap = comment_html if j == len(chunks) - 1 else None
                                 result = await bot.send_file(
-                                    chat_id, voice_io,
-                                    caption=comment_html, parse_mode='html',
+                                    chat_id, chunk,
+                                    caption=cap, parse_mode='html',
                                     reply_to=this_reply_id, silent=True,
-                                    voice_note=True,
-                                    attributes=[DocumentAttributeAudio(
-                                        duration=0,
-                                        voice=True,
-                                    )],
+                                    force_document=send_as_file,
                                 )
-                            except Exception as ve:
-                                bot_logger.warning(f"Voice-note send failed, fallback to music audio: {ve}")
+                                if j == len(chunks) - 1:
+                                    r0 = result[0] if isinstance(result, list) else result
+                                    msg_id = r0.id
+
+                    elif comment.get('audio_url', ''):
+                        had_media = True
+                        if send_as_file:
+                            # Send audio directly as file
+                            mp3 = await comment_media.audio(ci)
+                            audio_file = await _upload(
+                                mp3 or await audio_transcoder.source(comment['audio_url']),
+                                f'comment_{comment.get("id", "voice")}.mp3',
+                            )
+                            this_reply_id = await _turn(ci)
+                            async with bot.action(chat_id, 'document'):
+                                try:
+                                    result = await bot.send_file(
+                                        chat_id, audio_file,
+                                        caption=comment_html, parse_mode='html',
+                                        reply_to=this_reply_id, silent=True,
+                                        force_document=True,
+                                    )
+                                except Exception as fe:
+                                    bot_logger.warning(f"Audio file send failed, fallback to text-only: {fe}")
+                                    result = await bot.send_message(
+                                        chat_id, comment_html,
+                                        parse_mode='html',
+                                        reply_to=this_reply_id, silent=True,
+                                        link_preview=False,
+                                    )
+                                msg_id = result.id  # type: ignore[union-attr]
+                        else:
+                            # MP3 is only transcoded if the voice note is refused
+                            ogg = await comment_media.audio(ci)
+                            voice_file = await _upload(ogg, f'comment_{comment.get("id", "voice")}.ogg') if ogg else None
+                            this_reply_id = await _turn(ci)
+                            async with bot.action(chat_id, 'record-audio'):
+                                mp3 = b''
                                 try:
-                                    music_io = BytesIO(mp3 if mp3 else src_audio)
-                                    music_io.name = f'comment_{comment.get("id", "voice")}.mp3'
+                                    if voice_file is None:
+                                        raise ValueError('no OGG/Opus transcode')
                                     result = await bot.send_file(
-                                        chat_id, music_io,
+                                        chat_id, voice_file,
                                         caption=comment_html, parse_mode='html',
                                         reply_to=this_reply_id, silent=True,
-                                        voice_note=False,
+                                        voice_note=True,
                                         attributes=[DocumentAttributeAudio(
                                             duration=0,
-                                            voice=False,
-                                            title='Comment Audio',
-                                            performer='xhsfwbot',
+                                            voice=True,
                                         )],
                                     )
-                                except Exception as ae:
-                                    bot_logger.warning(f"Music-audio send failed, fallback to file: {ae}")
+                                except Exception as ve:
+                                    bot_logger.warning(f"Voice-note send failed, fallback to music audio: {ve}")
                                     try:
-                                        file_io = BytesIO(mp3 if mp3 else (ogg if ogg else src_audio))
-                                        file_io.name = f'comment_{comment.get("id", "voice")}.mp3'
+                                        mp3 = await audio_transcoder.get(comment['audio_url'], 'mp3')
+                                        music_io = BytesIO(mp3 or await audio_transcoder.source(comment['audio_url']))
+                                        music_io.name = f'comment_{comment.get("id", "voice")}.mp3'
                                         result = await bot.send_file(
-                                            chat_id, file_io,
+                                            chat_id, music_io,
                                             caption=comment_html, parse_mode='html',
                                             reply_to=this_reply_id, silent=True,
-                                            force_document=True,
-                                        )
-                                    except Exception as fe:
-                                        bot_logger.warning(f"All audio send methods failed, fallback to text-only: {fe}")
-                                        result = await bot.send_message(
-                                            chat_id, comment_html,
-                                            parse_mode='html',
-                                            reply_to=this_reply_id, silent=True,
-                                            link_preview=False,
+                                            voice_note=False,
+                                            attributes=[DocumentAttributeAudio(
+                                                duration=0,
+                                                voice=False,
+                                                title='Comment Audio',
+                                                performer='xhsfwbot',
+                                            )],
                                         )
+                                    except Exception as ae:
+                                        bot_logger.warning(f"Music-audio send failed, fallback to file: {ae}")
+                                        try:
+                                            file_io = BytesIO(mp3 or ogg or await audio_transcoder.source(comment['audio_url']))
+                                            file_io.name = f'comment_{comment.get("id", "voice")}.mp3'
+                                            result = await bot.send_file(
+                                                chat_id, file_io,
+                                                caption=comment_html, parse_mode='html',
+                                                reply_to=this_reply_id, silent=True,
+                                                force_document=True,
+                                            )
+                                        except Exception as fe:
+                                            bot_logger.warning(f"All audio send methods failed, fallback to text-only: {fe}")
+                                            result = await bot.send_message(
+                                                chat_id, comment_html,
+                                                parse_mode='html',
+                                                reply_to=this_reply_id, silent=True,
+                                                link_preview=False,
+                                            )
+
+                                msg_id = result.id  # type: ignore[union-attr]
 
-                            comment_id_to_msg_id[comment['id']] = result.id  # type: ignore[union-attr]
+                    else:
+                        this_reply_id = await _turn(ci)
+                        async with bot.action(chat_id, 'typing'):
+                            result = await bot.send_message(
+                                chat_id, comment_html,
+                                parse_mode='html',
+                                reply_to=this_reply_id, silent=True,
+                                link_preview=False,
+                            )
+                            msg_id = result.id
 
-                else:
-                    async with bot.action(chat_id, 'typing'):
-                        result = await bot.send_message(
-                            chat_id, comment_html,
-                            parse_mode='html',
-                            reply_to=this_reply_id, silent=True,
-                            link_preview=False,
-                        )
-                        comment_id_to_msg_id[comment['id']] = result.id
+                    sent_ids[ci].set_result(msg_id)
 
-                # Update comment media progress
-                if progress_msg and comment_with_media_count > 0:
-                    cp = comment['pictures']
-                    if cp:
-                        n = len(cp) if include_live_videos else len([p for p in cp if 'mp4' not in p])
-                        had_media = n > 0
-                    elif comment.get('audio_url', ''):
-                        had_media = True
-                    else:
-                        had_media = False
-                    if had_media:
+                    # Update comment media progress
+                    if progress_msg and comment_with_media_count > 0 and had_media:
                         comment_media_sent += 1
                         pct = comment_media_sent / comment_with_media_count
-                        try:
-                            await progress_msg.edit(
-                                _progress_text(_t('progress_sending_comment_media', lang), pct, f'{comment_media_sent}/{comment_with_media_count}', cm_start_time)
-                            )
-                        except MessageNotModifiedError:
-                            pass
+                        progress_renderer.update(
+                            progress_msg,
+                            _progress_text(_t('progress_sending_comment_media', lang), pct, f'{comment_media_sent}/{comment_with_media_count}', cm_start_time),
+                        )
 
-            # Final progress summary for comment media
-            if progress_msg and comment_media_sent > 0:
+                comment_tasks = [asyncio.create_task(_send_comment(ci, comment)) for ci, comment in enumerate(comments)]
                 try:
-                    parts = []
-                    if total_media > 0:
-                        parts.append(f'{total_media} main')
-                    parts.append(f'{comment_media_sent} comment')
-                    await progress_msg.edit(f'✅ Done — {" + ".join(parts)} media sent')
-                except Exception:
-                    pass
+                    await asyncio.gather(*comment_tasks)
+                except BaseException:
+                    for task in comment_tasks:
+                        task.cancel()
+                    await asyncio.gather(*comment_tasks, return_exceptions=True)
+                    raise
+
+                # Final progress summary for comment media
+                if progress_msg and comment_media_sent > 0:
+                    try:
+                        parts = []
+                        if total_media > 0:
+                            parts.append(f'{total_media} main')
+                        parts.append(f'{comment_media_sent} comment')
+                        progress_renderer.update(progress_msg, f'✅ Done — {" + ".join(parts)} media sent')
+                    except Exception:
+                        pass
+        finally:
+            if comment_media:
+                comment_media.close()
+            if video_plan:
+                video_plan.close()
 
         # Mark anchor comments as sent in JSON
         anchor_comments_sent = bool(self.comments_with_context)
@@ -1747,8 +4265,10 @@ class Note:
         # ── Build final summary with footer ──────────────────────────────────
         if progress_msg:
             try:
-                # Read the current progress message text as base
-                current = (await bot.get_messages(chat_id, ids=progress_msg.id)).message or ''
+                # The progress message's current text is the base
+                await progress_renderer.flush(progress_msg)
+                state = message_states.get(chat_id, progress_msg.id)
+                current = state.text if state else progress_msg.message or ''
                 # Save base text for later reconstruction by action handlers
                 saved: dict[str, Any] = {}
                 try:
@@ -1773,9 +4293,7 @@ class Note:
                     lang=lang,
                 )
                 btns = _action_buttons(saved) if saved else None
-                await progress_msg.edit(current + footer, parse_mode='html', buttons=btns)
-            except MessageNotModifiedError:
-                pass
+                await progress_renderer.finish(progress_msg, current + footer, parse_mode='html', buttons=btns)
             except Exception as e:
                 bot_logger.debug(f"Failed to set final summary footer: {e}")
 
@@ -1800,7 +4318,7 @@ def _build_comment_html(comment: dict[str, Any], noteId: str, xsec_token: str =
     else:
         text += '\n'
 
-    text += make_block_quotation_html(replace_redemoji_with_emoji(comment['content'])) + '\n'
+    text += make_block_quotation_html(comment['content']) + '\n'
 
     nick = tg_msg_escape_html(comment['user'].get('nickname', ''))
     red_id = tg_msg_escape_html(comment['user'].get('red_id', ''))
@@ -1913,7 +4431,8 @@ async def _run_ai_summary(
         try:
             base_text = data.get('summary_base_text', '')
             if not base_text:
-                msg = await bot.get_messages(chat_id, ids=progress_msg_id)
+                state = message_states.get(chat_id, progress_msg_id)
+                msg = state.msg if state else await bot.get_messages(chat_id, ids=progress_msg_id)
                 if not msg or not msg.message:
                     return
                 text = msg.message
@@ -1978,7 +4497,7 @@ async def _run_ai_summary(
 
         for media in media_data:
             if media.get('type') == 'image' and 'url' in media:
-                media_bytes = requests.get(media['url']).content
+                media_bytes = await fetch_image(media['url'], profile='ai', quality=data.get('quality', 'balanced'))
                 compressed = _compress_image_for_llm(media_bytes)
                 contents.append(genai_types.Part.from_bytes(data=compressed, mime_type='image/jpeg'))
 
@@ -2053,7 +4572,7 @@ def run_telegram_bot() -> None:
         except ImportError:
             bot_logger.warning("PySocks not installed — proxy ignored. Install with: pip install PySocks")
 
-    bot = TelegramClient('xhsfwbot_telethon', api_id, api_hash, proxy=proxy)
+    bot = ScheduledTelegramClient('xhsfwbot_telethon', api_id, api_hash, proxy=proxy)
 
     # Telegraph account (shared, re-created if needed)
     telegraph_account = Telegraph()
@@ -2337,6 +4856,31 @@ def run_telegram_bot() -> None:
             await gen_msg.delete()
         raise events.StopPropagation
 
+    # ── /stats ─────────────────────────────────────────────────────────────────
+
+    @bot.on(events.NewMessage(pattern=r'^/stats(@\w+)?(\s|$)'))
+    async def stats_handler(event: events.NewMessage.Event) -> None:
+        if not admin_id or event.sender_id != admin_id:
+            raise events.StopPropagation
+        sections = [
+            ('🌐 CDN mirrors', cdn_mirrors.summary_lines()),
+            ('📶 Bandwidth', download_bandwidth.summary_lines() + upload_bandwidth.summary_lines()),
+            ('✏️ Progress edits', progress_renderer.summary_lines()),
+            ('📨 Outbound requests', outbound.summary_lines()),
+            ('🗂 Message state', message_states.summary_lines()),
+            ('🔎 Inline queries', inline_answers.summary_lines()),
+            ('🖼 Image renditions', rendition_stats.summary_lines()),
+            ('🎬 Media tools', media_tools.summary_lines() + [
+                f"video info cache: {video_info_cache_stats['hits']} hits, {video_info_cache_stats['misses']} misses",
+            ] + audio_transcoder.summary_lines()),
+        ]
+        text = '\n\n'.join(
+            f'<b>{title}</b>\n<pre>{tg_msg_escape_html(chr(10).join(lines))}</pre>'
+            for title, lines in sections
+        )
+        await event.respond(text, parse_mode='html')
+        raise events.StopPropagation
+
     async def _update_summary_msg(
         bot_client: TelegramClient, chat_id: int,
         data: dict[str, Any], msg_file_path: str,  # msg_file_path kept for API compat
@@ -2388,6 +4932,11 @@ def run_telegram_bot() -> None:
 
     # ── Settings helpers ─────────────────────────────────────────────────────
 
+    def _next_quality(current: str) -> str:
+        """Cycle saver → balanced → original → saver."""
+        idx = QUALITY_LEVELS.index(current) if current in QUALITY_LEVELS else 0
+        return QUALITY_LEVELS[(idx + 1) % len(QUALITY_LEVELS)]
+
     def _settings_text_and_buttons(user_id: int) -> tuple[str, list[list[Button]]]:
         """Build settings message text and inline keyboard for a user."""
         prefs = botdb.get_user_prefs(user_id)
@@ -2401,6 +4950,7 @@ def run_telegram_bot() -> None:
         text_parts.append(f"{_t('settings_include_live', lang)}：{on if prefs['include_live'] else off}")
         text_parts.append(f"{_t('settings_use_xsec', lang)}：{on if prefs['use_xsec'] else off}")
         text_parts.append(f"{_t('settings_delete_original', lang)}：{on if not prefs['keep_original'] else off}")
+        text_parts.append(f"{_t('settings_quality', lang)}：{_t('quality_' + prefs['quality'], lang)}")
 
         file_label = f"📁 {'✅' if prefs['send_as_file'] else '❌'}"
         live_label = f"📸 {'✅' if prefs['include_live'] else '❌'}"
@@ -2413,7 +4963,10 @@ def run_telegram_bot() -> None:
                 Button.inline(live_label, b'set_toggle:pref_include_live'),
                 Button.inline(xsec_label, b'set_toggle:pref_use_xsec'),
             ],
-            [Button.inline(del_label, b'set_toggle:pref_keep_original')],
+            [
+                Button.inline(del_label, b'set_toggle:pref_keep_original'),
+                Button.inline(f"🎚 {_t('quality_' + prefs['quality'], lang)}", b'set_quality'),
+            ],
             [Button.inline(f"🌐 {SUPPORTED_LANGUAGES.get(lang, lang)}", b'set_lang_menu')],
         ]
         return '\n'.join(text_parts), buttons
@@ -2431,6 +4984,7 @@ def run_telegram_bot() -> None:
         text_parts.append(f"{_t('settings_include_live', lang)}：{on if prefs['include_live'] else off}")
         text_parts.append(f"{_t('settings_use_xsec', lang)}：{on if prefs['use_xsec'] else off}")
         text_parts.append(f"{_t('settings_delete_original', lang)}：{on if not prefs['keep_original'] else off}")
+        text_parts.append(f"{_t('settings_quality', lang)}：{_t('quality_' + prefs['quality'], lang)}")
 
         file_label = f"📁 {'✅' if prefs['send_as_file'] else '❌'}"
         live_label = f"📸 {'✅' if prefs['include_live'] else '❌'}"
@@ -2443,7 +4997,10 @@ def run_telegram_bot() -> None:
                 Button.inline(live_label, b'set_grp_toggle:pref_include_live'),
                 Button.inline(xsec_label, b'set_grp_toggle:pref_use_xsec'),
             ],
-            [Button.inline(del_label, b'set_grp_toggle:pref_keep_original')],
+            [
+                Button.inline(del_label, b'set_grp_toggle:pref_keep_original'),
+                Button.inline(f"🎚 {_t('quality_' + prefs['quality'], lang)}", b'set_grp_quality'),
+            ],
             [Button.inline(f"🌐 {SUPPORTED_LANGUAGES.get(glang, glang)}", b'set_grp_lang_menu')],
         ]
         return '\n'.join(text_parts), buttons
@@ -2528,6 +5085,13 @@ def run_telegram_bot() -> None:
             await event.answer(_t('settings_saved', lang))
             return
 
+        if data_str == 'set_quality':
+            botdb.set_user_pref(user_id, 'pref_quality', _next_quality(botdb.get_user_prefs(user_id)['quality']))
+            text, buttons = _settings_text_and_buttons(user_id)
+            await event.edit(text, buttons=buttons, parse_mode='html')
+            await event.answer(_t('settings_saved', lang))
+            return
+
         if data_str == 'set_back':
             text, buttons = _settings_text_and_buttons(user_id)
             await event.edit(text, buttons=buttons, parse_mode='html')
@@ -2577,6 +5141,13 @@ def run_telegram_bot() -> None:
             await event.answer(_t('settings_saved', lang))
             return
 
+        if data_str == 'set_grp_quality':
+            botdb.set_group_pref(event.chat_id, 'pref_quality', _next_quality(botdb.get_group_prefs(event.chat_id)['quality']))
+            text, buttons = _group_settings_text_and_buttons(event.chat_id, lang)
+            await event.edit(text, buttons=buttons, parse_mode='html')
+            await event.answer(_t('settings_saved', lang))
+            return
+
         if data_str == 'set_grp_back':
             text, buttons = _group_settings_text_and_buttons(event.chat_id, lang)
             await event.edit(text, buttons=buttons, parse_mode='html')
@@ -2603,7 +5174,8 @@ def run_telegram_bot() -> None:
                 await event.answer('⏸ Paused')
                 _pause_lang = botdb.get_user_lang(event.sender_id or 0)
                 try:
-                    msg = await bot.get_messages(chat_id, ids=msg_id)
+                    state = message_states.get(chat_id, msg_id)
+                    msg = state.msg if state else await bot.get_messages(chat_id, ids=msg_id)
                     if msg and msg.message:
                         lines = msg.message.split('\n')
                         pct_val = 0.0
@@ -2613,7 +5185,8 @@ def run_telegram_bot() -> None:
                                 total_w = filled + ln.count('░')
                                 pct_val = filled / total_w if total_w else 0
                                 break
-                        await msg.edit(
+                        await progress_renderer.finish(
+                            msg,
                             _progress_text('', pct_val, paused=True, lang=_pause_lang),
                             buttons=_progress_buttons(paused=True, lang=_pause_lang),
                         )
@@ -2666,9 +5239,17 @@ def run_telegram_bot() -> None:
         # Update buttons immediately (remove the clicked action)
         btns = _action_buttons(note_data)
         try:
-            cur_msg = await bot.get_messages(chat_id, ids=msg_id)
-            if cur_msg:
-                await cur_msg.edit(cur_msg.message, buttons=btns, parse_mode='html')
+            state = message_states.get(chat_id, msg_id)
+            if state:
+                await bot.edit_message(
+                    chat_id, msg_id, state.text,
+                    formatting_entities=state.entities, buttons=btns,
+                    link_preview=bool(state.msg.web_preview),
+                )
+            else:
+                cur_msg = await bot.get_messages(chat_id, ids=msg_id)
+                if cur_msg:
+                    await cur_msg.edit(cur_msg.message, buttons=btns, parse_mode='html')
         except MessageNotModifiedError:
             pass
         except Exception:
@@ -2687,6 +5268,32 @@ def run_telegram_bot() -> None:
         finally:
             _action_busy.discard(primary_id)
 
+    # ── Action: shared album progress ─────────────────────────────────────────
+
+    def _action_album_progress(act_prog: Any, lang: str, dl_key: str, ul_key: str) -> Any:
+        """Build an album-pipeline progress callback that renders into *act_prog*."""
+        async def _on_progress(p: _AlbumProgress) -> None:
+            dl_mb = p.download_bytes / (1024 * 1024)
+            if p.downloading:
+                text = _progress_text(
+                    _t(dl_key, lang, current=p.downloaded, total=p.total),
+                    p.pct, f'{dl_mb:.1f} MB · 📤 {p.uploaded}/{p.total}', p.dl_start,
+                    transferred_bytes=p.download_bytes,
+                )
+            else:
+                dl_summary = _t('summary_download_time', lang, elapsed=f'{p.dl_elapsed:.1f}')
+                _dl_spd = _speed_str(p.dl_elapsed, p.download_bytes)
+                if _dl_spd:
+                    dl_summary += f' ({_dl_spd})'
+                cur_mb = p.upload_bytes / (1024 * 1024)
+                text = f'{dl_summary}\n' + _progress_text(
+                    _t(ul_key, lang, count=p.total, size_mb=f'{dl_mb:.1f}'),
+                    p.pct, f'{cur_mb:.1f}/{dl_mb:.1f} MB', p.ul_start or p.dl_start,
+                    transferred_bytes=p.upload_bytes,
+                )
+            progress_renderer.update(act_prog, text, buttons=_progress_buttons(lang=lang))
+        return _on_progress
+
     # ── Action: resend media as files ─────────────────────────────────────────
 
     async def _handle_files_action(
@@ -2697,21 +5304,24 @@ def run_telegram_bot() -> None:
         video_url = data.get('video_url', '')
 
         is_video_note = bool(video_url)
-        all_urls: list[dict[str, str]] = []
+        all_urls: list[dict[str, Any]] = []
         photo_num = 0
-        pending_live: dict[str, str] | None = None
+        pending_live: dict[str, Any] | None = None
         for img in images_list:
             if img.get('live'):
-                pending_live = {'url': img['url']}
+                pending_live = {'url': img['url'], 'mirrors': img.get('mirrors', [])}
             else:
                 photo_num += 1
                 name = 'cover.jpg' if is_video_note else f'photo_{photo_num}.jpg'
-                all_urls.append({'url': img['url'], 'name': name})
+                all_urls.append({
+                    'url': img['url'], 'mirrors': img.get('mirrors', []), 'name': name,
+                    'profile': 'document', 'quality': data.get('quality', 'balanced'),
+                })
                 if pending_live:
-                    all_urls.append({'url': pending_live['url'], 'name': f'live_{photo_num}.mp4'})
+                    all_urls.append({**pending_live, 'name': f'live_{photo_num}.mp4'})
                     pending_live = None
         if video_url:
-            all_urls.append({'url': video_url, 'name': 'video.mp4'})
+            all_urls.append({'url': video_url, 'mirrors': data.get('video_mirrors', []), 'name': 'video.mp4'})
 
         if not all_urls:
             bot_logger.debug("No media URLs found for files action")
@@ -2732,94 +5342,17 @@ def run_telegram_bot() -> None:
         _progress_controls[ctrl_key] = ctrl
 
         try:
-            all_files: list[BytesIO] = []
-            total_bytes = 0
-            dl_start = time.monotonic()
-            dl_last_edit = time.monotonic()
-            for idx, item in enumerate(all_urls):
-                await ctrl.check()
-                resp = requests.get(item['url'])
-                bio = BytesIO(resp.content)
-                bio.name = item['name']
-                all_files.append(bio)
-                total_bytes += len(resp.content)
-
-                now = time.monotonic()
-                if now - dl_last_edit >= 2 or idx == total - 1:
-                    dl_last_edit = now
-                    pct = (idx + 1) / total
-                    dl_mb = total_bytes / (1024 * 1024)
-                    try:
-                        await act_prog.edit(
-                            _progress_text(_t('progress_downloading_files_n', lang, current=idx+1, total=total),
-                                           pct, f'{dl_mb:.1f} MB', dl_start,
-                                           transferred_bytes=total_bytes),
-                            buttons=_progress_buttons(lang=lang),
-                        )
-                    except MessageNotModifiedError:
-                        pass
-
-            dl_elapsed = time.monotonic() - dl_start
-            total_mb = total_bytes / (1024 * 1024)
+            sent, album = await _run_album_pipeline(
+                bot, chat_id, all_urls,
+                reply_to=prog_msg_id, force_document=True, ctrl=ctrl,
+                on_progress=_action_album_progress(
+                    act_prog, lang, 'progress_downloading_files_n', 'progress_uploading_files_size',
+                ),
+            )
+            total_bytes = album.download_bytes
+            dl_elapsed = album.dl_elapsed
+            ul_elapsed = album.ul_elapsed
             _dl_spd = _speed_str(dl_elapsed, total_bytes)
-            dl_summary = _t('summary_download_time', lang, elapsed=f'{dl_elapsed:.1f}')
-            if _dl_spd:
-                dl_summary += f' ({_dl_spd})'
-            try:
-                await act_prog.edit(
-                    f'{dl_summary}\n' + _progress_text(_t('progress_uploading_files_size', lang, count=total, size_mb=f'{total_mb:.1f}'), 0),
-                    buttons=_progress_buttons(lang=lang),
-                )
-            except MessageNotModifiedError:
-                pass
-
-            ul_start = time.monotonic()
-            ul_last_edit = time.monotonic()
-            uploaded_files = []
-            _completed_bytes = 0
-            for fi, bio in enumerate(all_files):
-                await ctrl.check()
-                file_size = bio.getbuffer().nbytes
-                _file_completed = _completed_bytes
-
-                async def _file_up_progress(current: int, total_up: int,
-                                            _base=_file_completed) -> None:
-                    nonlocal ul_last_edit
-                    if ctrl.paused or ctrl.cancelled:
-                        return
-                    now = time.monotonic()
-                    if now - ul_last_edit < 2:
-                        return
-                    ul_last_edit = now
-                    overall = _base + current
-                    overall_pct = overall / total_bytes if total_bytes else 0
-                    cur_mb = overall / (1024 * 1024)
-                    try:
-                        await act_prog.edit(
-                            f'{dl_summary}\n' + _progress_text(
-                                _t('progress_uploading_files_size', lang, count=total, size_mb=f'{total_mb:.1f}'),
-                                overall_pct, f'{cur_mb:.1f}/{total_mb:.1f} MB',
-                                ul_start, transferred_bytes=overall),
-                            buttons=_progress_buttons(lang=lang),
-                        )
-                    except MessageNotModifiedError:
-                        pass
-
-                input_file = await bot.upload_file(
-                    bio, progress_callback=_file_up_progress,
-                )
-                uploaded_files.append(input_file)
-                _completed_bytes += file_size
-
-            for i in range(0, len(uploaded_files), 10):
-                batch = uploaded_files[i:i + 10]
-                await bot.send_file(
-                    chat_id, batch,
-                    reply_to=prog_msg_id, silent=True,
-                    force_document=True,
-                )
-
-            ul_elapsed = time.monotonic() - ul_start
             _ul_spd = _speed_str(ul_elapsed, total_bytes)
 
             # Build transfer summary for the main summary message
@@ -2831,8 +5364,9 @@ def run_telegram_bot() -> None:
                 _parts[1] += f' ({_ul_spd})'
             data['files_transfer_summary'] = '\n'.join(_parts)
 
-            bot_logger.info(f"Sent {len(all_files)} file(s) via Files action")
+            bot_logger.info(f"Sent {len(sent)} file(s) via Files action")
             botdb.update_message_state(data.get('_primary_id', ''), data)
+            progress_renderer.discard(act_prog)
             try:
                 await act_prog.delete()
             except Exception:
@@ -2843,6 +5377,7 @@ def run_telegram_bot() -> None:
             bot_logger.info("Files action cancelled")
             data.setdefault('reactions_used', {})['file'] = 'cancelled'
             botdb.update_message_state(data.get('_primary_id', ''), data)
+            progress_renderer.discard(act_prog)
             try:
                 await act_prog.delete()
             except Exception:
@@ -2850,6 +5385,7 @@ def run_telegram_bot() -> None:
             await _restore_summary(bot, chat_id, prog_msg_id, data)
         except Exception as e:
             bot_logger.error(f"Failed to send files: {e}\n{traceback.format_exc()}")
+            progress_renderer.discard(act_prog)
             try:
                 await act_prog.delete()
             except Exception:
@@ -2866,17 +5402,21 @@ def run_telegram_bot() -> None:
     ) -> None:
         images_list = data.get('images_list', [])
 
-        live_items: list[dict[str, str]] = []
+        live_items: list[dict[str, Any]] = []
         photo_num = 0
-        pending_live_url: str | None = None
+        pending_live: dict[str, Any] | None = None
         for img in images_list:
             if img.get('live'):
-                pending_live_url = img['url']
+                pending_live = img
             else:
                 photo_num += 1
-                if pending_live_url:
-                    live_items.append({'url': pending_live_url, 'name': f'live_{photo_num}.mp4'})
-                    pending_live_url = None
+                if pending_live:
+                    live_items.append({
+                        'url': pending_live['url'],
+                        'mirrors': pending_live.get('mirrors', []),
+                        'name': f'live_{photo_num}.mp4',
+                    })
+                    pending_live = None
 
         if not live_items:
             bot_logger.debug("No live photo URLs found for live action")
@@ -2897,96 +5437,21 @@ def run_telegram_bot() -> None:
         _progress_controls[ctrl_key] = ctrl
 
         try:
-            live_files: list[BytesIO] = []
-            total_bytes = 0
-            dl_start = time.monotonic()
-            dl_last_edit = time.monotonic()
-            for idx, item in enumerate(live_items):
-                await ctrl.check()
-                resp = requests.get(item['url'])
-                bio = BytesIO(resp.content)
-                bio.name = item['name']
-                live_files.append(bio)
-                total_bytes += len(resp.content)
-
-                now = time.monotonic()
-                if now - dl_last_edit >= 2 or idx == total - 1:
-                    dl_last_edit = now
-                    pct = (idx + 1) / total
-                    dl_mb = total_bytes / (1024 * 1024)
-                    try:
-                        await act_prog.edit(
-                            _progress_text(_t('progress_downloading_live_n', lang, current=idx+1, total=total),
-                                           pct, f'{dl_mb:.1f} MB', dl_start,
-                                           transferred_bytes=total_bytes),
-                            buttons=_progress_buttons(lang=lang),
-                        )
-                    except MessageNotModifiedError:
-                        pass
-
-            dl_elapsed = time.monotonic() - dl_start
-            total_mb = total_bytes / (1024 * 1024)
+            sent, album = await _run_album_pipeline(
+                bot, chat_id, live_items,
+                reply_to=prog_msg_id, ctrl=ctrl,
+                on_progress=_action_album_progress(
+                    act_prog, lang, 'progress_downloading_live_n', 'progress_uploading_live_size',
+                ),
+            )
+            total_bytes = album.download_bytes
+            dl_elapsed = album.dl_elapsed
             _dl_spd = _speed_str(dl_elapsed, total_bytes)
-            dl_summary = _t('summary_download_time', lang, elapsed=f'{dl_elapsed:.1f}')
-            if _dl_spd:
-                dl_summary += f' ({_dl_spd})'
-            try:
-                await act_prog.edit(
-                    f'{dl_summary}\n' + _progress_text(_t('progress_uploading_live_size', lang, count=total, size_mb=f'{total_mb:.1f}'), 0),
-                    buttons=_progress_buttons(lang=lang),
-                )
-            except MessageNotModifiedError:
-                pass
-
-            ul_start = time.monotonic()
-            ul_last_edit = time.monotonic()
-            uploaded_files = []
-            _completed_bytes = 0
-            for fi, bio in enumerate(live_files):
-                await ctrl.check()
-                file_size = bio.getbuffer().nbytes
-                _file_completed = _completed_bytes
-
-                async def _live_up_progress(current: int, total_up: int,
-                                            _base=_file_completed) -> None:
-                    nonlocal ul_last_edit
-                    if ctrl.paused or ctrl.cancelled:
-                        return
-                    now = time.monotonic()
-                    if now - ul_last_edit < 2:
-                        return
-                    ul_last_edit = now
-                    overall = _base + current
-                    overall_pct = overall / total_bytes if total_bytes else 0
-                    cur_mb = overall / (1024 * 1024)
-                    try:
-                        await act_prog.edit(
-                            f'{dl_summary}\n' + _progress_text(
-                                _t('progress_uploading_live_size', lang, count=total, size_mb=f'{total_mb:.1f}'),
-                                overall_pct, f'{cur_mb:.1f}/{total_mb:.1f} MB',
-                                ul_start, transferred_bytes=overall),
-                            buttons=_progress_buttons(lang=lang),
-                        )
-                    except MessageNotModifiedError:
-                        pass
-
-                input_file = await bot.upload_file(
-                    bio, progress_callback=_live_up_progress,
-                )
-                uploaded_files.append(input_file)
-                _completed_bytes += file_size
-
-            for i in range(0, len(uploaded_files), 10):
-                batch = uploaded_files[i:i + 10]
-                await bot.send_file(
-                    chat_id, batch,
-                    reply_to=prog_msg_id, silent=True,
-                )
 
-            bot_logger.info(f"Sent {len(live_files)} live photo(s) via Live Photos action")
+            bot_logger.info(f"Sent {len(sent)} live photo(s) via Live Photos action")
 
             # Build transfer summary for the main summary message
-            ul_elapsed = time.monotonic() - ul_start
+            ul_elapsed = album.ul_elapsed
             _ul_spd = _speed_str(ul_elapsed, total_bytes)
             _parts = [_t('summary_download_time', lang, elapsed=f'{dl_elapsed:.1f}')]
             if _dl_spd:
@@ -2997,6 +5462,7 @@ def run_telegram_bot() -> None:
             data['live_transfer_summary'] = '\n'.join(_parts)
 
             botdb.update_message_state(data.get('_primary_id', ''), data)
+            progress_renderer.discard(act_prog)
             try:
                 await act_prog.delete()
             except Exception:
@@ -3007,6 +5473,7 @@ def run_telegram_bot() -> None:
             bot_logger.info("Live photos action cancelled")
             data.setdefault('reactions_used', {})['eyes'] = 'cancelled'
             botdb.update_message_state(data.get('_primary_id', ''), data)
+            progress_renderer.discard(act_prog)
             try:
                 await act_prog.delete()
             except Exception:
@@ -3014,6 +5481,7 @@ def run_telegram_bot() -> None:
             await _restore_summary(bot, chat_id, prog_msg_id, data)
         except Exception as e:
             bot_logger.error(f"Failed to send live photos: {e}\n{traceback.format_exc()}")
+            progress_renderer.discard(act_prog)
             try:
                 await act_prog.delete()
             except Exception:
@@ -3056,12 +5524,14 @@ def run_telegram_bot() -> None:
                 'include_live': group_prefs['include_live'],
                 'use_xsec': group_prefs['use_xsec'],
                 'keep_original': group_prefs['keep_original'],
+                'quality': group_prefs['quality'],
             }}
 
         # event.text already returns the caption for photo/video messages in Telethon
         message_text = event.text or ''
 
-        if 'xhslink.com' not in message_text and 'xiaohongshu.com' not in message_text and not event.message.photo:
+        lowered = message_text.lower()
+        if 'xhslink.com' not in lowered and 'xiaohongshu.com' not in lowered and not event.message.photo:
             return
 
         # QR code decoding from photo
@@ -3075,7 +5545,8 @@ def run_telegram_bot() -> None:
                         qr_data = obj.data.decode('utf-8')
                         bot_logger.info(f"QR Code detected: {qr_data}")
                         # Only act on QR codes that contain an XHS link
-                        if 'xhslink.com' in qr_data or 'xiaohongshu.com' in qr_data:
+                        lowered_qr = qr_data.lower()
+                        if 'xhslink.com' in lowered_qr or 'xiaohongshu.com' in lowered_qr:
                             message_text += f' {qr_data} '
                         else:
                             bot_logger.debug(f"QR Code ignored (no XHS link): {qr_data}")
@@ -3176,6 +5647,7 @@ def run_telegram_bot() -> None:
                 telegraph_account=telegraph_account,
                 anchorCommentId=anchorCommentId,
                 xsec_token=xsec_token if use_xsec else '',
+                quality=user_prefs['quality'],
             )
             await note.initialize()
 
@@ -3236,38 +5708,36 @@ def run_telegram_bot() -> None:
 
                 tg_elapsed = time.monotonic() - tg_start
                 _tg_url = note.telegraph_url if hasattr(note, 'telegraph_url') else ''
-                try:
-                    await progress_msg.edit(
-                        _t('progress_telegraph_done', user_lang, elapsed=f'{tg_elapsed:.1f}') + '\n' + _t('progress_preparing_msg', user_lang),
-                        buttons=_progress_buttons(telegraph_url=_tg_url, lang=user_lang),
-                    )
-                except MessageNotModifiedError:
-                    pass
+                progress_renderer.update(
+                    progress_msg,
+                    _t('progress_telegraph_done', user_lang, elapsed=f'{tg_elapsed:.1f}') + '\n' + _t('progress_preparing_msg', user_lang),
+                    buttons=_progress_buttons(telegraph_url=_tg_url, lang=user_lang),
+                )
 
                 await note.to_telethon_message(preview=False)
 
-                try:
-                    await progress_msg.edit(
-                        _t('progress_telegraph_done', user_lang, elapsed=f'{tg_elapsed:.1f}') + '\n' + _t('progress_sending_media', user_lang),
-                        buttons=_progress_buttons(telegraph_url=_tg_url, lang=user_lang),
-                    )
-                except MessageNotModifiedError:
-                    pass
-
-                await note.send_as_telethon_message(
-                    bot, chat_id, reply_to=msg_id,
-                    send_as_file=send_as_file,
-                    include_live_videos=include_live_videos,
-                    progress_msg=progress_msg,
-                    use_xsec=use_xsec,
-                    has_xsec_token=bool(xsec_token),
-                    _progress_ctrl=_prog_ctrl,
-                    original_url=_original_url,
-                    anchor_comment_id=anchorCommentId,
-                    media_range=media_range,
-                    lang=user_lang,
+                progress_renderer.update(
+                    progress_msg,
+                    _t('progress_telegraph_done', user_lang, elapsed=f'{tg_elapsed:.1f}') + '\n' + _t('progress_sending_media', user_lang),
+                    buttons=_progress_buttons(telegraph_url=_tg_url, lang=user_lang),
                 )
 
+                with _bandwidth_job(_prog_ctrl):
+                    await note.send_as_telethon_message(
+                        bot, chat_id, reply_to=msg_id,
+                        send_as_file=send_as_file,
+                        include_live_videos=include_live_videos,
+                        progress_msg=progress_msg,
+                        use_xsec=use_xsec,
+                        has_xsec_token=bool(xsec_token),
+                        _progress_ctrl=_prog_ctrl,
+                        original_url=_original_url,
+                        anchor_comment_id=anchorCommentId,
+                        media_range=media_range,
+                        lang=user_lang,
+                        quality=user_prefs['quality'],
+                    )
+
                 # Delete user's original message
                 if not user_prefs.get('keep_original'):
                     try:
@@ -3278,13 +5748,11 @@ def run_telegram_bot() -> None:
             except _OperationCancelled:
                 bot_logger.info(f"Main flow cancelled by user for chat {chat_id}")
                 _tg_url = note.telegraph_url if hasattr(note, 'telegraph_url') else ''
-                try:
-                    await progress_msg.edit(
-                        _t('cancelled', user_lang),
-                        buttons=_abort_url_buttons(noteId, anchorCommentId, xsec_token, _original_url, _tg_url),
-                    )
-                except Exception:
-                    pass
+                await progress_renderer.finish(
+                    progress_msg,
+                    _t('cancelled', user_lang),
+                    buttons=_abort_url_buttons(noteId, anchorCommentId, xsec_token, _original_url, _tg_url),
+                )
                 if not user_prefs.get('keep_original'):
                     try:
                         await bot.delete_messages(chat_id, msg_id)
@@ -3324,7 +5792,7 @@ def run_telegram_bot() -> None:
         # Accept if:
         #  - message contains xhslink.com or xiaohongshu.com
         #  - or is a photo (QR code)
-        text = event.text or ''
+        text = (event.text or '').lower()
         if (
             'xhslink.com' in text or 'xiaohongshu.com' in text
             or event.message.photo
@@ -3340,106 +5808,227 @@ def run_telegram_bot() -> None:
 
     # ── Inline query ───────────────────────────────────────────────────────────
 
-    async def _inline_note2feed_internal(event: events.InlineQuery.Event) -> None:
-        inline_start = time.monotonic()
-        message_text = event.text
-        if not message_text:
-            return
-        if 'xhslink.com' not in message_text and 'xiaohongshu.com' not in message_text:
-            return
-
-        url_info = get_url_info(message_text)
-        if not url_info['success']:
-            return
-
-        noteId = str(url_info['noteId'])
-        xsec_token = str(url_info['xsec_token'])
-        anchorCommentId = str(url_info['anchorCommentId'])
-        bot_logger.info(
-            f'Inline Note ID: {noteId}, xsec_token: {xsec_token if xsec_token else "None"}, '
-            f'anchorCommentId: {anchorCommentId if anchorCommentId else "None"}'
-        )
-
+    async def _inline_fetch_note(noteId: str, anchorCommentId: str) -> dict[str, Any] | None:
         bot_logger.debug('try open note on device (inline)')
-        open_note(noteId, anchorCommentId=anchorCommentId)
+        await asyncio.to_thread(open_note, noteId, anchorCommentId=anchorCommentId)
         await asyncio.sleep(1.0)
-
-        note_data: dict[str, Any] = {}
-
         try:
-            note_data = requests.get(f"https://{FLASK_SERVER_NAME}/get_note/{noteId}").json()
+            resp = await asyncio.to_thread(requests.get, f"https://{FLASK_SERVER_NAME}/get_note/{noteId}")
+            note_data = resp.json()
             botdb.save_note_cache(noteId, note_data=note_data)
         except Exception:
             bot_logger.error(traceback.format_exc())
-        finally:
-            if not note_data or 'data' not in note_data:
-                return
-
-        if note_data['data']['data'][0]['note_list'][0]['model_type'] == 'error':
-            bot_logger.warning(f"Inline note data not available\n{note_data['data']}")
-            return
+            return None
+        return note_data if note_data and 'data' in note_data else None
 
+    async def _inline_telegraph_page(noteId: str, note: Note) -> str:
+        # Runs to completion even when the query gives up on it, so the page
+        # is ready for the next query about the same note.
         try:
             try:
                 await telegraph_account.get_account_info()  # type: ignore
             except Exception:
                 await telegraph_account.create_account(short_name='@xhsfwbot')  # type: ignore
+            url = await note.to_telegraph()
+        except Exception as e:
+            bot_logger.error(f"Inline Telegraph page for {noteId} failed: {e}")
+            return ''
+        inline_answers.remember_page(noteId, url)
+        return url
+
+    async def _inline_note(noteId: str, anchorCommentId: str) -> Note | None:
+        """The note behind an inline query, from the cache or the device."""
+        # The card only shows the title, author, tags and thumbnail, which
+        # don't go stale, so any cached copy of the note will do.
+        note_data = inline_answers.cached_note(noteId)
+        if note_data is None:
+            note_data = await _inline_fetch_note(noteId, anchorCommentId)
+            if note_data is None:
+                return None
+            if note_data['data']['data'][0]['note_list'][0]['model_type'] == 'error':
+                bot_logger.warning(f"Inline note data not available\n{note_data['data']}")
+                return None
+        return Note(
+            note_data['data'],
+            comment_list_data={'data': {}},
+            live=True,
+            telegraph_account=telegraph_account,
+            anchorCommentId=anchorCommentId,
+        )
 
-            note = Note(
-                note_data['data'],
-                comment_list_data={'data': {}},
-                live=True,
-                telegraph_account=telegraph_account,
-                anchorCommentId=anchorCommentId,
-            )
-            await note.initialize()
-            telegraph_url = note.telegraph_url if hasattr(note, 'telegraph_url') else await note.to_telegraph()
-
-            name_esc = tg_msg_escape_html(note.user['name'])
-            uid = note.user['id']
-            tag_str = f'\n{tg_msg_escape_html(note.tag_string)}' if note.tags else ''
-            title_part = tg_msg_escape_html(note.title) if note.title else 'Note Source'
+    def _inline_card(note: Note, telegraph_url: str) -> str:
+        name_esc = tg_msg_escape_html(note.user['name'])
+        uid = note.user['id']
+        tag_str = f'\n{tg_msg_escape_html(note.tag_string)}' if note.tags else ''
+        title_part = tg_msg_escape_html(note.title) if note.title else 'Note Source'
+        return (
+            (f'📰 <a href="{telegraph_url}">View via Telegraph</a>\n\n' if telegraph_url else '') +
+            f'📕 <a href="{note.url}">{title_part}</a>{tag_str}\n\n'
+            f'👤 <a href="https://www.xiaohongshu.com/user/profile/{uid}">@{name_esc}</a>'
+        )
 
-            msg_text = (
-                f'📰 <a href="{telegraph_url}">View via Telegraph</a>\n\n'
-                f'📕 <a href="{note.url}">{title_part}</a>{tag_str}\n\n'
-                f'👤 <a href="https://www.xiaohongshu.com/user/profile/{uid}">@{name_esc}</a>'
+    async def _inline_answer(event: events.InlineQuery.Event, inline_start: float, result: Any) -> str:
+        elapsed = time.monotonic() - inline_start
+        if inline_answers.remaining(inline_start) <= 0:
+            bot_logger.warning(f"Inline query took {elapsed:.1f}s, likely expired – skipping answer")
+            return 'expired'
+        try:
+            await event.answer([result])
+        except QueryIdInvalidError:
+            bot_logger.warning(f"Inline query expired after {elapsed:.1f}s – answer discarded")
+            return 'expired'
+        return 'answered'
+
+    async def _inline_placeholder(event: events.InlineQuery.Event, inline_start: float) -> str | None:
+        """Answer with a card built from the link alone; the chosen message is
+        filled in by inline_send_handler."""
+        noteId, link = quick_note_link(event.text)
+        if not link:
+            return None
+        if noteId and inline_answers.page(noteId) and inline_answers.cached_note(noteId) is not None:
+            return None  # everything is cached: answer with the full card
+        result = event.builder.article(
+            title='Xiaohongshu note',
+            description=noteId or link,
+            text=f'⏳ Loading note…\n\n📕 <a href="{link}">{link}</a>',
+            parse_mode='html',
+            link_preview=False,
+            buttons=[Button.url('📕 Xiaohongshu', link)],
+            id=InlineAnswerer.PLACEHOLDER_ID,
+        )
+        outcome = await _inline_answer(event, inline_start, result)
+        if outcome == 'answered':
+            inline_answers.record('answered', inline_start, with_page=False, placeholder=True)
+        return outcome
+
+    async def _inline_note2feed_internal(event: events.InlineQuery.Event, inline_start: float) -> str | None:
+        """Answer one inline query; returns its outcome for the metrics, or
+        None when the query isn't about an available note."""
+        message_text = event.text
+        if INLINE_TWO_PHASE:
+            outcome = await _inline_placeholder(event, inline_start)
+            if outcome is not None:
+                return outcome
+        try:
+            url_info = await asyncio.wait_for(
+                asyncio.to_thread(get_url_info, message_text), inline_answers.remaining(inline_start),
             )
+        except asyncio.TimeoutError:
+            return 'expired'
+        if not url_info['success']:
+            return None
 
-            thumb = (
-                InputWebDocument(url=note.thumbnail, size=0, mime_type='image/jpeg', attributes=[])
-                if note.thumbnail else None
-            )
+        noteId = str(url_info['noteId'])
+        xsec_token = str(url_info['xsec_token'])
+        anchorCommentId = str(url_info['anchorCommentId'])
+        bot_logger.info(
+            f'Inline Note ID: {noteId}, xsec_token: {xsec_token if xsec_token else "None"}, '
+            f'anchorCommentId: {anchorCommentId if anchorCommentId else "None"}'
+        )
 
-            result = event.builder.article(
-                title=note.title or 'Note',
-                description='Telegraph URL with xiaohongshu.com URL',
-                text=msg_text,
-                parse_mode='html',
-                link_preview=True,
-                thumb=thumb,
+        try:
+            note = await asyncio.wait_for(
+                _inline_note(noteId, anchorCommentId), inline_answers.remaining(inline_start),
             )
-
-            elapsed = time.monotonic() - inline_start
-            if elapsed > 25:
-                bot_logger.warning(f"Inline query took {elapsed:.1f}s, likely expired – skipping answer")
-                return
-
+        except asyncio.TimeoutError:
+            return 'expired'
+        if note is None:
+            return 'failed'
+
+        telegraph_url = inline_answers.page(noteId)
+        if not telegraph_url:
+            page_task = asyncio.create_task(_inline_telegraph_page(noteId, note))
             try:
-                await event.answer([result])
-            except QueryIdInvalidError:
-                bot_logger.warning(f"Inline query expired after {elapsed:.1f}s – answer discarded")
+                telegraph_url = await asyncio.wait_for(
+                    asyncio.shield(page_task),
+                    inline_answers.remaining(inline_start, InlineAnswerer.ANSWER_RESERVE),
+                )
+            except asyncio.TimeoutError:
+                bot_logger.warning(f"Inline Telegraph page for {noteId} not ready in time – answering without it")
 
-        except Exception as e:
-            bot_logger.error(f"Error in inline_note2feed: {e}\n{traceback.format_exc()}")
+        thumb = (
+            InputWebDocument(url=rendition_url(note.thumbnail, 'preview'), size=0, mime_type='image/jpeg', attributes=[])
+            if note.thumbnail else None
+        )
+
+        result = event.builder.article(
+            title=note.title or 'Note',
+            description='Telegraph URL with xiaohongshu.com URL' if telegraph_url else 'xiaohongshu.com URL',
+            text=_inline_card(note, telegraph_url),
+            parse_mode='html',
+            link_preview=True,
+            thumb=thumb,
+        )
+        outcome = await _inline_answer(event, inline_start, result)
+        if outcome == 'answered':
+            inline_answers.record('answered', inline_start, with_page=bool(telegraph_url))
+        return outcome
 
     @bot.on(events.InlineQuery)
     async def inline_handler(event: events.InlineQuery.Event) -> None:
-        async with processing_semaphore:
+        inline_start = time.monotonic()
+        message_text = event.text or ''
+        lowered = message_text.lower()
+        if 'xhslink.com' not in lowered and 'xiaohongshu.com' not in lowered:
+            return
+        try:
+            await asyncio.wait_for(inline_answers.slots.acquire(), inline_answers.remaining(inline_start))
+        except asyncio.TimeoutError:
+            inline_answers.record('expired', inline_start)
+            return
+        try:
+            outcome = await _inline_note2feed_internal(event, inline_start)
+        except Exception as e:
+            bot_logger.error(f"Error in inline handler: {e}\n{traceback.format_exc()}")
+            outcome = 'failed'
+        finally:
+            inline_answers.slots.release()
+        if outcome in ('expired', 'failed'):
+            inline_answers.record(outcome, inline_start)
+
+    @bot.on(events.Raw(tl_types.UpdateBotInlineSend))
+    async def inline_send_handler(update: tl_types.UpdateBotInlineSend) -> None:
+        # Telegram only reports chosen results with inline feedback enabled
+        # (@BotFather /setinlinefeedback), and only gives an editable msg_id
+        # for messages with buttons, which the placeholder always has.
+        if update.id != InlineAnswerer.PLACEHOLDER_ID or update.msg_id is None:
+            return
+        fill_start = time.monotonic()
+        card = ''
+        timed_out = False
+
+        async def _fill() -> str:
+            url_info = await asyncio.to_thread(get_url_info, update.query)
+            if not url_info['success']:
+                return ''
+            noteId = str(url_info['noteId'])
+            note = await _inline_note(noteId, str(url_info['anchorCommentId']))
+            if note is None:
+                return ''
+            telegraph_url = inline_answers.page(noteId) or await _inline_telegraph_page(noteId, note)
+            return _inline_card(note, telegraph_url)
+
+        async with inline_answers.fill_slots:
             try:
-                await _inline_note2feed_internal(event)
+                card = await asyncio.wait_for(_fill(), InlineAnswerer.FILL_TIMEOUT)
+            except asyncio.TimeoutError:
+                timed_out = True
+                bot_logger.warning(f"Inline fill for {update.query!r} timed out after {InlineAnswerer.FILL_TIMEOUT:.0f}s")
             except Exception as e:
-                bot_logger.error(f"Error in inline handler: {e}")
+                bot_logger.error(f"Error filling inline message: {e}\n{traceback.format_exc()}")
+        text = card
+        if not text:
+            _, link = quick_note_link(update.query)
+            text = f'😢 Note not available\n\n📕 <a href="{link}">{link}</a>'
+        try:
+            # buttons=None would keep the placeholder's button; an empty
+            # markup removes it.
+            await bot.edit_message(update.msg_id, text, parse_mode='html', link_preview=True,
+                                   buttons=tl_types.ReplyInlineMarkup(rows=[]))
+        except Exception as e:
+            bot_logger.error(f"Failed to edit inline message: {e}")
+            card = ''
+        inline_answers.record_fill(bool(card), fill_start, timed_out)
 
     # ── Run ────────────────────────────────────────────────────────────────────
 